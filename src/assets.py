@@ -0,0 +1,136 @@
+import os
+from collections import namedtuple
+from download_assets import download_all, verify_asset
+
+# Nothing in this module touches the disk or the network at import time. Assets are resolved lazily:
+#   path(name)   -> where the asset lives (data dir first, then the mirror), no I/O beyond os.path.exists
+#   ensure(name) -> path(name), fetching the asset first if it is missing (or failing fast when offline)
+# The data dir, mirror dir and offline switch default to the CHESS_DATA_DIR, CHESS_MIRROR_DIR and
+# CHESS_OFFLINE environment variables and can be changed with configure().
+
+Asset = namedtuple('Asset', ['name', 'url', 'relative_path', 'extract'])
+
+class AssetUnavailable(Exception):
+    pass
+
+OLYMPIADS = {2010: 36795, 2012: 77681, 2014: 140380, 2016: 232875, 2018: 368908, 2022: 653631}
+FIDE_LIST_YEARS = list(range(2010, 2024))
+COUNTRY_CODES_VERSION = 1
+
+GEOJSON_URL = "https://datahub.io/core/geo-countries/r/countries.geojson"
+CAPITAL_URL = "https://gist.githubusercontent.com/ofou/df09a6834a8421b4f376c875194915c9/raw/355eb56e164ddc3cd1a9467c524422cb674e71a9/country-capital-lat-long-population.csv"
+OLYMPIAD_URL = 'https://chess-results.com/tnr{}.aspx?lan=1&zeilen=99999&art=1&turdet=YES&flag=30&prt=4&excel=2010'
+FIDE_BASE_URL = "http://ratings.fide.com/download/"
+
+_config = {
+    'data_dir': os.environ.get('CHESS_DATA_DIR', 'data'),
+    'mirror_dir': os.environ.get('CHESS_MIRROR_DIR') or None,
+    'offline': os.environ.get('CHESS_OFFLINE', '') not in ('', '0', 'false', 'False'),
+}
+
+def configure(data_dir=None, mirror_dir=None, offline=None):
+    if data_dir is not None:
+        _config['data_dir'] = data_dir
+    if mirror_dir is not None:
+        _config['mirror_dir'] = mirror_dir or None
+    if offline is not None:
+        _config['offline'] = offline
+    return dict(_config)
+
+def fide_list_asset(year):
+    yy = year % 100
+    if yy < 13: # the 2010-2012 archives predate the 'standard_' prefix
+        url = f"{FIDE_BASE_URL}jan{yy:02d}frl.zip"
+    else:
+        url = f"{FIDE_BASE_URL}standard_jan{yy:02d}frl.zip"
+    relative_path = os.path.join("secondary", "fide_ratings_list", f"standard_jan{yy:02d}frl.txt")
+    return Asset('fide_{}'.format(year), url, relative_path, True)
+
+def _build_registry():
+    capital_folder = os.path.join("secondary", "country-capital-lat-long-population")
+    registry = [
+        Asset('geojson', GEOJSON_URL, os.path.join(capital_folder, "countries.geojson"), False),
+        Asset('capitals', CAPITAL_URL, os.path.join(capital_folder, "country-capital-lat-long-population.csv"), False),
+        # checked into the repository, so there is nothing to download
+        Asset('world_bank', None, os.path.join("secondary", "World_Development_Indicators", "world_bank_data.csv"), False),
+        Asset('country_codes', None, os.path.join("secondary", "country_codes", "country_codes_v{}.csv".format(COUNTRY_CODES_VERSION)), False),
+    ]
+    for year, t_id in OLYMPIADS.items():
+        relative_path = os.path.join("primary", "chessResultsList_{}.xlsx".format(year))
+        registry.append(Asset('olympiad_{}'.format(year), OLYMPIAD_URL.format(t_id), relative_path, False))
+    for year in FIDE_LIST_YEARS:
+        registry.append(fide_list_asset(year))
+    return {asset.name: asset for asset in registry}
+
+REGISTRY = _build_registry()
+
+def register(asset):
+    REGISTRY[asset.name] = asset
+    return asset
+
+def _lookup(asset):
+    if isinstance(asset, Asset):
+        return asset
+    try:
+        return REGISTRY[asset]
+    except KeyError:
+        raise KeyError("Unknown asset '{}'".format(asset)) from None
+
+def _manifest_file():
+    return os.path.join(_config['data_dir'], "manifest.json")
+
+def _local_path(asset):
+    return os.path.join(_config['data_dir'], asset.relative_path)
+
+def path(asset):
+    asset = _lookup(asset)
+    local_path = _local_path(asset)
+    if not os.path.exists(local_path) and _config['mirror_dir']:
+        mirror_path = os.path.join(_config['mirror_dir'], asset.relative_path)
+        if os.path.exists(mirror_path):
+            return mirror_path
+    return local_path
+
+def is_available(asset):
+    asset = _lookup(asset)
+    local_path = path(asset)
+    if not os.path.exists(local_path):
+        return False
+    if asset.url is None or local_path != _local_path(asset):
+        return True # checked-in files and mirror copies are trusted as they are
+    if _config['offline']:
+        return True # nothing could be refetched anyway
+    return verify_asset(local_path, _manifest_file(), full=False)
+
+def _missing_error(asset):
+    return AssetUnavailable("Asset '{}' is not available at '{}' and {}".format(
+        asset.name, _local_path(asset),
+        "offline mode is enabled" if _config['offline'] else "has no download url"))
+
+def ensure(asset):
+    asset = _lookup(asset)
+    if is_available(asset):
+        return path(asset)
+    if _config['offline'] or asset.url is None:
+        raise _missing_error(asset)
+    failed = ensure_all([asset])
+    if failed:
+        raise AssetUnavailable("Failed to download asset '{}' from '{}'".format(asset.name, asset.url))
+    return path(asset)
+
+def ensure_all(assets=None, max_workers=8):
+    # fetch every missing asset concurrently; returns the names of the ones that could not be fetched
+    assets = [_lookup(asset) for asset in (REGISTRY.values() if assets is None else assets)]
+    missing = [asset for asset in assets if not is_available(asset)]
+    unreachable = [asset.name for asset in missing if _config['offline'] or asset.url is None]
+    to_fetch = [asset for asset in missing if asset.name not in unreachable]
+    tasks = []
+    for asset in to_fetch:
+        local_path = _local_path(asset)
+        tasks.append((asset.url, os.path.dirname(local_path), os.path.basename(local_path), asset.extract))
+    failed_files = set(download_all(tasks, max_workers=max_workers, manifest_file=_manifest_file())) if tasks else set()
+    failed = [asset.name for asset in to_fetch if os.path.basename(asset.relative_path) in failed_files]
+    return unreachable + failed
+
+def status():
+    return {name: is_available(asset) for name, asset in REGISTRY.items()}
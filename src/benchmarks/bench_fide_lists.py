@@ -0,0 +1,44 @@
+# Compare the memory-mapped FIDE list reader with the pd.read_fwf path it replaced.
+# Usage (from src): python benchmarks/bench_fide_lists.py [list.txt ...]
+# Without arguments every downloaded FIDE list in the asset registry is used.
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import assets
+import fide_lists
+
+COLUMNS = ['fide_id', 'name', 'title', 'federation', 'rating']
+
+def read_fwf_baseline(file_path):
+    # the per-file loop clean_manipulate.py used before fide_lists existed
+    layout = fide_lists.read_header(file_path)
+    with open(file_path, 'r', encoding=fide_lists.ENCODING) as file:
+        line_length = len(file.readline().rstrip('\r\n'))
+    ends = [end if end is not None else line_length + 8 for _, _, end in layout]
+    widths = [end - start for (_, start, _), end in zip(layout, ends)]
+    names = [name for name, _, _ in layout]
+    df = pd.read_fwf(file_path, widths=widths, names=names, encoding='unicode_escape')
+    return df.drop(0).reset_index(drop=True)[COLUMNS]
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main(file_paths):
+    print("{:<28}{:>10}{:>12}{:>12}{:>9}".format('file', 'rows', 'read_fwf s', 'mmap s', 'speedup'))
+    for file_path in file_paths:
+        baseline, baseline_time = timed(read_fwf_baseline, file_path)
+        fast, fast_time = timed(fide_lists.read_fide_list, file_path, COLUMNS)
+        assert len(baseline) == len(fast), "row counts differ for {}".format(file_path)
+        assert (pd.to_numeric(baseline['rating'], errors='coerce').fillna(fide_lists.MISSING).astype(int).values == fast['rating'].values).all()
+        print("{:<28}{:>10}{:>12.2f}{:>12.2f}{:>8.1f}x".format(
+            os.path.basename(file_path), len(fast), baseline_time, fast_time, baseline_time / fast_time))
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or [assets.path('fide_{}'.format(year)) for year in assets.FIDE_LIST_YEARS
+                             if assets.is_available('fide_{}'.format(year))]
+    main(paths)
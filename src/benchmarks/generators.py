@@ -0,0 +1,158 @@
+# Synthetic inputs for the benchmarks, so they run without downloading anything:
+#   write_fide_list        a FIDE rating list in one of the historical header layouts
+#   write_olympiad_workbook a chess-results 'Team-Composition with round-results' workbook
+#   write_world_bank_csv   a World Development Indicators export
+#   synthetic_names        pairs of name lists for the crosswalk matcher
+# Everything is derived from a seed, so the same arguments always produce the same file.
+import os
+import sys
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fide_lists
+
+# header of each list layout; the rating column is named after the list's period
+FIDE_LAYOUTS = {
+    'jan10frl': "ID number Name                              TitlFed  {period} GamesBorn  Flag",
+    'standard': "ID Number      Name                                                         Fed Sex Tit  WTit OTit           {period} Gms K  B-day Flag",
+    'standard_foa': "ID Number      Name                                                         Fed Sex Tit  WTit OTit           FOA {period} Gms K  B-day Flag",
+}
+# the old lists trim trailing blanks, the standard ones pad every line to the length of the header
+FIDE_TRIMMED = {'jan10frl': True, 'standard': False, 'standard_foa': False}
+FIDE_PERIODS = {'jan10frl': 'Jan12', 'standard': 'jan13', 'standard_foa': 'jan17'}
+
+SURNAMES = ['Müller', 'Ivanchuk', 'Núñez', 'Sørensen', 'Smith', 'Nakamura', 'Kasparov', 'Polgar', 'Anand', 'Carlsen',
+            'Dubois', 'García', 'Kowalski', 'Nielsen', 'Rossi', 'Schmidt', 'Tan', 'Wang', 'Yilmaz', 'Zhou']
+GIVEN_NAMES = ['Hans', 'Vassily', 'José', 'Ana', 'Peter', 'Hikaru', 'Judit', 'Magnus', 'Viswanathan', 'Chloé',
+               'Lucía', 'Marek', 'Freja', 'Giulia', 'Jan', 'Wei', 'Elif', 'Li', 'Olga', 'Sean']
+FEDERATIONS = ['ENG', 'GER', 'USA', 'RUS', 'IND', 'FRA', 'ESP', 'ITA', 'POL', 'UKR', 'CHN', 'NED', 'CAF', 'TRI', 'SCO', 'BRA']
+TITLES = {'jan10frl': ['', '', '', '', 'g', 'm', 'f', 'wg', 'wm', 'wf', 'c', 'wc'],
+          'standard': ['', '', '', '', 'GM', 'IM', 'FM', 'WGM', 'WIM', 'WFM', 'CM', 'WCM']}
+
+def _text_field(pool, width, index):
+    # rows of a text column as (rows, width) bytes, taken from a pool of padded values
+    padded = np.array([value.encode(fide_lists.ENCODING)[:width].ljust(width) for value in pool], dtype='S{}'.format(width))
+    return padded.view(np.uint8).reshape(len(pool), width)[index]
+
+def _int_field(values, width):
+    # left-aligned decimal digits of non-negative ints as (rows, width) bytes
+    values = np.asarray(values, dtype=np.int64)
+    digits = np.maximum(np.floor(np.log10(np.maximum(values, 1))).astype(np.int64) + 1, 1)
+    position = np.arange(width)
+    power = np.maximum(digits[:, None] - 1 - position, 0)
+    chars = (values[:, None] // 10 ** power) % 10 + ord('0')
+    return np.where(position < digits[:, None], chars, ord(' ')).astype(np.uint8)
+
+def _fide_chunk(rng, columns, line_length, layout, first_id, rows):
+    record = np.full((rows, line_length), ord(' '), dtype=np.uint8)
+    titles = TITLES['jan10frl' if layout == 'jan10frl' else 'standard']
+    for name, start, end in columns:
+        width = (end if end is not None else line_length) - start
+        if name == 'fide_id':
+            field = _int_field(first_id + np.arange(rows), width)
+        elif name == 'name':
+            pool = ['{}, {}'.format(surname, given) for surname in SURNAMES for given in GIVEN_NAMES]
+            field = _text_field(pool, width, rng.integers(len(pool), size=rows))
+        elif name == 'title':
+            field = _text_field(titles, width, rng.integers(len(titles), size=rows))
+        elif name == 'federation':
+            field = _text_field(FEDERATIONS, width, rng.integers(len(FEDERATIONS), size=rows))
+        elif name == 'sex':
+            field = _text_field(['M', 'M', 'M', 'F'], width, rng.integers(4, size=rows))
+        elif name == 'rating':
+            field = _int_field(rng.integers(1000, 2850, size=rows), width)
+        elif name == 'games':
+            field = _int_field(rng.integers(0, 40, size=rows), width)
+        elif name == 'k':
+            field = _int_field(rng.choice([10, 20, 40], size=rows), width)
+        elif name == 'born':
+            field = _int_field(rng.integers(1930, 2015, size=rows), width)
+        elif name == 'flag':
+            field = _text_field(['', '', 'i', 'w', 'wi'], width, rng.integers(5, size=rows))
+        else:
+            continue # wtitle, otitle, foa stay blank
+        record[:, start:start + width] = field[:, :min(width, line_length - start)]
+    return record
+
+def write_fide_list(file_path, rows, layout='standard', period=None, seed=0, chunk_rows=1_000_000):
+    # a FIDE list with `rows` players in the given layout, written chunk by chunk so 20M rows fit in memory
+    header = FIDE_LAYOUTS[layout].format(period=period or FIDE_PERIODS[layout])
+    columns = fide_lists.parse_header(header)
+    line_length = len(header)
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    with open(file_path, 'wb') as file:
+        file.write(header.encode(fide_lists.ENCODING) + b'\n')
+        for first in range(0, rows, chunk_rows):
+            record = _fide_chunk(rng, columns, line_length, layout, 10_000_000 + first, min(chunk_rows, rows - first))
+            if FIDE_TRIMMED[layout]:
+                file.write(b''.join(line.rstrip() + b'\n' for line in map(bytes, record)))
+            else:
+                lines = np.hstack([record, np.full((len(record), 1), ord('\n'), dtype=np.uint8)])
+                file.write(lines.tobytes())
+    return file_path
+
+OLYMPIAD_HEADERS = {
+    2010: ['Bo.', None, 'Name', 'Rtg', 'FED'] + [str(i) for i in range(1, 12)] + ['Pts. ', 'Games', 'Rp', 'w', 'we', 'w-we', 'K', 'rtg+/-'],
+    2018: ['Bo.', None, 'Name', 'Rtg', 'FED', 'FideID'] + [str(i) for i in range(1, 12)] + ['Pts. ', 'Games', 'RtgAvg', 'Rp', 'w', 'we', 'w-we', 'K', 'rtg+/-'],
+}
+
+def write_olympiad_workbook(file_path, teams=180, layout=2010, seed=0):
+    # a workbook laid out like the chess-results export: title rows, then a team row, a 'Bo.' header and 5 players per team
+    rng = np.random.default_rng(seed)
+    header = OLYMPIAD_HEADERS[layout]
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(['From the Tournament-Database of Chess-Results http://chess-results.com'])
+    sheet.append(['Chess Olympiad {} Open'.format(layout)])
+    sheet.append(['Team-Composition with round-results - Open'])
+    results = np.array(['1', '0', '½', None], dtype=object)
+    for team in range(teams):
+        federation = FEDERATIONS[team % len(FEDERATIONS)]
+        sheet.append(['{}. Team {} ({} / RtgAvg:{}, Captain: Someone)'.format(team + 1, team, federation, 2000 + team % 700)])
+        sheet.append(header)
+        for board in range(1, 6):
+            rating = int(rng.integers(1500, 2800))
+            rounds = list(results[rng.integers(len(results), size=11)])
+            played = sum(result is not None for result in rounds)
+            points = sum({'1': 1.0, '½': 0.5}.get(result, 0.0) for result in rounds)
+            row = {'Bo.': board, None: 'GM' if rating > 2500 else None, 'Name': '{}, {}'.format(SURNAMES[board], GIVEN_NAMES[team % 20]),
+                   'Rtg': rating, 'FED': federation, 'FideID': 10_000_000 + team * 5 + board, 'Pts. ': points, 'Games': played,
+                   'RtgAvg': rating, 'Rp': rating + int(rng.integers(-200, 200)), 'w': points, 'we': round(played * 0.5, 2),
+                   'w-we': round(points - played * 0.5, 2), 'K': 20, 'rtg+/-': 0.0}
+            sheet.append([row[label] if label in row else rounds[int(label) - 1] for label in header])
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    workbook.save(file_path)
+    return file_path
+
+def write_world_bank_csv(file_path, countries=217, indicators=24, years=range(2007, 2023), missing=0.3, seed=0):
+    # a wide export with '..' for a `missing` share of the values and the usual footer lines
+    rng = np.random.default_rng(seed)
+    years = list(years)
+    country_codes = ['C{:02d}'.format(i) if i < 100 else 'C{}'.format(i) for i in range(countries)]
+    rows = len(country_codes) * indicators
+    values = rng.lognormal(5, 2, size=(rows, len(years))).round(6).astype(str).astype(object)
+    values[rng.random(size=values.shape) < missing] = '..'
+    df = pd.DataFrame(values, columns=['{0} [YR{0}]'.format(year) for year in years])
+    df.insert(0, 'Series Code', np.tile(['IND.{:04d}'.format(i) for i in range(indicators)], countries))
+    df.insert(0, 'Series Name', np.tile(['Indicator {}, total'.format(i) for i in range(indicators)], countries))
+    df.insert(0, 'Country Code', np.repeat(country_codes, indicators))
+    df.insert(0, 'Country Name', np.repeat(['Country {}'.format(code) for code in country_codes], indicators))
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    df.to_csv(file_path, index=False)
+    with open(file_path, 'a') as file:
+        file.write(',' * (len(df.columns) - 1) + '\n')
+        file.write('Data from database: World Development Indicators' + ',' * (len(df.columns) - 1) + '\n')
+    return file_path
+
+def synthetic_names(count, seed=0):
+    # (queries, answers): made-up country names and a reworded variant of each, in a different order
+    rng = np.random.default_rng(seed)
+    syllables = np.array(['ba', 'ko', 'ri', 'sta', 'nia', 'lan', 'gu', 'mor', 'tel', 'vi', 'zan', 'qu', 'dor', 'es', 'pa', 'lu'])
+    words = [''.join(rng.choice(syllables, size=rng.integers(2, 5))).capitalize() for _ in range(count * 2)]
+    queries = ['{} {}'.format(words[2 * i], words[2 * i + 1]) if i % 3 == 0 else words[2 * i] for i in range(count)]
+    forms = ['{}', 'Republic of {}', '{}, The', '{} Islands', 'United {}']
+    answers = [forms[i % len(forms)].format(query) for i, query in enumerate(queries)]
+    return queries, [answers[i] for i in rng.permutation(count)]
@@ -0,0 +1,201 @@
+# Offline benchmarks of the pipeline stages on synthetic inputs (see generators.py), at several scales.
+# Every (stage, scale) case runs in a fresh process, so its peak RSS is its own; wall time, CPU time,
+# peak tracemalloc allocation and row counts are written to a JSON file that can be compared across runs.
+# Usage (from src):
+#   python benchmarks/run_benchmarks.py --scales small medium --output bench.json
+#   python benchmarks/run_benchmarks.py --scales small --compare bench.json   (exits 1 on a regression)
+# Generated inputs are kept in --data-dir (default data/cache/benchmarks) and reused by later runs; results
+# go to <data-dir>/bench_results.json unless --output says otherwise.
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import generators
+import fide_lists
+import fide_archive
+import olympiads
+import world_bank
+import matching
+import instrument
+
+SCALES = {
+    'tiny': {'fide_rows': 100_000, 'olympiad_teams': 50, 'names': 200, 'wb_countries': 100, 'wb_indicators': 10},
+    'small': {'fide_rows': 1_000_000, 'olympiad_teams': 200, 'names': 1_000, 'wb_countries': 217, 'wb_indicators': 50},
+    'medium': {'fide_rows': 5_000_000, 'olympiad_teams': 1_000, 'names': 5_000, 'wb_countries': 250, 'wb_indicators': 500},
+    'large': {'fide_rows': 20_000_000, 'olympiad_teams': 5_000, 'names': 20_000, 'wb_countries': 250, 'wb_indicators': 2_000},
+}
+DEFAULT_DATA_DIR = os.path.join('data', 'cache', 'benchmarks')
+REGRESSION_THRESHOLD = 1.2 # a case 20% slower than the baseline counts as a regression,
+MIN_REGRESSION_S = 0.05 # unless it lost less than this, which is noise
+
+# every stage takes the generated inputs and returns its number of output rows
+def _fide_parse(inputs):
+    return len(fide_lists.read_fide_list(inputs['fide_list'], fide_lists.INGEST_COLUMNS, as_frame=False)['rating'])
+
+def _fide_ingest(inputs):
+    return len(fide_lists.load_fide_list(inputs['fide_list'], 2013, use_cache=False)['rating'])
+
+def _fide_stream(inputs):
+    return int(fide_archive.aggregate_list(inputs['fide_list'])[2]['players'].sum())
+
+def _olympiad_load(inputs):
+    return len(olympiads.read_olympiad(inputs['workbook'])['board'])
+
+def _country_matching(inputs):
+    queries, answers = inputs['names']
+    return len(matching.find_match_country(queries, answers))
+
+def _world_bank_reshape(inputs):
+    panel = world_bank.to_panel(world_bank.read_world_bank(inputs['world_bank']))
+    world_bank.indicator_completeness(panel, list(range(2007, 2020, 2)))
+    return int(panel.present.sum())
+
+STAGES = {
+    'fide_parse': _fide_parse,
+    'fide_ingest': _fide_ingest,
+    'fide_stream': _fide_stream,
+    'olympiad_load': _olympiad_load,
+    'country_matching': _country_matching,
+    'world_bank_reshape': _world_bank_reshape,
+}
+FIDE_STAGES = ('fide_parse', 'fide_ingest', 'fide_stream')
+
+def prepare_inputs(stage, scale, layout, data_dir):
+    # generated files are named after their parameters, so each one is only written once
+    params = SCALES[scale]
+    if stage in FIDE_STAGES:
+        file_path = os.path.join(data_dir, 'fide_{}_{}.txt'.format(layout, params['fide_rows']))
+        if not os.path.exists(file_path):
+            generators.write_fide_list(file_path + '.tmp', params['fide_rows'], layout)
+            os.replace(file_path + '.tmp', file_path)
+        return {'fide_list': file_path}, {'rows': params['fide_rows'], 'bytes': os.path.getsize(file_path)}
+    if stage == 'olympiad_load':
+        file_path = os.path.join(data_dir, 'olympiad_{}_{}.xlsx'.format(layout, params['olympiad_teams']))
+        if not os.path.exists(file_path):
+            generators.write_olympiad_workbook(file_path, params['olympiad_teams'], layout)
+        return {'workbook': file_path}, {'rows': params['olympiad_teams'] * 5, 'bytes': os.path.getsize(file_path)}
+    if stage == 'world_bank_reshape':
+        file_path = os.path.join(data_dir, 'world_bank_{}x{}.csv'.format(params['wb_countries'], params['wb_indicators']))
+        if not os.path.exists(file_path):
+            generators.write_world_bank_csv(file_path, params['wb_countries'], params['wb_indicators'])
+        return {'world_bank': file_path}, {'rows': params['wb_countries'] * params['wb_indicators'], 'bytes': os.path.getsize(file_path)}
+    return {'names': generators.synthetic_names(params['names'])}, {'rows': params['names'], 'bytes': 0}
+
+def run_case(stage, inputs, trace_memory=True):
+    # runs in a worker process: once timed, then once under tracemalloc for the allocation peak
+    rss_before = instrument.peak_rss_mb()
+    wall, cpu = time.perf_counter(), time.process_time()
+    rows_out = STAGES[stage](inputs)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    result = {'wall_s': wall, 'cpu_s': cpu, 'rows_out': rows_out,
+              'peak_rss_mb': instrument.peak_rss_mb(), 'rss_growth_mb': instrument.peak_rss_mb() - rss_before}
+    if trace_memory:
+        matching._find_match_country.cache_clear()
+        tracemalloc.start()
+        STAGES[stage](inputs)
+        result['peak_alloc_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(stages, scales, layouts, data_dir, trace_memory=True, repeat=1):
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for scale in scales:
+        for stage in stages:
+            stage_layouts = layouts['fide'] if stage in FIDE_STAGES else layouts['olympiad'] if stage == 'olympiad_load' else [None]
+            for layout in stage_layouts:
+                inputs, sizes = prepare_inputs(stage, scale, layout, data_dir)
+                for attempt in range(repeat):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        measured = executor.submit(run_case, stage, inputs, trace_memory).result()
+                    case = dict({'stage': stage, 'scale': scale, 'layout': layout, 'repeat': attempt,
+                                 'rows_in': sizes['rows'], 'bytes_in': sizes['bytes']}, **measured)
+                    results.append(case)
+                    print("{:<20}{:<8}{:<14}{:>12}{:>10.2f}s{:>10.0f}MB".format(
+                        stage, scale, str(layout or ''), sizes['rows'], case['wall_s'], case['peak_rss_mb']), flush=True)
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+def _case_key(case):
+    return (case['stage'], case['scale'], case['layout'])
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    # best wall time of every case against the baseline's; returns the cases slower than threshold x
+    def best(results):
+        times = {}
+        for case in results:
+            times[_case_key(case)] = min(times.get(_case_key(case), float('inf')), case['wall_s'])
+        return times
+    current, previous = best(report['results']), best(baseline['results'])
+    regressions = []
+    for key, wall in sorted(current.items(), key=lambda item: tuple(str(part) for part in item[0])):
+        if key not in previous:
+            continue
+        ratio = wall / previous[key]
+        regressed = ratio > threshold and wall - previous[key] > MIN_REGRESSION_S
+        print("{:<20}{:<8}{:<14}{:>10.2f}s{:>10.2f}s{:>8.2f}x {}".format(
+            *[str(part or '') for part in key], previous[key], wall, ratio, 'REGRESSION' if regressed else ''))
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    parser.add_argument('--scales', nargs='+', default=['small'], choices=list(SCALES))
+    parser.add_argument('--fide-layouts', nargs='+', default=list(generators.FIDE_LAYOUTS), choices=list(generators.FIDE_LAYOUTS))
+    parser.add_argument('--olympiad-layouts', nargs='+', type=int, default=list(generators.OLYMPIAD_HEADERS), choices=list(generators.OLYMPIAD_HEADERS))
+    parser.add_argument('--fide-rows', type=int, help='override the FIDE list size of every scale')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-tracemalloc', action='store_true', help='skip the second, traced run of every case')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--output', help='results file (default <data-dir>/bench_results.json)')
+    parser.add_argument('--compare', help='a previous results file to compare wall times with')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+    if args.fide_rows:
+        for params in SCALES.values():
+            params['fide_rows'] = args.fide_rows
+    layouts = {'fide': args.fide_layouts, 'olympiad': args.olympiad_layouts}
+    report = run(args.stages, args.scales, layouts, args.data_dir, not args.no_tracemalloc, args.repeat)
+    args.output = args.output or os.path.join(args.data_dir, 'bench_results.json')
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=1)
+    print("Results written to {}".format(args.output))
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from download_assets import file_sha256
+
+# On-disk cache of column arrays. Every entry is a directory holding one .npy file per numeric
+# column, so a reader can memory-map just the columns it needs. Text columns are stored as int32
+# codes plus a utf-8 blob of their distinct values. Entries are addressed by a key that callers
+# derive from the content hash of their inputs and the version of the code that produced them.
+
+CACHE_DIR = os.environ.get('CHESS_CACHE_DIR', os.path.join('data', 'cache'))
+DIGESTS_FILE = 'digests.json'
+_digest_lock = threading.Lock()
+
+def cache_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def file_digest(file_path, cache_dir=None):
+    # sha256 of the file's content; remembered per (size, mtime) so unchanged files are hashed once
+    cache_dir = cache_dir or CACHE_DIR
+    digests_file = os.path.join(cache_dir, DIGESTS_FILE)
+    stat = os.stat(file_path)
+    stamp = [stat.st_size, stat.st_mtime]
+    path_key = os.path.abspath(file_path)
+    with _digest_lock:
+        digests = _read_json(digests_file, {})
+        entry = digests.get(path_key)
+        if entry and entry['stamp'] == stamp:
+            return entry['sha256']
+    sha256 = file_sha256(file_path)
+    with _digest_lock:
+        digests = _read_json(digests_file, {})
+        digests[path_key] = {'stamp': stamp, 'sha256': sha256}
+        _write_json(digests_file, digests)
+    return sha256
+
+def _read_json(json_file, default):
+    try:
+        with open(json_file, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return default
+
+def _write_json(json_file, data):
+    os.makedirs(os.path.dirname(json_file) or '.', exist_ok=True)
+    tmp_file = '{}.{}.tmp'.format(json_file, os.getpid())
+    with open(tmp_file, 'w') as file:
+        json.dump(data, file, indent=1, sort_keys=True)
+    os.replace(tmp_file, json_file)
+
+def entry_dir(namespace, name, key, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, namespace, '{}-{}'.format(name, key[:16]))
+
+def _save_text(entry, name, values):
+    if isinstance(values, pd.Categorical):
+        codes, uniques = values.codes, values.categories
+    else:
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+    encoded = [str(value).encode('utf-8') for value in uniques]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    np.save(os.path.join(entry, name + '.codes.npy'), codes.astype(np.int32))
+    np.save(os.path.join(entry, name + '.offsets.npy'), offsets)
+    with open(os.path.join(entry, name + '.blob'), 'wb') as file:
+        file.write(b''.join(encoded))
+
+def _load_text(entry, name):
+    codes = np.load(os.path.join(entry, name + '.codes.npy'), mmap_mode='r')
+    offsets = np.load(os.path.join(entry, name + '.offsets.npy'))
+    with open(os.path.join(entry, name + '.blob'), 'rb') as file:
+        blob = file.read()
+    categories = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+    return codes, categories
+
+def save_columns(namespace, name, key, columns, meta=None, cache_dir=None):
+    # replaces any older entry for the same name, then writes the new one atomically
+    entry = entry_dir(namespace, name, key, cache_dir)
+    parent = os.path.dirname(entry)
+    os.makedirs(parent, exist_ok=True)
+    tmp_entry = '{}.{}.tmp'.format(entry, os.getpid())
+    shutil.rmtree(tmp_entry, ignore_errors=True)
+    os.makedirs(tmp_entry)
+    kinds = {}
+    for column, values in columns.items():
+        if not isinstance(values, pd.Categorical):
+            values = np.asarray(values)
+        if values.dtype.kind in 'biuf':
+            np.save(os.path.join(tmp_entry, column + '.npy'), values)
+            kinds[column] = 'numeric'
+        else:
+            _save_text(tmp_entry, column, values)
+            kinds[column] = 'text'
+    _write_json(os.path.join(tmp_entry, 'meta.json'), dict(meta or {}, key=key, columns=kinds))
+    for stale in os.listdir(parent):
+        if stale.startswith(name + '-') and not stale.endswith('.tmp'):
+            shutil.rmtree(os.path.join(parent, stale), ignore_errors=True)
+    os.replace(tmp_entry, entry)
+    return entry
+
+def has_entry(namespace, name, key, columns=(), cache_dir=None):
+    meta = _read_json(os.path.join(entry_dir(namespace, name, key, cache_dir), 'meta.json'), None)
+    return meta is not None and meta['key'] == key and all(column in meta['columns'] for column in columns)
+
+def current_meta(namespace, name, cache_dir=None):
+    # meta of the entry currently stored under name, whatever its key; None when there is none
+    parent = os.path.join(cache_dir or CACHE_DIR, namespace)
+    if not os.path.isdir(parent):
+        return None
+    for entry in sorted(os.listdir(parent)):
+        if entry.startswith(name + '-') and not entry.endswith('.tmp'):
+            meta = _read_json(os.path.join(parent, entry, 'meta.json'), None)
+            if meta is not None and entry_dir(namespace, name, meta['key'], cache_dir).endswith(entry):
+                return meta
+    return None
+
+def load_columns(namespace, name, key, columns=None, cache_dir=None):
+    # numeric columns come back memory-mapped; text columns as categoricals (NaN where empty)
+    entry = entry_dir(namespace, name, key, cache_dir)
+    meta = _read_json(os.path.join(entry, 'meta.json'), None)
+    if meta is None or meta['key'] != key:
+        raise KeyError("No cache entry {}/{} for key {}".format(namespace, name, key[:16]))
+    columns = list(meta['columns']) if columns is None else columns
+    result = {}
+    for column in columns:
+        if meta['columns'][column] == 'numeric':
+            result[column] = np.load(os.path.join(entry, column + '.npy'), mmap_mode='r')
+        else:
+            codes, categories = _load_text(entry, column)
+            result[column] = pd.Categorical.from_codes(codes, categories) # code -1 is NaN
+    return result
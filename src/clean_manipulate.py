@@ -30,14 +30,24 @@
 # In[2]:
 
 
+import json
 import numpy as np
 import pandas as pd
-import requests
-import re
-from unidecode import unidecode
-from itertools import groupby
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from itertools import islice
+from contextlib import closing
+import fide_lists
+import linker
+import olympiads
+import elo
+import world_bank
+import country_codes
+import instrument
+import resampling
+import distances
+import geometry
+import pipeline
+from player_store import PlayerRatingStore
+from culture_cube import CultureCube
 
 
 # In[3]:
@@ -47,7 +57,11 @@ from sklearn.metrics.pairwise import cosine_similarity
 # 1. Primary Dataset: Chess Olympiad Results (2 MB)
 # 3. Secondary Dataset: FIDE Rated Players Dataset (435 MB)
 # 5. Geo-data - GeoJSON and csv (24 MB)
-from download_assets import status
+# Importing `assets` has no side effects; missing assets are fetched concurrently here.
+# Set CHESS_OFFLINE=1 to fail fast instead of downloading, or CHESS_MIRROR_DIR to read from a local mirror.
+import assets
+missing_assets = assets.ensure_all()
+missing_assets
 
 
 # ### 1. Primary Dataset: Chess Olympiad Results
@@ -67,40 +81,36 @@ from download_assets import status
 
 
 # Cell for Demonstration Purposes
-pd.read_excel('data/primary/chessResultsList_2010.xlsx').head(8)
+# closing() shuts the workbook (and its file handle) even though only the first rows are read
+with closing(olympiads.iter_sheet_rows(assets.path('olympiad_2010'))) as sheet_rows:
+    first_rows_df = pd.DataFrame(islice(sheet_rows, 1, 9))
+first_rows_df
 
 
 # In[5]:
 
 
-years = [2010,2012,2014,2016,2018,2022]
-filenames = ['data/primary/chessResultsList_{}.xlsx'.format(year) for year in years]
-colnames = ['board', 'title', 'name', 'rating', 'federation', 'points', 'games', 'rating_performance']
-olympiads_df = []
-for i,year in enumerate(years):
-    if year == 2018:
-        col_index = [0,1,2,3,4,17,18,20]
-    else:
-        col_index = [0,1,2,3,4,16,17,18]
-    df = pd.read_excel(filenames[i])
-    cleaned_df = df.iloc[:, col_index]
-    cleaned_df.columns = colnames
-    boards = pd.to_numeric(cleaned_df['board'], errors='coerce')
-    non_nan_indices = boards.notna().index[boards.notna()]
-    trimmed_df = cleaned_df.loc[non_nan_indices,:].reset_index(drop=True)
-    trimmed_df['year'] = year
-    olympiads_df.append(trimmed_df)
+# the Olympiads (and FIDE lists) we use are listed in assets.py; the cleaning steps of this notebook are the stages of
+# pipeline.py (olympiads, rated_players, olympiad_players, world_bank, country_codes, economic_features, capitals),
+# run here once: a stage is only recomputed when one of its files, its code or a stage it reads changed, otherwise
+# its last output is loaded from data/cache, so adding a year only reprocesses what depends on the new file
+years = list(assets.OLYMPIADS)
+filenames = [assets.path('olympiad_{}'.format(year)) for year in years]
+cleaning = pipeline.cleaning_pipeline()
+cleaned = cleaning.run(['olympiads', 'rated_players', 'olympiad_players', 'world_bank', 'country_codes',
+                        'economic_features', 'capitals'])
+cleaning.last_run
 
 
 # #### How did we manipulate the dataset?
-# Recall that we had to clean six datasets as there are six Olympiads between 2010 and 2022. However, although the six excel files share a similar overall structure, they are each unique in their own ways. Some have columns that others don't, while some have fewer header rows than others. Fortunately, we just had to grab the columns that we were interested in for each dataset by specifying their indices, read the entire file into rows in a df, and filter rows based on whether their value in the first column is numeric. For player-rows, the first column is board number (always 1~5), so we just grabbed those rows for each excel file and make each year its own dataframe. Since we selected the same columns when generating each of the six Olympiad dataframes, we can simply merge them together through pd.concat. Before merging them, we added a 'year' column so that we know which year each player-row was originally from.
+# Recall that we had to clean six datasets as there are six Olympiads between 2010 and 2022. However, although the six excel files share a similar overall structure, they are each unique in their own ways. Some have columns that others don't, while some have fewer header rows than others. Fortunately, every team block starts with a header row whose first cell is 'Bo.', so `olympiads.py` looks the columns we are interested in up by their label in those header rows rather than by position, streams the rows of each workbook, and keeps the rows whose value in the first column is numeric. For player-rows, the first column is board number (always 1~5), so we just grabbed those rows for each excel file and make each year its own dataframe. Since we selected the same columns when generating each of the six Olympiad dataframes, they are simply concatenated, and since parsing excel files is slow, each parsed workbook is cached until the file changes. Before merging them, we added a 'year' column so that we know which year each player-row was originally from.
 
 # In[6]:
 
 
 # Cell for Demonstration Purposes
-list1 = pd.read_excel(filenames[4]).loc[18].tolist()
-list2 = pd.read_excel(filenames[0]).loc[18].tolist()
+list1 = olympiads.header_row(filenames[4])
+list2 = olympiads.header_row(filenames[0])
 longer_list, shorter_list = (list1, list2) if len(list1) >= len(list2) else (list2, list1)
 shorter_list.extend([np.nan] * (len(longer_list) - len(shorter_list)))
 df = pd.DataFrame([longer_list, shorter_list]).T
@@ -108,38 +118,38 @@ df.columns = range(len(df.columns))
 df.T
 
 
-# In[7]:
+# In[ ]:
 
 
-olympiads_merge_df = pd.concat(olympiads_df, axis=0)
-olympiads_merge_df.reset_index(drop=True, inplace=True)
+#the olympiads stage: columns are located by their label in each team's 'Bo.' header row (parsed workbooks are cached),
+#then the edge cases are handled (see olympiads.FEDERATION_RENAMES and olympiads.DROPPED_FEDERATIONS):
+#Trinidad and Tobago switched country codes in 2014, we will use their official IOC code (TTO) throughout our analysis,
+#Taiwan, Kosovo and the Netherlands Antilles are dropped, and it makes more sense to consider the GBR 'territories'
+#(England, Scotland, Wales, Jersey and Guernsey) as the same country
+olympiads_merge_df = cleaned['olympiads']
+olympiads_merge_df.sample(5,random_state=42)
+#olympiads_merge_df[olympiads_merge_df['federation'] == 'BHU']
 
-numeric_cols = ['board', 'rating', 'points', 'games', 'rating_performance', 'year']
-olympiads_merge_df[numeric_cols] = olympiads_merge_df[numeric_cols].apply(pd.to_numeric, errors='coerce')
 
-#Handling edge cases
-#Trinidad and Tobago switched country codes in 2014
-indices_to_edit = olympiads_merge_df[olympiads_merge_df['federation']=='TRI'].index 
-olympiads_merge_df.loc[indices_to_edit, 'federation'] = 'TTO' #we will use thier official IOC code throughout our analysis
+# In[ ]:
 
-#Drop Taiwan and Kosovo
-olympiads_merge_df = olympiads_merge_df[~((olympiads_merge_df['federation'] == 'TPE') | (olympiads_merge_df['federation'] == 'KOS'))]
 
-#Drop Netherland Antilles
-olympiads_merge_df = olympiads_merge_df[~(olympiads_merge_df['federation'] == 'AHO')]
+# round-by-round results (read from the cached workbooks) as one long table, then expected score and rating
+# discrepancy of every player and federation in all six Olympiads at once; the expected score is the workbook's
+# per-game sum (we) where it has one, otherwise it is approximated against the player's average opponent
+round_columns_df = olympiads.load_olympiads(filenames, years, columns=olympiads.ROUND_COLUMNS + ['k', 'w', 'we']).drop(columns='year')
+olympiad_games_df = olympiads_merge_df.join(round_columns_df)
+round_results_df = elo.round_results(olympiad_games_df)
+player_scores_df = elo.score_players(olympiad_games_df, round_results_df)
+federation_scores_df = elo.federation_scores(olympiads_merge_df, player_scores_df)
+federation_scores_df.sort_values('discrepancy_per_game', ascending=False).head()
 
-#It makes more sense to consider GBR 'territories' as the same country
-gbr_index = (
-    (olympiads_merge_df['federation'] == 'ENG') | #England
-    (olympiads_merge_df['federation'] == 'SCO') | #Scotland
-    (olympiads_merge_df['federation'] == 'WLS') | #Wales
-    (olympiads_merge_df['federation'] == 'JCI') | #Jersey
-    (olympiads_merge_df['federation'] == 'GCI') #Guernsey
-)
 
-olympiads_merge_df.loc[gbr_index, 'federation'] = 'GBR'
-olympiads_merge_df.sample(5,random_state=42)
-#olympiads_merge_df[olympiads_merge_df['federation'] == 'BHU']
+# In[ ]:
+
+
+# how far the average-opponent approximation is from the workbook's per-game expected scores
+elo.expected_check(player_scores_df, olympiad_games_df['year'])
 
 
 # ### 2. Secondary Dataset: World Bank Data
@@ -149,7 +159,7 @@ olympiads_merge_df.sample(5,random_state=42)
 # #### What Does the Dataset Look Like?
 # The `world_bank_df` contains data on economic and demographic indicators for 217 countries over the years 2007 to 2022. It includes columns for country names, codes, indicator names, and indicator codes, along with separate columns for each year's data. Each row represents a specific data point for a given combination of country, indicator, and year. Some cells contain ".." values, indicating missing or unavailable data, while some FIDE federations are not even present in this dataset for political reasons, as this is a Dataset published by the United Nations. Excluded federations like Taiwan or Kosovo will be dropped from our analysis, as will countries who did not provide economic data, for certain indicators, should we perform analysis on those. We will apply filtering, grouping, and aggregation to this dataframe before proceeding further in our analysis.
 # #### How Did We Manipulate the Dataset?
-# The dataset is loaded from a CSV file, and a list of specific years (from 2007 to 2018) is created, representing the years of economic data to be used. Next, missing data, represented as ".." in the dataset, is replaced with NaN values using the replace method. We calculate the percentage of available data for each economic indicator per country, determining how much data is present for each category, and a threshold (set at 90%) is applied to filter out economic indicators that don't meet the specified data completeness criteria. The list of economic indicators that meet the threshold is stored in the `above_threshold_indicators` variable, and rows in the dataset are filtered to keep only those corresponding to the selected economic indicators.
+# The dataset is loaded from a CSV file, and a list of specific years (from 2007 to 2018) is created, representing the years of economic data to be used. Missing data, represented as ".." in the dataset, is read as NaN while parsing, and the data is reshaped once into a country x indicator x year panel. We calculate the percentage of available data for each economic indicator per country, determining how much data is present for each category, and a threshold (set at 90%) is applied to filter out economic indicators that don't meet the specified data completeness criteria. The list of economic indicators that meet the threshold is stored in the `above_threshold_indicators` variable, and rows in the dataset are filtered to keep only those corresponding to the selected economic indicators.
 # 
 # 
 # 
@@ -158,49 +168,36 @@ olympiads_merge_df.sample(5,random_state=42)
 # In[8]:
 
 
-world_bank_df = pd.read_csv('data/secondary/World_Development_Indicators/world_bank_data.csv')
+# the world_bank stage: '..' is read as missing and every year column as float32 while parsing, and only the indicators
+# with data for more than pipeline.COMPLETENESS_THRESHOLD (90%) of the (country, year) cells are kept
+world_bank_df = cleaned['world_bank']
 
 
-# In[9]:
+# In[ ]:
 
 
 #Years we will use, currently using economic data 3 years before
 #each olympiad takes place (e.g. 2007 economic data for 2010 chess olympiad)
-years_list = [f"{year} [YR{year}]" for year in range(2007, 2020, 2)]
-
-#Replace ".." in data with NaN
-world_bank_df = world_bank_df.replace("..", np.nan)
-
-#Counting how much existing data per category we have
-series_counts = world_bank_df.groupby('Series Name').count()
+years_list = list(range(2007, 2020, 2))
 
-#Calculate what percentage of data we have (in terms data for each country)
-series_counts['Percentage_With_Data'] = series_counts[years_list].sum(axis=1) / len(years_list) / series_counts['Country Name']
+#Reshape once into a country x indicator x year panel
+world_bank_panel = world_bank.to_panel(world_bank_df)
 
-#Filter rows based on a threshold
-threshold = .9
-series_counts_filtered = series_counts[series_counts['Percentage_With_Data'] > threshold]
+#What percentage of data we have (in terms data for each country) for the indicators that meet the threshold
+series_counts_filtered = world_bank.indicator_completeness(world_bank_panel, years_list)
 
 #List of economic indicators that have amount of data that meet the threshold
 above_threshold_indicators = series_counts_filtered.index.tolist()
 series_counts_filtered.head(3)
 
 
-# In[10]:
+# In[ ]:
 
 
 above_threshold_indicators
 
 
-# In[11]:
-
-
-#Only keep rows from series which meet our threshold
-world_bank_df = world_bank_df[world_bank_df['Series Name'].isin(above_threshold_indicators)]
-world_bank_df["Country Name"] = world_bank_df['Country Name'].str.strip()
-
-
-# In[12]:
+# In[ ]:
 
 
 world_bank_df.head(3)
@@ -209,25 +206,25 @@ world_bank_df.head(3)
 # ### 3. Secondary Dataset: FIDE Rated Players Dataset
 # The third dataset we're going to work with is one of our secondary datasets: FIDE Rated Players Dataset.
 # #### How We Procured This Dataset
-# FIDE published ratings lists for the years 2010 to 2022 were procured from the FIDE website, from the ratings archive via the python script `download_assets.py`. The script employs the requests library to fetch data files, creates a zip buffer to store the downloaded content, and then iteratively downloads and extracts the data. It also handles the variation in file naming conventions. This process ensures that the required dataset, contained within zip archives, is retrieved and made accessible for further data manipulation and analysis in our preferred destination file.
+# FIDE published ratings lists for the years 2010 to 2022 were procured from the FIDE website, from the ratings archive via the python script `download_assets.py`. Every list is registered in `assets.py` with its URL and local path (which also handles the variation in file naming conventions). The script fetches the zip archives concurrently over one requests session, resumes interrupted downloads, extracts each archive to disk in chunks and records the size and checksum of every extracted list in `data/manifest.json`, so a list is only downloaded again when it is missing or has changed.
 # 
 # #### What Does the Dataset Look Like?
 # This dataset is of a less common format: fixed-width format file. A fixed-width format file is a data storage format where each column in the dataset has a predetermined and consistent width, with data values aligned within their respective columns. Converting it into a CSV file can be challenging because you need to accurately identify and define column widths to properly separate and structure the data, which can be complex and error-prone, especially in datasets with numerous columns or irregular spacing. In this case, we fortunately have a (poorly and inconsistently formatted) columns header to work with.
 # 
 # #### How Did We Manipulate the Dataset?
-# The key to decoding this fwf file is to figure out the columns and column width of each column in each file. However, we can't split on spaces because the 'ID number' is one column; we can't split on uppercase characters because 'ID Number' is one column, while 'jan13' is also a column. Ultimately, for the first row in each file, we had to iterate through each character to find the `capitalized_indices`, add the index of occurences of 'j', and eliminate extra indices between position zero and 10 (sometimes the 'n' in ID number is capitalized). Next, we calculated the column widths based on the values of the differences between adjacent `capitalized_indices`, and finally, we hard coded the column names for each dataset for consistency purposes. We renamed the columns for each df, generated through `pd.read_fwf(file_path)`, and selected the relevant columns, as well as added a year column, then merged the players df for each year into one big fide rated players dataframe. Finally, we handled some federations edge cases, and also standardized the 'title' column.
+# The key to decoding this fwf file is to figure out the columns and column width of each column in each file. We can't simply split on spaces because 'ID Number' is one column, and we can't split on uppercase characters alone because 'jan13' is also a column while some headers run names together ('TitlFed', 'GamesBorn'). `fide_lists.parse_header` therefore starts a column at every word of the header line and wherever a capital follows a lowercase letter inside a word, and maps each header name to a canonical column name ('Tit'/'Titl' become 'title', 'Gms'/'Games' become 'games', the period column becomes 'rating'). The resulting layout is fingerprinted and kept in a registry of known schemas, so each list format is only worked out once. `fide_lists.read_fide_list` then memory-maps a list and cuts the byte range of every requested column out of all rows at once with NumPy, decoding only the columns we ask for. `fide_lists.ingest_fide_lists` reads every yearly list this way in its own worker process, drops rows without a usable id or rating, handles some federation edge cases, standardizes the 'title' column and adds a year column; the parsed lists are cached column by column, and are combined into one big fide rated players dataframe with compact dtypes.
 
 # In[13]:
 
 
 # Cell for Demonstration Purposes
 try:
-    with open('data/secondary/fide_ratings_list/standard_jan12frl.txt', 'r') as file:
+    with open(assets.path('fide_2012'), 'r') as file:
         lines = 0
         while lines < 3:
             lines += 1
             print(file.readline())
-    with open('data/secondary/fide_ratings_list/standard_jan13frl.txt', 'r') as file:
+    with open(assets.path('fide_2013'), 'r') as file:
         lines = 0
         while lines < 3:
             lines += 1
@@ -239,167 +236,124 @@ except FileNotFoundError as e:
 # In[14]:
 
 
-years = list(range(10,24))
-file_paths = ['data/secondary/fide_ratings_list/standard_jan{}frl.txt'.format(year) for year in years]
-
-list_of_colnames = []
-list_of_column_widths = []
-for file_path in file_paths:
-    with open(file_path, 'r') as file:
-        first_line = file.readline() #This is the Column Names line, we'll use it to format our variable-width column txt file
-        #Getting Format of variable-width columns (first letter of columns is usually capitalized)
-        capitalized_indices = [index for index, char in enumerate(first_line) if char.isupper() or char == 'j'] #Because our data is from January of each year; Jan{} and jan{}
-        col_start_indices = [capitalized_indices[0]] + [capitalized_indices[i] for i in range(1, len(capitalized_indices)) if capitalized_indices[i] != capitalized_indices[i - 1] + 1]
-        col_start_indices.append(len(first_line)-1) #So that we can more easily compute the differences, aka column width
-        col_start_indices = [x for x in col_start_indices if x >= 10 or x == 0] #Problem with ID Number
-        # Creating the Colnames
-        colnames = []
-        for i in range(len(col_start_indices)-1):
-            start_index = col_start_indices[i]
-            end_index = col_start_indices[i + 1]
-            colname = first_line[start_index:end_index].strip() #We get the column name in string
-            colnames.append(colname)
-        colnames = ['Rating' if column_name.lower().startswith('jan') else column_name for column_name in colnames] #More descriptive colname
-        colnames = ['Fide_id' if column_name.lower().startswith('id') else column_name for column_name in colnames] #Better and universal colname
-        list_of_colnames.append(colnames) #The formatting changed over the years, so we have different colnames for each year
-        # Computing variable-width columns width
-        column_widths = [col_start_indices[i + 1] - col_start_indices[i] for i in range(len(col_start_indices) - 1)]
-        list_of_column_widths.append(column_widths)
-list_of_colnames[0]
-
-
-# In[15]:
-
-
-#collect all the rated players by year in a list of dataframes
-rated_players_by_year_df = []
-for i in range(len(file_paths)):
-    file_path = file_paths[i]
-    column_widths = list_of_column_widths[i]
-    column_names = list_of_colnames[i]
-    result_df = pd.DataFrame(columns=list_of_colnames[i])
-    df = pd.read_fwf(file_path, widths=column_widths, names=column_names, encoding='unicode_escape')
-    df = df.drop(0).reset_index(drop=True)
-    rated_players_by_year_df.append(df)
-
-#store all the rated players in the same df
-relevant_columns = ['fide_id', 'name', 'title', 'federation', 'rating']
-trimmed_rated_players = []
-for i,df in enumerate(rated_players_by_year_df):
-    if i < 3:
-        df.columns = ['fide_id', 'name', 'title', 'federation', 'rating', 'Games', 'Born', 'Flag']
-    elif i < 7:
-        df.columns = ['fide_id', 'name', 'federation', 'Sex', 'title', 'WTit', 'OTit', 'rating', 'Gms', 'K', 'B-day', 'Flag']
-    else:
-        df.columns = ['fide_id', 'name', 'federation', 'Sex', 'title', 'WTit', 'OTit', 'FOA', 'rating', 'Gms', 'K', 'B-day', 'Flag']
-    
-    df_trim = df.copy()[relevant_columns]
-    df_trim['year'] = 2010+i
-    trimmed_rated_players.append(df_trim)
-rated_players_df = pd.concat(trimmed_rated_players, axis=0)
-
-#slightly modify the federation codes
-gbr_index = (
-    (rated_players_df['federation'] == 'ENG') | #England
-    (rated_players_df['federation'] == 'SCO') | #Scotland
-    (rated_players_df['federation'] == 'WLS') | #Wales
-    (rated_players_df['federation'] == 'JCI') | #Jersey
-    (rated_players_df['federation'] == 'GCI') #Guernsey
-)
-caf_index = rated_players_df['federation'] == 'CAF' #Central African Republic
-
-rated_players_df.loc[gbr_index, 'federation'] = 'GBR'
-rated_players_df.loc[caf_index, 'federation'] = 'CAR'
-
-numeric_cols = ['fide_id', 'rating', 'year']
-rated_players_df[numeric_cols] = rated_players_df[numeric_cols].apply(pd.to_numeric, errors='coerce')
-rated_players_df.dropna(subset=numeric_cols, inplace=True)
-rated_players_df[numeric_cols] = rated_players_df[numeric_cols].astype(int)
-
-title_dict = {
-    'c': 'CM',  # Candidate Master
-    'f': 'FM',  # FIDE Master
-    'm': 'IM',  # International Master
-    'g': 'GM',  # Grandmaster
-    'wc': 'WCM',  # Woman Candidate Master
-    'wf': 'WFM',  # Woman FIDE Master
-    'wm': 'WIM',  # Woman International Master
-    'wg': 'WGM',   # Woman Grandmaster
-    'CM': 'CM',  # Candidate Master
-    'FM': 'FM',  # FIDE Master
-    'IM': 'IM',  # International Master
-    'GM': 'GM',  # Grandmaster
-    'WCM': 'WCM',  # Woman Candidate Master
-    'WFM': 'WFM',  # Woman FIDE Master
-    'WIM': 'WIM',  # Woman International Master
-    'WGM': 'WGM'   # Woman Grandmaster
-}
-rated_players_df['title'] = rated_players_df['title'].map(title_dict).fillna(np.nan)
-
-rated_players_df.reset_index(drop=True, inplace=True)
+fide_years = assets.FIDE_LIST_YEARS
+file_paths = [assets.path('fide_{}'.format(year)) for year in fide_years]
+
+#The formatting changed over the years, so every file's header line (its Column Names line) is fingerprinted
+#and matched to a known schema: the old jan10frl layout, the standard layout with Sex/WTit, and the later one with FOA
+fide_schemas = [fide_lists.schema_for_file(file_path) for file_path in file_paths]
+{year: schema.name for year, schema in zip(fide_years, fide_schemas)}
+
+
+# In[ ]:
+
+
+#the rated_players stage collects all the rated players in the same df; each list is parsed in its own worker process, which also
+#drops rows without a usable id or rating, slightly modifies the federation codes (ENG, SCO, WLS, JCI and GCI become GBR, CAF becomes CAR)
+#and normalises the titles (e.g. 'g' and 'GM' both become 'GM', see fide_lists.TITLES)
+#parsed lists are cached column by column under data/cache, so later runs only re-parse lists whose file changed
+rated_players_df = cleaned['rated_players']
 rated_players_df.sample(5, random_state=42)
 
 
+# In[ ]:
+
+
+#ids, ratings and years are stored as small integers and the text columns as categoricals, so repeated federations,
+#titles and names are stored once; compare against the object/int64 frame we used to build
+fide_lists.memory_report(rated_players_df)
+
+
+# In[ ]:
+
+
+#a sorted fide_id index over a player x rating-list matrix, so a player's trajectory is a binary search instead of a full-frame mask
+#e.g. player_store.rating_delta(fide_ids, 2014) gives each player's rating change in the 12 months before the 2014 Olympiad
+player_store = PlayerRatingStore.from_frame(rated_players_df)
+player_store.history(rated_players_df['fide_id'].iloc[0])
+
+
+# In[ ]:
+
+
+#the 'chess culture' metrics of every federation in every list (rated players, players per title, mean rating of the
+#best 1/4/10/50 players and rating quantiles) are computed once into a federation x year cube, so a query is an index lookup
+#e.g. federation_culture.get('IND', 2022, 'top10_mean'); a new list is added with federation_culture.update(new_rows)
+federation_culture = CultureCube.from_players(rated_players_df)
+federation_culture.frame(['IND', 'USA'], [2014, 2022])
+
+
+# In[ ]:
+
+
+#the Olympiad workbooks have no FIDE ids, so we link each Olympiad player to the January list of the Olympiad year:
+#candidates are blocked by federation and list year, exact name matches are taken first and the rest are scored with TF-IDF
+#players whose best and runner-up candidates are too close are reported as ambiguous and left unlinked (fide_id -1);
+#this is the olympiad_players stage, the Olympiad frame with the fide_id, scores and status of every player's link
+olympiad_players_df = cleaned['olympiad_players']
+olympiads_merge_df['fide_id'] = olympiad_players_df['fide_id']
+linker.linkage_report(olympiad_players_df, rated_players_df)
+
+
 # ### 4. Secondary Dataset: Country Code
 # The fourth dataset we're going to work with is one of our secondary datasets: Country Code
 # 
 # #### How We Procured This Dataset
-# Originally, we did not expect to need a dataset like this, but unfortunately, the country code that is used for our Primary Dataset: Chess Olympiad Results, and our Secondary dataset: World Bank Data, is different. The former uses the IOC (International Olympic Committee) country code convention, while the latter uses the ISO (International Organization for Standardization) country codes. Fortunately, a Wikipedia page on Comparison of alphabetic country codes has a table that lists the different country codes for each federation in our Primary Dataset, enabling us to effectively combine datasets. We sent a request to the Wikipedia page to fetch HTML data, and we used the Pandas library to read the HTML tables from the response text.
+# Originally, we did not expect to need a dataset like this, but unfortunately, the country code that is used for our Primary Dataset: Chess Olympiad Results, and our Secondary dataset: World Bank Data, is different. The former uses the IOC (International Olympic Committee) country code convention, while the latter uses the ISO (International Organization for Standardization) country codes. Fortunately, a Wikipedia page on Comparison of alphabetic country codes has a table that lists the different country codes for each federation in our Primary Dataset, enabling us to effectively combine datasets. We originally read the table straight from the Wikipedia page; a versioned copy of it, extended with the FIDE code and the capitals-csv name of every federation, is now bundled with the repository (`data/secondary/country_codes`), so the pipeline runs without network access.
 # 
 # #### What Does the Dataset Look Like?
-# It has four columns. The first column is Country, which contains the names of various countries. The 'IOC' column contains the International Olympic Committee country codes. These codes are used in the context of the Olympic Games, as well as in chess. The 'FIFA' column contains the FIFA (Fédération Internationale de Football Association) country codes, in this context, certain FIDE federations that are not IOC federations uses the FIFA code. Finally, the ISO column contains the ISO country codes. ISO codes are standardized codes used for various purposes, including international data exchange and identification of countries.
+# It has six columns. The 'fide_code' column holds the code FIDE uses for the federation, and the 'country' column the name of the country. The 'ioc' column contains the International Olympic Committee country codes. These codes are used in the context of the Olympic Games, as well as in chess. The 'fifa' column contains the FIFA (Fédération Internationale de Football Association) country codes, in this context, certain FIDE federations that are not IOC federations uses the FIFA code. The 'iso' column contains the ISO country codes. ISO codes are standardized codes used for various purposes, including international data exchange and identification of countries. Finally, 'capital_name' is the name the country has in our capital coordinates dataset.
 # 
 # #### How Did We Manipulate the Dataset?
-# This Dataset will serve as a `keys_table`. Similar to the Primary and Foreign keys concept in SQL, for the previous 3 datasets that we looked at, country code (albeit different systems) are their primary keys. By storing the federation name, chess country code, and UN country code in the same dataframe, we're able to easily cross reference different dataframes for any given country. The only problem was, although FIDE (chess) country code was mostly based on IOC code, there were a few edge cases that we had to handle. The Primary dataset, as its name suggests, takes precedence over all other datasets. The federations we are interested in, therefore, are all of which appeared in the primary dataset. Therefore, we began building our `country_codes_table` by looping through the unique federations codes in our primary dataset, checking if the federation code matches any of the IOC codes, and if it does, we add a new row of three values to our `country_codes_table`, country, `fide_code`, and `country_code`. For one reason or another, the Faroe Islands, Monaco, and the Central African Republic either cannot be matched this way, so we had to hard code the three countries after confirming which federations the non-matching edge cases in the unique federations were, and adding the corresponding `country_code` to the three rows.
+# This Dataset will serve as a `keys_table`. Similar to the Primary and Foreign keys concept in SQL, for the previous 3 datasets that we looked at, country code (albeit different systems) are their primary keys. By storing the federation name, chess country code, and UN country code in the same dataframe, we're able to easily cross reference different dataframes for any given country. The only problem was, although FIDE (chess) country code was mostly based on IOC code, there were a few edge cases that we had to handle. The Primary dataset, as its name suggests, takes precedence over all other datasets. The federations we are interested in, therefore, are all of which appeared in the primary dataset. Our `country_codes_table` has one row per unique federation code in our primary dataset, with three values: the country, the `fide_code` and the `country_code` (ISO). `country_codes.country_codes_table` looks all the codes up at once, first as FIDE codes, then as IOC and FIFA codes, so older or borrowed codes resolve to the same row. The Faroe Islands, Monaco and the Central African Republic use FIDE codes that are neither IOC nor FIFA codes, which is why the crosswalk has a `fide_code` column of its own rather than the edge cases being hard coded in the notebook.
 
 # In[16]:
 
 
-url = 'https://en.wikipedia.org/wiki/Comparison_of_alphabetic_country_codes'
-response = requests.get(url)
-tables = pd.read_html(response.text)
+# a versioned copy of the table is bundled in data/secondary/country_codes, so nothing is fetched
+country_codes_df = country_codes.load_crosswalk()
 
 
 # In[17]:
 
 
-country_codes_df = tables[0].drop(columns=['Flag', '*']) #Drop the irrelevant columns in the first table, which is the one we're interested in.
-for i,row in country_codes_df.iterrows(): #Some countries in the Olympics further divide in other competitions 
-    if pd.isna(row['IOC']): #For example, IOC has GBR, but FIFA has England, Scotland, and Wales
-        row['IOC'] = row['FIFA'] #We try to make the IOC column more complete, for example, FIFA and FIDE labels England ENG, but not IOC.
+#Codes are looked up as FIDE codes first, then IOC and FIFA codes, for example, FIFA and FIDE label England ENG, but not IOC.
 country_codes_df.head()
 
 
 # ### Preparation to Merge on Countries in the Olympiad Dataset
 
-# In[18]:
-
-
-federations = [] #This will be the country full name column in the country code look-up table
-feds_fide = [] #This will be the country fide code column in the country code look-up table
-feds_iso = [] #This will be the country nation code column in the country code look-up table
-hardcode_indexed_feds = [] #this is a containers to handle edgecases
-hardcode_federations = ['Faroe Islands','Monaco','Central African Republic'] 
-#Had to manually google which federations the remaining hardcode_indexed_feds were
-
-for fed in olympiads_merge_df['federation'].unique(): #Macau
-    try:
-        row_index = country_codes_df[country_codes_df['IOC'] == fed].index[0]
-        federations.append(country_codes_df.loc[row_index, 'Country'])
-        feds_fide.append(country_codes_df.loc[row_index, 'IOC'])
-        feds_iso.append(country_codes_df.loc[row_index, 'ISO'])
-    except:
-        hardcode_indexed_feds.append(fed)
-for i in range(len(hardcode_indexed_feds)): #We finish up by appending the hardcoded countries to our future columns
-    row_index = country_codes_df[country_codes_df['Country'] == hardcode_federations[i]].index[0]
-    federations.append(hardcode_federations[i])
-    feds_fide.append(hardcode_indexed_feds[i])
-    feds_iso.append(country_codes_df.loc[row_index, 'ISO'])
-federations = [re.sub(r'\[[0-9]+\]', '', country) for country in federations] #Cleaning up Country Names
-country_codes_table = pd.DataFrame({'federation': federations, 'fide_code': feds_fide, 'country_code': feds_iso})
+# In[ ]:
+
+
+#The Faroe Islands (FAI), Monaco (MNC) and the Central African Republic (CAR) use FIDE codes that are neither IOC
+#nor FIFA codes, the crosswalk has a row for them all the same (country_codes stage)
+country_codes_table = cleaned['country_codes']
 country_codes_table.tail()
 
 
+# In[ ]:
+
+
+# economic data of each federation for every Olympiad, lagged three years (2007 data for the 2010 Olympiad);
+# where that year is missing the nearest earlier year is used. Computed once (economic_features stage), then joined onto any frame
+economic_features_df = cleaned['economic_features']
+world_bank.join_features(olympiads_merge_df, economic_features_df).head()
+
+
+# In[ ]:
+
+
+#does the rating discrepancy of a federation depend on its wealth, its chess culture and their interaction?
+#with ~150 federations per Olympiad we rely on 10,000 bootstrap and 10,000 permutation resamples per term rather than
+#textbook standard errors (the permutation p-value of each slope permutes the residuals of the model without it);
+#resampling.py fits each batch of resamples at once and spreads the batches over processes
+regression_df = resampling.feature_table(federation_scores_df, economic_features_df, federation_culture)
+regression_df['log_gdp_per_capita'] = np.log(regression_df['NY.GDP.PCAP.CD'])
+resampling.resampling_study(regression_df, 'discrepancy_per_game', ['log_gdp_per_capita', 'top10_mean'],
+                            interactions=[('log_gdp_per_capita', 'top10_mean')])
+
+
 # ### 5. Secondary Dataset: Capital Coordinates
 # The fifth dataset we're going to work with is one of our secondary datasets: Capital Coordinates
 # 
@@ -413,95 +367,55 @@ country_codes_table.tail()
 # It has six columns, but we'll mostly only be using Country, Latitude, and Longitude. It does not have a country code column, and the different naming conventions for country name is going to make our country matching task quite difficult.
 # 
 # #### How Did We Manipulate the Dataset?
-# This dataset has no primary key in the form of country code, so we have to match it with our `country_codes_table` through `country_name`. As things stand, our `country_codes_table` has three columns, two of which are country/fide codes, and one is federation name, or country name. We're going to try our best to match `country_codes_table['federation']` with `country_capital_df['Country']`. We will explain the process in more detail via inline comments in the `find_match_country` function, but in short, the function is designed to match a list of query strings (in this case, federation names) with a list of potential matching answers (country names). The function employs the TF-IDF (Term Frequency-Inverse Document Frequency) vectorization technique to calculate the similarity between queries and potential answers. In the first stage, it returns a list of best matches between queries and answers, along with a list of queries that didn't find a match, in the second stage, for countries/federations that are not similar enough per the judgement of TF-IDF, we try to match the first four letters of each unpaired federation with country names until a match is found. We probably could have hard coded since there weren't that many countries. Finally, we hardcoded three countries that wasn't able to find a match through the previous steps.
+# This dataset has no primary key in the form of country code, so we have to match it with our `country_codes_table` through `country_name`. As things stand, our `country_codes_table` has three columns, two of which are country/fide codes, and one is federation name, or country name. We're going to try our best to match `country_codes_table['federation']` with `country_capital_df['Country']`. The bundled crosswalk already records the capitals-csv name of most federations; the remaining ones are matched with the `find_match_country` function in `matching.py`. In short, the function is designed to match a list of query strings (in this case, federation names) with a list of potential matching answers (country names). The function employs the TF-IDF (Term Frequency-Inverse Document Frequency) vectorization technique to calculate the similarity between queries and potential answers. In the first stage, it returns a list of best matches between queries and answers, along with a list of queries that didn't find a match, in the second stage, for countries/federations that are not similar enough per the judgement of TF-IDF, we try to match the first four letters of each unpaired federation with country names until a match is found. We probably could have hard coded since there weren't that many countries. Finally, we hardcoded three countries that wasn't able to find a match through the previous steps.
 
 # In[19]:
 
 
-country_capital_df = pd.read_csv('data/secondary/country-capital-lat-long-population/country-capital-lat-long-population.csv')
+country_capital_df = pd.read_csv(assets.path('capitals'))
 numeric_cols = ['Latitude','Longitude','Population']
 country_capital_df[numeric_cols] = country_capital_df[numeric_cols].apply(pd.to_numeric, errors='coerce')
 country_capital_df.head()
 
 
-# In[20]:
-
-
-# the function takes in two lists, a list of queries (federations), and a list of potential matches (country names)
-def find_match_country(queries_list, matching_list,perfect=False):
-    # we're going to be using some list operations
-    if not type(queries_list) == list:
-        queries = queries_list.tolist()
-    else:
-        queries = queries_list
-    if not type(matching_list) == list:
-        possible_answers = matching_list.tolist()
-    else:
-        possible_answers = matching_list
-    # Create a TF-IDF vectorizer
-    vectorizer = TfidfVectorizer()
-    # Fit and transform the vectorizer on all the possible answers
-    tfidf_matrix = vectorizer.fit_transform(possible_answers)
-
-    # instantiate the containers for matches, so that we can easily extract matches and prevent duplicates
-    best_matches = []
-    no_match = []
-    past_matches = set()
-    
-    for query in queries:
-        # Does query contain island, islands often end up as false positive matches
-        contains_island = 'island' in query.lower()
-        # Transform the query into a TF-IDF vector
-        query_vector = vectorizer.transform([query])
-        # Calculate cosine similarities between the query and possible answers
-        similarities = cosine_similarity(query_vector, tfidf_matrix)
-        # Find the index of the best match, and sort the matches based on cosine similarity score 
-        similarity_indices = similarities.argsort()[0][::-1]
-        for best_match_index in similarity_indices:
-            best_answer = possible_answers[best_match_index]
-            similarity_score = round(similarities[0][best_match_index], 3) #rounding doesn't change anything
-            if not contains_island: # if the query is not an island
-                if 'island' not in best_answer.lower(): # the best answer should not contain island either
-                    if similarity_score > 0.6: # in that case, if the two are similar enough
-                        if not best_match_index in past_matches: # and the best answer is not a previous answer
-                            best_matches.append((query, best_answer)) # we add the federation, country pair to a list
-                            past_matches.add(best_match_index) # and we log the index of best match country so that it won't be matched again
-                            break  # break the loop if a matching answer is found
-                else: # if the best_answer fails any of the conditions
-                    continue # continue onto the next best answer by cosine similarity score 
-            else: # if the query is an island
-                if similarity_score > 0.6: # if the two are similar enough
-                    if not best_match_index in past_matches: # and the best answer is not a previous answer
-                        best_matches.append((query, best_answer)) # we add the federation, country pair to a list
-                        past_matches.add(best_match_index) # and we log the index of best match country so that it won't be matched again
-                        break # break the loop if a matching answer is found
-                else: # if the best_answer fails any of the conditions
-                    continue # continue onto the next best answer by cosine similarity score 
-        else: # if none of the potential matches fulfill all of the conditions
-            no_match.append(query) # we add the federation that failed to register a match to the list no_match 
-    if perfect: # during development, we sometimes wanted to see the contents of no_match, and would set perfect = False
-        candidates = [possible_answers[i] for i in range(len(possible_answers)) if i not in past_matches] # update the potential matches list
-        still_no_match = [] # instantiate the container for federations that still are unable to register a match after the following sequence
-        still_no_match_ans = ["Swaziland","Lao People's Democratic Republic", "Faeroe Islands"] # these are the answers
-        for country in no_match: # for federations that did not match through the tf-idf method
-            count = 0 # a count variable that keeps track of how many countries the federation has tried matching
-            country_substring = unidecode(country[:4]) # the first four letters of a federation becomes its country substring 
-            for candidate in candidates: # for each country in the list of countries that were not already matched by a federation in the tf-idf step
-                count += 1 # we add one to the count
-                if country_substring in candidate: # if the first four letters of a federation matches with a country
-                    best_matches.append((country, candidate)) # we declare a match and append the federation and country to the list of matches
-                    break # break out of the loop and start matching for the next federation
-                if count >= len(candidates): # if the federation has exhausted all the countries but finds no match
-                    still_no_match.append(country) # we add the federation to the list 'still_no_match'
-        for i in range(len(still_no_match)): # ultimately, we know the three federations that are in still_no_match
-            best_matches.append((still_no_match[i], still_no_match_ans[i])) # append federations in still no match with their corresponding answers
-    return best_matches # we get a complete list of tuples of (query, best_answer)
-
-country_name_dict = dict(find_match_country(country_codes_table['federation'],country_capital_df['Country'],True)) # we convert the tuple list to dict
-country_codes_table['federation_lat_long'] = country_codes_table['federation'].map(country_name_dict) # we map countries to country_codes_table
+# In[ ]:
+
+
+# the crosswalk knows most capital-csv names; the others are matched by find_match_country on the federation name
+# (capitals stage)
+country_codes_table = cleaned['capitals']
 country_codes_table.head() # and we get a new column 'federation_lat_long' that is the primary key of country_capital_df
 
 
+# In[ ]:
+
+
+#great-circle distance (km) from every federation's capital to every Olympiad host city, all pairs at once,
+#cached under the hash of the coordinates; distances.federation_distances gives capital-to-capital distances
+federation_coordinates = distances.federation_coordinates(country_codes_table, country_capital_df)
+host_distance_df = distances.host_distances(federation_coordinates)
+olympiads_merge_df['travel_km'] = distances.travel_distance(olympiads_merge_df, host_distance_df)
+host_distance_df.head()
+
+
+# In[ ]:
+
+
+#the choropleths draw countries.geojson simplified once per tolerance (geometry.TOLERANCES, in degrees) and cached as
+#flat coordinate arrays; a figure only takes the federations it shows, keyed by FIDE code, e.g.
+#px.choropleth(df, geojson=federation_geometries.geojson(df['federation']), locations='federation', featureidkey='id')
+federation_geometries = geometry.prepare_geometries()[geometry.DEFAULT_TOLERANCE]
+len(json.dumps(federation_geometries.geojson(country_codes_table['fide_code']))) / 2**20 # MB of geometry per figure
+
+
+# In[ ]:
+
+
+# time, peak memory and row counts of the stages above; run with CHESS_INSTRUMENT=1 (or =memory,profile) to fill it in,
+# the same records are written to data/instrumentation/<run>.jsonl
+instrument.summary()
+
+
 # In[21]:
 
 
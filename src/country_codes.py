@@ -0,0 +1,66 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import assets
+from matching import find_match_country
+
+# The FIDE / IOC / FIFA / ISO crosswalk bundled with the repository (data/secondary/country_codes), so
+# federation codes resolve without fetching the Wikipedia comparison table. Every code column is turned
+# into a dict once and whole columns of codes are mapped at a time.
+# A code is looked up as a FIDE code first, then as an IOC and a FIFA code, so older or borrowed codes
+# ('TRI' for Trinidad and Tobago, 'MON' for Monaco) resolve to the same row.
+# capital_name is the country's name in the capitals csv (country-capital-lat-long-population).
+
+CODE_COLUMNS = ['fide_code', 'ioc', 'fifa', 'iso']
+LOOKUP_ORDER = ('fide_code', 'ioc', 'fifa')
+
+@lru_cache(maxsize=None)
+def load_crosswalk(file_path=None):
+    file_path = file_path or assets.path('country_codes')
+    # 'NA' would otherwise be read as missing, only empty fields are
+    return pd.read_csv(file_path, na_values=[''], keep_default_na=False)
+
+@lru_cache(maxsize=None)
+def _row_index(column, file_path=None):
+    codes = load_crosswalk(file_path)[column]
+    return {code: row for row, code in enumerate(codes) if isinstance(code, str)}
+
+def rows(codes, by=LOOKUP_ORDER, file_path=None):
+    # crosswalk row of every code, -1 where no column in `by` knows it
+    codes = pd.Series(np.asarray(codes, dtype=object))
+    result = np.full(len(codes), -1, dtype=np.int64)
+    for column in by:
+        missing = result < 0
+        if not missing.any():
+            break
+        result[missing] = codes[missing].map(_row_index(column, file_path)).fillna(-1).to_numpy(dtype=np.int64)
+    return result
+
+def lookup(codes, column='iso', by=LOOKUP_ORDER, file_path=None):
+    # `column` of the crosswalk for every code, NaN where the code is unknown or has no value
+    values = load_crosswalk(file_path)[column].to_numpy(dtype=object)
+    found = rows(codes, by, file_path)
+    return np.where(found >= 0, values[np.maximum(found, 0)], np.nan)
+
+def country_codes_table(fide_codes, file_path=None):
+    # federation name, FIDE code and ISO (World Bank) code of every federation
+    fide_codes = pd.unique(pd.Series(fide_codes).dropna())
+    return pd.DataFrame({
+        'federation': lookup(fide_codes, 'country', file_path=file_path),
+        'fide_code': fide_codes,
+        'country_code': lookup(fide_codes, 'iso', file_path=file_path),
+    })
+
+def capital_names(fide_codes, capital_countries, file_path=None):
+    # the capitals csv's country name for every federation: the crosswalk's capital_name when the csv has it,
+    # otherwise the closest unused name by TF-IDF similarity to the federation's name
+    capital_countries = pd.Series(capital_countries).dropna().astype(str)
+    names = lookup(fide_codes, 'capital_name', file_path=file_path)
+    known = pd.Series(names).isin(set(capital_countries)).to_numpy()
+    result = pd.Series(np.where(known, names, np.nan), dtype=object)
+    federations = pd.Series(lookup(fide_codes, 'country', file_path=file_path))[~known].dropna()
+    unused = capital_countries[~capital_countries.isin(set(names[known]))]
+    if len(federations) and len(unused):
+        matches = dict(find_match_country(federations.tolist(), unused.tolist()))
+        result[~known] = federations.map(matches).reindex(result.index[~known])
+    return result.to_numpy()
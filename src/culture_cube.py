@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import cache
+import fide_lists
+
+# "Chess culture" metrics of every federation in every rating list, precomputed once from rated_players_df
+# into a dense federation x year x metric float32 array, so a dashboard query is an index lookup instead of
+# a groupby over millions of rows. A new list only adds its own year (update), and the cube is stored in
+# the column cache, from where it is memory-mapped back (save / load).
+
+TITLES = fide_lists.TITLE_CATEGORIES
+TOP_N = (1, 4, 10, 50) # mean rating of the federation's best n players; 4 is an Olympiad team
+QUANTILES = (0.5, 0.9, 0.99)
+COUNT_METRICS = ['players'] + TITLES
+METRICS = COUNT_METRICS + ['top{}_mean'.format(n) for n in TOP_N] + ['q{:g}'.format(q * 100) for q in QUANTILES]
+CUBE_VERSION = 1
+CACHE_NAMESPACE = 'culture_cube'
+
+def year_metrics(federations, titles, ratings):
+    # (federations, (federations, metrics) array) of one rating list; titles is a Categorical of TITLES
+    codes, uniques = pd.factorize(np.asarray(federations, dtype=object), sort=True)
+    ratings = np.asarray(ratings, dtype=np.float64)
+    keep = codes >= 0
+    codes, ratings = codes[keep], ratings[keep]
+    title_codes = pd.Categorical(titles, categories=TITLES).codes[keep]
+    n = len(uniques)
+    values = np.empty((n, len(METRICS)), dtype=np.float32)
+    counts = np.bincount(codes, minlength=n)
+    values[:, 0] = counts
+    titled = title_codes >= 0
+    values[:, 1:len(COUNT_METRICS)] = np.bincount(codes[titled] * len(TITLES) + title_codes[titled],
+                                                  minlength=n * len(TITLES)).reshape(n, len(TITLES))
+    # every federation's ratings in one run, best first, so its top n are the first n of its run
+    order = np.lexsort((-ratings, codes))
+    ranked = ratings[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    cumulative = np.concatenate(([0], np.cumsum(ranked)))
+    column = len(COUNT_METRICS)
+    for top in TOP_N:
+        taken = np.minimum(top, counts)
+        values[:, column] = (cumulative[starts + taken] - cumulative[starts]) / taken
+        column += 1
+    for q in QUANTILES:
+        # linear interpolation like np.quantile, on ascending positions counted from the end of the run
+        position = q * (counts - 1)
+        low, high = np.floor(position).astype(np.int64), np.ceil(position).astype(np.int64)
+        last = starts + counts - 1
+        values[:, column] = ranked[last - low] + (ranked[last - high] - ranked[last - low]) * (position - low)
+        column += 1
+    return np.asarray(uniques, dtype=object), values
+
+class CultureCube:
+    def __init__(self, federations, years, values):
+        self.federations = np.asarray(federations, dtype=object) # sorted
+        self.years = np.asarray(years, dtype=np.int16) # sorted
+        self.values = values # (federations, years, METRICS) float32; counts are 0 and ratings NaN where a federation has no players
+        self._rows = {federation: i for i, federation in enumerate(self.federations)}
+        self._columns = {int(year): j for j, year in enumerate(self.years)}
+        self._metrics = {metric: k for k, metric in enumerate(METRICS)}
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], np.empty((0, 0, len(METRICS)), dtype=np.float32))
+
+    @classmethod
+    def from_players(cls, df, year_column='year'):
+        return cls.empty().update(df, year_column=year_column)
+
+    def update(self, df, year_column='year', replace=False):
+        # adds the years of df (rows of rated_players_df) that the cube does not have yet; replace=True
+        # recomputes the years it already has too. The other years are copied, never recomputed.
+        positions = df.groupby(df[year_column].to_numpy()).indices
+        years = sorted(int(year) for year in positions if replace or int(year) not in self._columns)
+        if not years:
+            return self
+        new_metrics = {year: year_metrics(df['federation'].to_numpy()[positions[year]], df['title'].iloc[positions[year]],
+                                          df['rating'].to_numpy()[positions[year]]) for year in years}
+        federations = np.array(sorted(set(self.federations).union(*[set(found) for found, _ in new_metrics.values()])), dtype=object)
+        all_years = np.array(sorted(set(self._columns).union(years)), dtype=np.int16)
+        values = np.full((len(federations), len(all_years), len(METRICS)), np.nan, dtype=np.float32)
+        values[:, :, :len(COUNT_METRICS)] = 0
+        rows = np.searchsorted(federations, self.federations) if len(self.federations) else np.array([], dtype=np.int64)
+        columns = np.searchsorted(all_years, self.years)
+        values[np.ix_(rows, columns)] = self.values
+        for year, (found, year_values) in new_metrics.items():
+            column = np.searchsorted(all_years, year)
+            values[:, column] = np.nan
+            values[:, column, :len(COUNT_METRICS)] = 0
+            values[np.searchsorted(federations, found), column] = year_values
+        self.__init__(federations, all_years, values)
+        return self
+
+    def get(self, federation, year, metric='players'):
+        # one value; NaN for a federation or year the cube does not have
+        row, column = self._rows.get(federation), self._columns.get(year)
+        if row is None or column is None:
+            return np.nan
+        return self.values[row, column, self._metrics[metric]]
+
+    def _index(self, labels, positions):
+        if labels is None:
+            return np.arange(len(positions))
+        if isinstance(labels, (str, int, np.integer)):
+            labels = [labels]
+        return np.array([positions[label] for label in labels], dtype=np.int64)
+
+    def slice(self, federations=None, years=None, metrics=None):
+        # (federations, years, metrics) array for lists of labels (None for all); unknown labels raise KeyError
+        return self.values[np.ix_(self._index(federations, self._rows), self._index(years, self._columns),
+                                  self._index(metrics, self._metrics))]
+
+    def frame(self, federations=None, years=None, metrics=None):
+        # the same slice as a frame indexed by (federation, year), one column per metric
+        rows, columns = self._index(federations, self._rows), self._index(years, self._columns)
+        metric_index = self._index(metrics, self._metrics)
+        values = self.values[np.ix_(rows, columns, metric_index)].reshape(-1, len(metric_index))
+        index = pd.MultiIndex.from_product([self.federations[rows], self.years[columns]], names=['federation', 'year'])
+        return pd.DataFrame({METRICS[k]: values[:, i].astype(np.int32) if METRICS[k] in COUNT_METRICS else values[:, i]
+                             for i, k in enumerate(metric_index)}, index=index)
+
+    def save(self, name='culture_cube', cache_dir=None):
+        key = cache.cache_key(CUBE_VERSION, *self.years.tolist())
+        return cache.save_columns(CACHE_NAMESPACE, name, key, {'federations': self.federations, 'years': self.years,
+                                                               'values': self.values}, {'metrics': METRICS}, cache_dir)
+
+    @classmethod
+    def load(cls, name='culture_cube', cache_dir=None):
+        # the saved cube, or an empty one when there is none or it was saved with other metrics
+        meta = cache.current_meta(CACHE_NAMESPACE, name, cache_dir)
+        if meta is None or meta.get('metrics') != METRICS:
+            return cls.empty()
+        columns = cache.load_columns(CACHE_NAMESPACE, name, meta['key'], cache_dir=cache_dir)
+        return cls(np.asarray(columns['federations'], dtype=object), columns['years'], columns['values'])
@@ -0,0 +1,81 @@
+import hashlib
+import numpy as np
+import pandas as pd
+import cache
+
+# Great-circle distances between federation capitals and Olympiad host cities (and between capitals), computed
+# for every pair at once with NumPy instead of one haversine() call per pair. Matrices are cached under the
+# hash of the coordinates they were computed from, so repeated feature sweeps over the same table reuse them.
+
+EARTH_RADIUS_KM = 6371.0088 # mean Earth radius, the one the haversine package uses
+DISTANCE_VERSION = 1
+CACHE_NAMESPACE = 'distances'
+
+# (city, latitude, longitude) of every Olympiad we use
+OLYMPIAD_HOSTS = {
+    2010: ('Khanty-Mansiysk', 61.0042, 69.0019),
+    2012: ('Istanbul', 41.0082, 28.9784),
+    2014: ('Tromsø', 69.6492, 18.9553),
+    2016: ('Baku', 40.4093, 49.8671),
+    2018: ('Batumi', 41.6168, 41.6367),
+    2022: ('Chennai', 13.0827, 80.2707),
+}
+
+def haversine_matrix(lat1, lon1, lat2, lon2, radius=EARTH_RADIUS_KM):
+    # (len(lat1), len(lat2)) distances in km between two sets of points given in degrees
+    lat1, lon1, lat2, lon2 = [np.radians(np.asarray(values, dtype=np.float64)) for values in (lat1, lon1, lat2, lon2)]
+    dlat = lat2[None, :] - lat1[:, None]
+    dlon = lon2[None, :] - lon1[:, None]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1)[:, None] * np.cos(lat2)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def federation_coordinates(country_codes_table, capitals_df):
+    # latitude and longitude of every federation's capital, indexed by fide_code; NaN where it has none
+    capitals = capitals_df.drop_duplicates('Country').set_index('Country')[['Latitude', 'Longitude']]
+    coordinates = capitals.reindex(country_codes_table['federation_lat_long'].to_numpy()).astype(np.float64)
+    coordinates.index = pd.Index(country_codes_table['fide_code'].to_numpy(), name='fide_code')
+    return coordinates.rename(columns={'Latitude': 'latitude', 'Longitude': 'longitude'})
+
+def coordinates_key(*tables):
+    # content hash of coordinate tables (labels and values), part of every distance cache key
+    digest = hashlib.sha256()
+    for table in tables:
+        digest.update('\0'.join(str(label) for label in table.index).encode('utf-8'))
+        digest.update(np.ascontiguousarray(table.to_numpy(dtype=np.float64)).tobytes())
+    return cache.cache_key(DISTANCE_VERSION, digest.hexdigest())
+
+def _hosts_table(hosts):
+    return pd.DataFrame({'latitude': [hosts[year][1] for year in sorted(hosts)],
+                         'longitude': [hosts[year][2] for year in sorted(hosts)]}, index=pd.Index(sorted(hosts), name='year'))
+
+def _cached_matrix(name, key, rows, columns, compute, use_cache):
+    # a (rows x columns) float32 distance frame, read from the cache when it holds one for key; one entry
+    # per name, so a new coordinate table replaces the matrix of the previous one
+    if use_cache and cache.has_entry(CACHE_NAMESPACE, name, key):
+        values = cache.load_columns(CACHE_NAMESPACE, name, key, ['distances'])['distances']
+    else:
+        values = compute().astype(np.float32)
+        if use_cache:
+            cache.save_columns(CACHE_NAMESPACE, name, key, {'distances': values}, meta={'shape': list(values.shape)})
+    return pd.DataFrame(np.asarray(values), index=rows, columns=columns)
+
+def host_distances(coordinates, hosts=OLYMPIAD_HOSTS, use_cache=True):
+    # km from every federation's capital (rows, fide_code) to the host city of every Olympiad (columns, year)
+    host_table = _hosts_table(hosts)
+    return _cached_matrix('hosts', coordinates_key(coordinates, host_table), coordinates.index, host_table.index,
+                          lambda: haversine_matrix(coordinates['latitude'], coordinates['longitude'],
+                                                   host_table['latitude'], host_table['longitude']), use_cache)
+
+def federation_distances(coordinates, use_cache=True):
+    # km between the capitals of every pair of federations, a symmetric fide_code x fide_code frame
+    columns = coordinates.index.rename('to_fide_code')
+    return _cached_matrix('federations', coordinates_key(coordinates), coordinates.index, columns,
+                          lambda: haversine_matrix(coordinates['latitude'], coordinates['longitude'],
+                                                   coordinates['latitude'], coordinates['longitude']), use_cache)
+
+def travel_distance(df, distances, federation_column='federation', year_column='year'):
+    # the host distance of every row of df (e.g. olympiads_merge_df), looked up in a host_distances frame
+    rows = distances.index.get_indexer(df[federation_column])
+    columns = distances.columns.get_indexer(df[year_column])
+    values = distances.to_numpy()[np.maximum(rows, 0), np.maximum(columns, 0)]
+    return np.where((rows >= 0) & (columns >= 0), values, np.nan)
@@ -1,93 +1,184 @@
 import requests
 import zipfile
 import os
+import json
+import hashlib
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
-import io
 
-def download_and_extract_file(file_url, txt_filename, destination_folder):
-    response = requests.get(file_url, stream=True)
-    if response.status_code == 200:
-        zip_buffer = io.BytesIO()
-        file_size = int(response.headers.get('Content-Length', 0))
-        progress_bar = tqdm(total=file_size, unit="B", unit_scale=True)
+CHUNK_SIZE = 1 << 16
+MANIFEST_FILE = os.path.join("data", "manifest.json")
+_manifest_lock = threading.Lock()
 
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                zip_buffer.write(chunk)
-                progress_bar.update(len(chunk))
-        progress_bar.close()
+def make_session(pool_size=8, retries=3):
+    # one pooled session is shared by every worker thread, so connections to the same host get reused
+    session = requests.Session()
+    # the body has to arrive as it is stored: Content-Length and Range offsets count the bytes on the wire,
+    # which a gzip-encoded response would not match once iter_content decompresses it
+    session.headers["Accept-Encoding"] = "identity"
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-        with zipfile.ZipFile(zip_buffer) as zip_file:
-            txt_file_name = zip_file.namelist()[0]
-            txt_file_data = zip_file.read(txt_file_name)
-            txt_file_path = os.path.join(destination_folder, txt_filename)
-            with open(txt_file_path, "wb") as txt_file:
-                txt_file.write(txt_file_data)
-            print(f"Downloaded and extracted '{txt_filename}' to '{destination_folder}' successfully.")
-    else:
-        print(f"Failed to download the file. Status code: {response.status_code}")
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-def download_file(file_url, destination_folder, file_name):
-    os.makedirs(destination_folder, exist_ok=True)
-    file_path = os.path.join(destination_folder, file_name)
-    if os.path.exists(file_path):
-        print("The {} file has already been downloaded.".format(file_name))
-    else:
-        try:
-            response = requests.get(file_url, stream=True)
-            if response.status_code == 200:
-                file_size = int(response.headers.get('Content-Length', 0))
-                progress_bar = tqdm(total=file_size, unit="B", unit_scale=True)
-                with open(file_path, 'wb') as file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            file.write(chunk)
-                            progress_bar.update(len(chunk))
-                progress_bar.close()
-                print(f"Downloaded '{file_name}' to '{destination_folder}' successfully.")
-            else:
-                print(f"Failed to download the file. Status code: {response.status_code}")
-        except Exception as e:
-            print(f"An error occurred while downloading the file: {str(e)}")
+def load_manifest(manifest_file=MANIFEST_FILE):
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, "r") as file:
+        return json.load(file)
 
-# download geojson and capital_csv
-geojson_url = "https://datahub.io/core/geo-countries/r/countries.geojson"
-capital_url = "https://gist.githubusercontent.com/ofou/df09a6834a8421b4f376c875194915c9/raw/355eb56e164ddc3cd1a9467c524422cb674e71a9/country-capital-lat-long-population.csv"
-destination_folder = os.path.join("data", "secondary", "country-capital-lat-long-population")
-geojson_file_name = "countries.geojson"
-capital_file_name = "country-capital-lat-long-population.csv"
-download_file(geojson_url, destination_folder, geojson_file_name)
-download_file(capital_url, destination_folder, capital_file_name)
+def record_asset(file_path, file_url, manifest_file=MANIFEST_FILE):
+    # the manifest maps every finished asset to the size and hash it had when it was fetched
+    stat = os.stat(file_path)
+    entry = {"url": file_url, "size": stat.st_size, "mtime": stat.st_mtime, "sha256": file_sha256(file_path)}
+    with _manifest_lock:
+        manifest = load_manifest(manifest_file)
+        manifest[os.path.basename(file_path)] = entry
+        os.makedirs(os.path.dirname(manifest_file) or ".", exist_ok=True)
+        tmp_file = manifest_file + ".tmp"
+        with open(tmp_file, "w") as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+        os.replace(tmp_file, manifest_file)
+    return entry
 
-#download primary excel dataset
-years = [2010, 2012, 2014, 2016, 2018, 2022]
-tournament_ids = [36795, 77681, 140380, 232875, 368908, 653631]
-for i in range(6):
-    year = years[i]
-    t_id = tournament_ids[i]
-    excel_url = 'https://chess-results.com/tnr{}.aspx?lan=1&zeilen=99999&art=1&turdet=YES&flag=30&prt=4&excel=2010'.format(t_id)
-    destination_folder = os.path.join("data", "primary")
-    excel_file_name = "chessResultsList_{}.xlsx".format(year)
-    download_file(excel_url, destination_folder, excel_file_name)
+def verify_asset(file_path, manifest_file=MANIFEST_FILE, full=True):
+    # a file only counts as downloaded if the manifest knows it and its size and hash still match
+    # with full=False an unchanged size and mtime is trusted instead of re-hashing the file
+    entry = load_manifest(manifest_file).get(os.path.basename(file_path))
+    if entry is None or not os.path.exists(file_path):
+        return False
+    stat = os.stat(file_path)
+    if stat.st_size != entry["size"]:
+        return False
+    if not full and stat.st_mtime == entry.get("mtime"):
+        return True
+    return file_sha256(file_path) == entry["sha256"]
 
-# Base URL for the file downloads
-base_url = "http://ratings.fide.com/download/"
-destination_folder = os.path.join("data", "secondary", "fide_ratings_list")
-os.makedirs(destination_folder, exist_ok=True)
+def _validator(response):
+    # what If-Range can compare against: a strong ETag, otherwise Last-Modified
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
 
-ref_file = os.path.join(destination_folder, "standard_jan23frl.txt")
+def fetch(session, file_url, file_path, show_progress=True):
+    # bytes land in '<file>.part' first, so an interrupted transfer is never mistaken for a finished one;
+    # '<file>.part.validator' holds the ETag / Last-Modified the partial bytes came with
+    part_path = file_path + ".part"
+    validator_path = part_path + ".validator"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = None
+    if offset and os.path.exists(validator_path):
+        with open(validator_path, "r") as file:
+            validator = file.read().strip() or None
+    # a partial file is only resumed if the server can confirm it still has the same version (If-Range),
+    # otherwise it answers 200 with the whole file and we start from zero
+    headers = {"Range": "bytes={}-".format(offset), "If-Range": validator} if offset and validator else {}
+    with session.get(file_url, headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 416: # the partial file is already as long as the resource, start over
+            os.remove(part_path)
+            return fetch(session, file_url, file_path, show_progress)
+        response.raise_for_status()
+        # a server may still encode the body; its decoded bytes cannot be resumed with a byte range
+        encoded = response.headers.get("Content-Encoding", "identity").lower() not in ("", "identity")
+        if headers and response.status_code == 206 and not encoded:
+            mode = "ab"
+        else: # no resume, or the file changed upstream and the server is sending all of it
+            mode, offset = "wb", 0
+            validator = None if encoded else _validator(response)
+            if validator:
+                with open(validator_path, "w") as file:
+                    file.write(validator)
+            elif os.path.exists(validator_path):
+                os.remove(validator_path)
+        file_size = offset + int(response.headers.get("Content-Length", 0))
+        progress_bar = tqdm(total=file_size, initial=offset, unit="B", unit_scale=True,
+                            desc=os.path.basename(file_path), disable=not show_progress)
+        with open(part_path, mode) as file:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    file.write(chunk)
+                    progress_bar.update(len(chunk))
+        progress_bar.close()
+    # for an encoded body Content-Length is the encoded size, so it is compared with the raw bytes read
+    received = response.raw.tell() if encoded else os.path.getsize(part_path)
+    if response.headers.get("Content-Length") and received != file_size:
+        raise IOError("Incomplete download of '{}'".format(file_url))
+    os.replace(part_path, file_path)
+    if os.path.exists(validator_path):
+        os.remove(validator_path)
+    return file_path
 
-if os.path.exists(ref_file):
-    print("The FIDE rating lists have already been downloaded.")
-else:
-    print("Downloading the FIDE rating lists. It will take a while.")
-    for i in range(10, 24):
-        if i < 13:
-            file_url = f"{base_url}jan{i}frl.zip"
-        else:
-            file_url = f"{base_url}standard_jan{i}frl.zip"
-        txt_filename = f"standard_jan{i}frl.txt"
-        download_and_extract_file(file_url, txt_filename, destination_folder)
+def extract_file(zip_path, txt_file_path):
+    # decompress the first member in chunks so peak memory stays at CHUNK_SIZE whatever the archive size
+    tmp_path = txt_file_path + ".tmp"
+    with zipfile.ZipFile(zip_path) as zip_file:
+        txt_file_name = zip_file.namelist()[0]
+        with zip_file.open(txt_file_name) as source, open(tmp_path, "wb") as txt_file:
+            shutil.copyfileobj(source, txt_file, CHUNK_SIZE)
+    os.replace(tmp_path, txt_file_path)
+    return txt_file_path
 
+def download_and_extract_file(file_url, txt_filename, destination_folder, session=None, manifest_file=MANIFEST_FILE):
+    os.makedirs(destination_folder, exist_ok=True)
+    txt_file_path = os.path.join(destination_folder, txt_filename)
+    if verify_asset(txt_file_path, manifest_file):
+        print("The {} file has already been downloaded.".format(txt_filename))
+        return txt_file_path
+    session = session or make_session()
+    # the archive is spooled to disk by fetch and never held in memory
+    zip_path = os.path.join(destination_folder, os.path.basename(file_url))
+    fetch(session, file_url, zip_path)
+    extract_file(zip_path, txt_file_path)
+    os.remove(zip_path)
+    record_asset(txt_file_path, file_url, manifest_file)
+    print(f"Downloaded and extracted '{txt_filename}' to '{destination_folder}' successfully.")
+    return txt_file_path
+
+def download_file(file_url, destination_folder, file_name, session=None, manifest_file=MANIFEST_FILE):
+    os.makedirs(destination_folder, exist_ok=True)
+    file_path = os.path.join(destination_folder, file_name)
+    if verify_asset(file_path, manifest_file):
+        print("The {} file has already been downloaded.".format(file_name))
+        return file_path
+    session = session or make_session()
+    fetch(session, file_url, file_path)
+    record_asset(file_path, file_url, manifest_file)
+    print(f"Downloaded '{file_name}' to '{destination_folder}' successfully.")
+    return file_path
+
+def download_all(assets, max_workers=8, manifest_file=MANIFEST_FILE):
+    # assets are (file_url, destination_folder, file_name, extract) tuples, fetched concurrently over one session
+    session = make_session(pool_size=max_workers)
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for file_url, destination_folder, file_name, extract in assets:
+            if extract:
+                future = executor.submit(download_and_extract_file, file_url, file_name, destination_folder, session, manifest_file)
+            else:
+                future = executor.submit(download_file, file_url, destination_folder, file_name, session, manifest_file)
+            futures[future] = file_name
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"An error occurred while downloading '{futures[future]}': {str(e)}")
+                failed.append(futures[future])
+    return failed
 
-status = True
\ No newline at end of file
+if __name__ == "__main__":
+    import assets
+    failed = assets.ensure_all()
+    if failed:
+        raise SystemExit("Failed to download: {}".format(", ".join(failed)))
\ No newline at end of file
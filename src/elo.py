@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+from olympiads import ROUND_COLUMNS
+
+# Elo arithmetic for whole Olympiads at once. round_results turns the round columns of the Olympiad frame
+# into a long table with one row per game; score_players then computes every player's expected score
+# and rating discrepancy in a single pass with np.bincount, across all years.
+# FIDE sums the expected score game by game against each opponent's rating. The workbooks carry that sum
+# (we) and the points it is compared with (w) for every rated player, and score_players uses them wherever
+# they are filled in. The workbooks do not name the opponents, so the fallback is an approximation: each
+# player's average opponent rating is recovered from their performance rating, Rp = Ra + dp(p) (FIDE Handbook
+# B.02, table 8.1a), and every game is scored against that average. Because the expected score is not linear in
+# the rating difference, this is biased wherever the opponents' ratings are spread out; expected_check
+# measures the gap against the workbook's we. The workbook's rating_performance is an input here, so no
+# performance rating is computed back from it.
+
+# the workbooks write draws as ½, =, 1/2 or a numeric 0.5 cell (which olympiads._to_text turns into '0.5')
+RESULT_SCORES = {'1': 1.0, '1.0': 1.0, '½': 0.5, '=': 0.5, '1/2': 0.5, '0.5': 0.5, '0': 0.0, '0.0': 0.0, '+': 1.0, '-': 0.0}
+FORFEITS = ('+', '-') # not rated, so left out of every rating calculation
+DEFAULT_K = 20
+
+# dp for p = 0.50, 0.51, ..., 1.00
+_DP_UPPER = np.array([
+    0, 7, 14, 21, 29, 36, 43, 50, 57, 65, 72, 80, 87, 95, 102, 110, 117, 125, 133, 141, 149, 158, 166, 175, 184, 193,
+    202, 211, 220, 230, 240, 251, 262, 273, 284, 296, 309, 322, 336, 351, 366, 383, 401, 422, 444, 470, 501, 538, 589, 677, 800,
+])
+DP_TABLE = np.concatenate([-_DP_UPPER[:0:-1], _DP_UPPER]) # indexed by round(p * 100)
+
+def rating_difference(p):
+    # dp of a percentage score p (0..1), NaN where p is NaN
+    p = np.asarray(p, dtype=np.float64)
+    index = np.rint(np.nan_to_num(p) * 100).astype(np.int64).clip(0, 100)
+    return np.where(np.isnan(p), np.nan, DP_TABLE[index])
+
+def expected_score(rating, opponent_rating):
+    # expected score of one game; a difference above 400 points counts as 400
+    difference = np.clip(np.asarray(opponent_rating, dtype=np.float64) - rating, -400, 400)
+    return 1 / (1 + 10 ** (difference / 400))
+
+def round_results(olympiad_df):
+    # long table of every game: player (position in olympiad_df), year, round, score, forfeit, opponent_rating
+    rounds = [name for name in ROUND_COLUMNS if name in olympiad_df]
+    cells = pd.Series(olympiad_df[rounds].to_numpy(dtype=object).ravel())
+    score = cells.map(RESULT_SCORES).to_numpy(dtype=np.float64)
+    forfeit = cells.isin(FORFEITS).to_numpy()
+    played = ~np.isnan(score)
+    player = np.repeat(np.arange(len(olympiad_df), dtype=np.int32), len(rounds))[played]
+    results = pd.DataFrame({
+        'player': player,
+        'year': olympiad_df['year'].to_numpy().astype(np.int16)[player],
+        'round': np.tile(np.arange(1, len(rounds) + 1, dtype=np.int8), len(olympiad_df))[played],
+        'score': score[played].astype(np.float32),
+        'forfeit': forfeit[played],
+    })
+    # average opponent rating of each player over their rated games
+    rated = ~results['forfeit'].to_numpy()
+    games = np.bincount(player[rated], minlength=len(olympiad_df))
+    points = np.bincount(player[rated], weights=results['score'].to_numpy()[rated], minlength=len(olympiad_df))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = np.where(games > 0, points / games, np.nan)
+    performance = pd.to_numeric(olympiad_df['rating_performance'], errors='coerce').to_numpy(dtype=np.float64)
+    opponent_rating = performance - rating_difference(p)
+    results['opponent_rating'] = opponent_rating[player].astype(np.float32)
+    return results
+
+def score_players(olympiad_df, results, k=None):
+    # per player: rated games, points, average opponent rating (derived from rating_performance), expected
+    # score (we), discrepancy (w - we) and the rating change K * (w - we); unrated players (rating 0) get NaN.
+    # expected and discrepancy come from the workbook's we and w columns where olympiad_df has them, otherwise
+    # from the average-opponent approximation, which is always kept as expected_average_opponent
+    # k defaults to the workbook's K column, or DEFAULT_K
+    n = len(olympiad_df)
+    rated = ~results['forfeit'].to_numpy()
+    player = results['player'].to_numpy()[rated]
+    rating = pd.to_numeric(olympiad_df['rating'], errors='coerce').to_numpy(dtype=np.float64)
+    rating[rating <= 0] = np.nan
+    opponent = results['opponent_rating'].to_numpy(dtype=np.float64)[rated]
+    games = np.bincount(player, minlength=n)
+    points = np.bincount(player, weights=results['score'].to_numpy(dtype=np.float64)[rated], minlength=n)
+    expected = np.bincount(player, weights=np.nan_to_num(expected_score(rating[player], opponent), nan=0.0), minlength=n)
+    opponent_sum = np.bincount(player, weights=opponent, minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        opponent_average = np.where(games > 0, opponent_sum / games, np.nan)
+    expected[np.isnan(rating) | np.isnan(opponent_average)] = np.nan
+    workbook = np.zeros(n, dtype=bool)
+    rated_points, workbook_expected = points, expected
+    if 'w' in olympiad_df and 'we' in olympiad_df:
+        w = pd.to_numeric(olympiad_df['w'], errors='coerce').to_numpy(dtype=np.float64)
+        we = pd.to_numeric(olympiad_df['we'], errors='coerce').to_numpy(dtype=np.float64)
+        workbook = ~np.isnan(w) & ~np.isnan(we) & ~np.isnan(rating)
+        rated_points, workbook_expected = np.where(workbook, w, points), np.where(workbook, we, expected)
+    if k is None:
+        k = pd.to_numeric(olympiad_df['k'], errors='coerce').fillna(DEFAULT_K).to_numpy() if 'k' in olympiad_df else DEFAULT_K
+    discrepancy = rated_points - workbook_expected
+    return pd.DataFrame({
+        'games': games,
+        'points': points,
+        'opponent_rating': opponent_average,
+        'expected': workbook_expected,
+        'expected_average_opponent': expected,
+        'workbook_expected': workbook,
+        'discrepancy': discrepancy,
+        'rating_change': np.asarray(k, dtype=np.float64) * discrepancy,
+    }, index=olympiad_df.index)
+
+def expected_check(player_scores, years):
+    # per Olympiad: players with a workbook we, and the mean, mean absolute and largest absolute difference
+    # between the average-opponent approximation and the workbook's per-game sum
+    scores = player_scores.assign(year=np.asarray(years))[player_scores['workbook_expected'].to_numpy()]
+    difference = scores['expected_average_opponent'] - scores['expected']
+    return pd.DataFrame({
+        'players': scores.groupby('year').size(),
+        'mean_difference': difference.groupby(scores['year']).mean(),
+        'mean_abs_difference': difference.abs().groupby(scores['year']).mean(),
+        'max_abs_difference': difference.abs().groupby(scores['year']).max(),
+    })
+
+def rating_change_variants(player_scores, k_factors):
+    # what-if rating changes, one column per named K (a number or one K per player)
+    discrepancy = player_scores['discrepancy'].to_numpy()
+    return pd.DataFrame({name: np.asarray(k, dtype=np.float64) * discrepancy for name, k in k_factors.items()},
+                        index=player_scores.index)
+
+def federation_scores(olympiad_df, player_scores):
+    # the same metrics per federation and Olympiad; expected score and discrepancy only count rated players,
+    # the opponent rating is averaged over all games against opponents of known rating
+    keys = pd.MultiIndex.from_arrays([olympiad_df['federation'], olympiad_df['year']])
+    codes, groups = pd.factorize(keys)
+    def total(values):
+        return np.bincount(codes, weights=np.nan_to_num(np.asarray(values, dtype=np.float64)), minlength=len(groups))
+    games = player_scores['games'].to_numpy(dtype=np.float64)
+    scored = player_scores['expected'].notna().to_numpy()
+    known = player_scores['opponent_rating'].notna().to_numpy()
+    columns = {
+        'games': total(games),
+        'points': total(player_scores['points']),
+        'expected': total(player_scores['expected']),
+        'discrepancy': total(player_scores['discrepancy']),
+        'rating_change': total(player_scores['rating_change']),
+    }
+    with np.errstate(invalid='ignore', divide='ignore'):
+        known_games = total(games * known)
+        columns['opponent_rating'] = total(player_scores['opponent_rating'] * games) / known_games
+        columns['discrepancy_per_game'] = columns['discrepancy'] / total(games * scored)
+    return pd.DataFrame(columns, index=pd.MultiIndex.from_tuples(list(groups), names=['federation', 'year'])).sort_index()
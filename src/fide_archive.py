@@ -0,0 +1,158 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import fide_lists
+
+# Statistics over the whole FIDE archive (monthly standard, rapid and blitz lists) without building
+# rated_players_df: every list is read chunk by chunk (fide_lists.iter_fide_list) and folded into per
+# (federation, title, rating band) counts and rating sums, plus the sorted ids of the players it holds.
+# A worker only ever holds one chunk and the aggregates of its list, and the parent keeps the small
+# per-list aggregates and one first-seen / last-seen entry per player, so memory does not grow with
+# the number of lists.
+
+ARCHIVE_COLUMNS = ['fide_id', 'title', 'federation', 'rating']
+RATING_BAND = 100 # ratings are counted in bands of this width, 2500 for 2500-2599
+LIST_KIND = re.compile(r'(standard|rapid|blitz)', re.IGNORECASE)
+CELL_KEYS = ['federation', 'title', 'band']
+
+def list_period(file_path):
+    # (kind, month) of a list: the kind from the file name, the month from the rating column of the header
+    # ('Jan12', 'jan13', 'FEB19', ...); lists without a recognisable kind are standard lists
+    kind = LIST_KIND.search(os.path.basename(file_path))
+    with open(file_path, 'r', encoding=fide_lists.ENCODING) as file:
+        period = fide_lists.RATING_PERIOD.search(file.readline())
+    if period is None:
+        raise ValueError("No rating period in the header of '{}'".format(file_path))
+    month = pd.to_datetime(period.group(), format='%b%y').to_datetime64().astype('datetime64[M]')
+    return (kind.group().lower() if kind else 'standard'), month
+
+def _chunk_cells(chunk):
+    df = pd.DataFrame({
+        'federation': pd.Series(chunk['federation'], dtype=object).fillna(''),
+        'title': pd.Series(chunk['title'], dtype=object).fillna(''),
+        'band': (chunk['rating'] // RATING_BAND * RATING_BAND).astype(np.int16),
+        'rating': chunk['rating'].astype(np.float64),
+    })
+    df['rating_sq'] = df['rating'] ** 2
+    return df.groupby(CELL_KEYS, sort=False).agg(players=('rating', 'size'), rating_sum=('rating', 'sum'),
+                                                 rating_sq_sum=('rating_sq', 'sum'), rating_max=('rating', 'max'))
+
+def _sorted_unique(values):
+    # np.unique hashes by default on recent numpy, which is much slower than sorting for ids
+    values = np.sort(values)
+    return values[np.concatenate(([True], values[1:] != values[:-1]))] if len(values) else values
+
+def _empty_cells(keys=CELL_KEYS):
+    index = pd.MultiIndex.from_arrays([[]] * len(keys), names=keys)
+    return pd.DataFrame({'players': [], 'rating_sum': [], 'rating_sq_sum': [], 'rating_max': []}, index=index)
+
+def aggregate_list(file_path, chunk_rows=500_000):
+    # (kind, month, cells, ids): the list's aggregates per (federation, title, band) and its sorted unique ids;
+    # rows are normalised like the ingested lists (same dropped rows, federations and titles)
+    kind, month = list_period(file_path)
+    cells, ids = [], []
+    for chunk in fide_lists.iter_fide_list(file_path, ARCHIVE_COLUMNS, chunk_rows):
+        chunk = fide_lists.normalise_list(chunk, month.astype('datetime64[Y]').astype(int) + 1970)
+        cells.append(_chunk_cells(chunk))
+        ids.append(_sorted_unique(chunk['fide_id']))
+    if not cells:
+        return kind, month, _empty_cells(), np.array([], dtype=np.int32)
+    cells = pd.concat(cells).groupby(level=CELL_KEYS, sort=True).agg(
+        {'players': 'sum', 'rating_sum': 'sum', 'rating_sq_sum': 'sum', 'rating_max': 'max'})
+    return kind, month, cells, _sorted_unique(np.concatenate(ids))
+
+def _aggregate_one(task):
+    return aggregate_list(*task)
+
+class PlayerSpans:
+    # first and last list month of every player, and the number of lists they appear in, as sorted arrays
+    def __init__(self):
+        self.fide_ids = np.array([], dtype=np.int32)
+        self.first_seen = np.array([], dtype='datetime64[M]')
+        self.last_seen = np.array([], dtype='datetime64[M]')
+        self.lists = np.array([], dtype=np.int32)
+
+    def __len__(self):
+        return len(self.fide_ids)
+
+    def update(self, fide_ids, month):
+        # fide_ids: sorted unique ids of one list
+        rows = np.minimum(np.searchsorted(self.fide_ids, fide_ids), max(len(self.fide_ids) - 1, 0))
+        known = (self.fide_ids[rows] == fide_ids) if len(self.fide_ids) else np.zeros(len(fide_ids), dtype=bool)
+        rows = rows[known]
+        self.first_seen[rows] = np.minimum(self.first_seen[rows], month)
+        self.last_seen[rows] = np.maximum(self.last_seen[rows], month)
+        self.lists[rows] += 1
+        new = fide_ids[~known]
+        if len(new):
+            order = np.argsort(np.concatenate([self.fide_ids, new]), kind='stable')
+            self.fide_ids = np.concatenate([self.fide_ids, new])[order]
+            self.first_seen = np.concatenate([self.first_seen, np.full(len(new), month)])[order]
+            self.last_seen = np.concatenate([self.last_seen, np.full(len(new), month)])[order]
+            self.lists = np.concatenate([self.lists, np.ones(len(new), dtype=np.int32)])[order]
+
+    def frame(self):
+        return pd.DataFrame({'first_seen': self.first_seen, 'last_seen': self.last_seen, 'lists': self.lists},
+                            index=pd.Index(self.fide_ids, name='fide_id'))
+
+class ArchiveAggregates:
+    # running aggregates of the lists added so far; add() takes the result of aggregate_list
+    def __init__(self):
+        self._cells = []
+        self.spans = {}
+
+    def add(self, result):
+        kind, month, cells, ids = result
+        self._cells.append(pd.concat({(kind, month): cells}, names=['kind', 'month']))
+        self.spans.setdefault(kind, PlayerSpans()).update(ids, month)
+        return self
+
+    def cells(self):
+        # players, rating sums and maximum per (kind, month, federation, title, band); title '' is untitled
+        if not self._cells:
+            return _empty_cells(['kind', 'month'] + CELL_KEYS)
+        cells = pd.concat(self._cells).sort_index()
+        self._cells = [cells]
+        return cells
+
+    def federation_stats(self):
+        # players, mean, standard deviation and maximum rating, and titled players per (kind, month, federation)
+        cells = self.cells()
+        grouped = cells.groupby(level=['kind', 'month', 'federation'])
+        stats = grouped.agg({'players': 'sum', 'rating_sum': 'sum', 'rating_sq_sum': 'sum', 'rating_max': 'max'})
+        stats['mean_rating'] = stats['rating_sum'] / stats['players']
+        variance = stats['rating_sq_sum'] / stats['players'] - stats['mean_rating'] ** 2
+        stats['std_rating'] = np.sqrt(np.maximum(variance, 0))
+        titled = cells[cells.index.get_level_values('title') != '']['players'].groupby(level=['kind', 'month', 'federation']).sum()
+        stats['titled'] = titled.reindex(stats.index, fill_value=0)
+        return stats[['players', 'mean_rating', 'std_rating', 'rating_max', 'titled']]
+
+    def title_counts(self):
+        # players per title, one column per title, per (kind, month, federation)
+        counts = self.cells()['players'].groupby(level=['kind', 'month', 'federation', 'title']).sum()
+        counts = counts.unstack('title', fill_value=0)
+        return counts.reindex(columns=[title for title in fide_lists.TITLE_CATEGORIES if title in counts.columns])
+
+    def band_counts(self):
+        # players per rating band, one column per band, per (kind, month, federation)
+        counts = self.cells()['players'].groupby(level=['kind', 'month', 'federation', 'band']).sum()
+        return counts.unstack('band', fill_value=0)
+
+    def player_spans(self, kind='standard'):
+        return self.spans[kind].frame() if kind in self.spans else PlayerSpans().frame()
+
+def aggregate_archive(file_paths, chunk_rows=500_000, max_workers=None, aggregates=None):
+    # folds every list into `aggregates` (a new ArchiveAggregates by default) as soon as its worker is done,
+    # so lists can also be added to the aggregates of an earlier run; max_workers=1 reads in this process
+    aggregates = aggregates or ArchiveAggregates()
+    tasks = [(file_path, chunk_rows) for file_path in file_paths]
+    if max_workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            aggregates.add(_aggregate_one(task))
+        return aggregates
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(_aggregate_one, tasks):
+            aggregates.add(result)
+    return aggregates
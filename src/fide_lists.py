@@ -0,0 +1,354 @@
+import os
+import re
+import mmap
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import cache
+
+# FIDE rating lists are fixed-width text files whose first line holds the column names.
+# read_fide_list memory-maps the file and slices the byte range of each requested column for
+# every row at once with NumPy, so only the columns we ask for are ever decoded.
+
+ENCODING = 'latin-1'
+NEWLINE, CARRIAGE_RETURN, SPACE = 10, 13, 32
+MISSING = -1 # sentinel for empty or malformed numeric fields
+
+# Header names vary between list formats ('Titl' vs 'Tit', 'Games' vs 'Gms', 'Jan12' vs 'jan13', ...)
+CANONICAL_NAMES = [
+    ('id', 'fide_id'),
+    ('name', 'name'),
+    ('tit', 'title'),
+    ('wtit', 'wtitle'),
+    ('otit', 'otitle'),
+    ('fed', 'federation'),
+    ('sex', 'sex'),
+    ('foa', 'foa'),
+    ('gam', 'games'),
+    ('gms', 'games'),
+    ('k', 'k'),
+    ('born', 'born'),
+    ('b-day', 'born'),
+    ('flag', 'flag'),
+]
+NUMERIC_COLUMNS = {'fide_id', 'rating', 'games', 'k', 'born'}
+REQUIRED_COLUMNS = ['fide_id', 'name', 'federation', 'rating']
+# the rating column is named after the list's period: 'Jan12', 'jan13', 'FEB19', ...
+RATING_PERIOD = re.compile(r'\b[A-Za-z]{3}\d{2}\b')
+
+Schema = namedtuple('Schema', ['name', 'fingerprint', 'columns']) # columns: (canonical_name, start, end) byte ranges
+
+def canonical_name(header_name):
+    if RATING_PERIOD.fullmatch(header_name):
+        return 'rating'
+    lowered = header_name.lower()
+    for prefix, canonical in CANONICAL_NAMES:
+        if lowered.startswith(prefix):
+            return canonical
+    return lowered
+
+def parse_header(first_line):
+    # a column starts at every word, and inside a word wherever a capital follows a lowercase letter,
+    # because some headers run names together ('TitlFed', 'GamesBorn'); 'ID Number' is one column
+    # returns a list of (canonical_name, start, end) byte ranges, the last one open ended
+    first_line = first_line.rstrip('\r\n')
+    col_start_indices = []
+    for word in re.finditer(r'\S+', first_line):
+        if word.group().lower() == 'number' and col_start_indices and first_line[col_start_indices[-1]:word.start()].strip() == 'ID':
+            continue
+        col_start_indices.append(word.start())
+        col_start_indices.extend(i for i in range(word.start() + 1, word.end())
+                                 if first_line[i - 1].islower() and first_line[i].isupper())
+    col_start_indices.append(None)
+    columns = []
+    for i in range(len(col_start_indices) - 1):
+        start, end = col_start_indices[i], col_start_indices[i + 1]
+        columns.append((canonical_name(first_line[start:end].strip()), start, end))
+    return columns
+
+def header_fingerprint(first_line):
+    # the rating period is the only part of a header that changes between lists of one format
+    normalized = RATING_PERIOD.sub('MMMYY', first_line.rstrip())
+    return hashlib.sha1(normalized.encode(ENCODING)).hexdigest()[:16]
+
+# Schemas are derived from a header once per format and then looked up by fingerprint.
+# The registry is seeded with the header formats we have seen so far.
+KNOWN_HEADERS = [
+    "ID number Name                              TitlFed  Jan12 GamesBorn  Flag",
+    "ID Number      Name                                                         Fed Sex Tit  WTit OTit           jan13 Gms K  B-day Flag",
+    "ID Number      Name                                                         Fed Sex Tit  WTit OTit           FOA jan17 Gms K  B-day Flag",
+]
+SCHEMA_REGISTRY = {}
+_file_schemas = {}
+
+def _schema_name(column_names):
+    if 'sex' not in column_names:
+        return 'jan10frl'
+    if 'foa' in column_names:
+        return 'standard_foa'
+    return 'standard'
+
+def detect_schema(first_line):
+    fingerprint = header_fingerprint(first_line)
+    schema = SCHEMA_REGISTRY.get(fingerprint)
+    if schema is None:
+        columns = tuple(parse_header(first_line))
+        column_names = [name for name, _, _ in columns]
+        missing = [name for name in REQUIRED_COLUMNS if name not in column_names]
+        if missing or len(set(column_names)) != len(column_names):
+            raise ValueError("Unrecognised FIDE list header (missing {}): {!r}".format(missing, first_line.rstrip()))
+        name = _schema_name(column_names)
+        if any(known.name == name for known in SCHEMA_REGISTRY.values()):
+            name = '{}_{}'.format(name, fingerprint[:6])
+        schema = SCHEMA_REGISTRY[fingerprint] = Schema(name, fingerprint, columns)
+    return schema
+
+def schema_for_file(file_path):
+    # keyed on size and mtime as well, so a re-downloaded list is looked at again
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime)
+    if key not in _file_schemas:
+        with open(file_path, 'r', encoding=ENCODING) as file:
+            _file_schemas[key] = detect_schema(file.readline())
+    return _file_schemas[key]
+
+def read_header(file_path):
+    return list(schema_for_file(file_path).columns)
+
+for header in KNOWN_HEADERS:
+    detect_schema(header)
+
+def _line_bounds(buf, header=True):
+    # start offset and length (without line terminators) of every data line, header excluded unless header=False
+    newlines = np.flatnonzero(buf == NEWLINE)
+    if len(buf) and buf[-1] != NEWLINE:
+        newlines = np.append(newlines, len(buf))
+    starts = np.concatenate(([0], newlines + 1))[:len(newlines)]
+    ends = newlines.copy()
+    if header:
+        starts, ends = starts[1:], ends[1:]
+    has_cr = (ends > starts) & (buf[np.maximum(ends - 1, 0)] == CARRIAGE_RETURN)
+    ends[has_cr] -= 1
+    keep = ends > starts # blank lines carry no record
+    return starts[keep], (ends - starts)[keep]
+
+def _column_bytes(buf, starts, lengths, start, end):
+    # (rows, width) uint8 matrix of one column, padded with spaces where a line is too short
+    if end is None:
+        end = max(int(lengths.max()), start) if len(lengths) else start
+    offsets = np.arange(start, end)
+    if len(starts) > 1 and (np.diff(starts) == starts[1] - starts[0]).all() and (lengths >= end).all():
+        # every record has the same length: a strided view, no copy
+        stride = int(starts[1] - starts[0])
+        records = np.lib.stride_tricks.as_strided(buf[starts[0]:], shape=(len(starts), end), strides=(stride, 1))
+        return records[:, start:end]
+    index = starts[:, None] + offsets[None, :]
+    inside = offsets[None, :] < lengths[:, None]
+    return np.where(inside, buf[np.minimum(index, len(buf) - 1)], SPACE).astype(np.uint8)
+
+def _decode_numeric(chars):
+    digits = chars.astype(np.int64) - 48
+    is_digit = (digits >= 0) & (digits <= 9)
+    valid = (is_digit | (chars == SPACE)).all(axis=1) & is_digit.any(axis=1)
+    values = np.zeros(len(chars), dtype=np.int64)
+    for j in range(chars.shape[1]):
+        values = np.where(is_digit[:, j], values * 10 + digits[:, j], values)
+    values[~valid] = MISSING
+    return values
+
+def _decode_text(chars):
+    # decode each distinct value once rather than once per row
+    width = chars.shape[1]
+    if width == 0:
+        return np.full(len(chars), np.nan, dtype=object)
+    fixed = np.ascontiguousarray(chars).view('S{}'.format(width)).ravel()
+    uniques, inverse = np.unique(fixed, return_inverse=True)
+    decoded = np.array([value.decode(ENCODING).strip() or np.nan for value in uniques], dtype=object)
+    return decoded[inverse.ravel()]
+
+def _read_columns(mm, spans, columns, header=True):
+    # every view into the mapping is local to this function, so none outlives the mmap
+    buf = np.frombuffer(mm, dtype=np.uint8)
+    starts, lengths = _line_bounds(buf, header)
+    result = {}
+    for name in columns:
+        chars = _column_bytes(buf, starts, lengths, *spans[name])
+        result[name] = _decode_numeric(chars) if name in NUMERIC_COLUMNS else _decode_text(chars)
+    return result
+
+def _column_spans(file_path, columns):
+    layout = schema_for_file(file_path).columns
+    if columns is None:
+        columns = [name for name, _, _ in layout]
+    spans = {name: (start, end) for name, start, end in layout}
+    unknown = [name for name in columns if name not in spans]
+    if unknown:
+        raise KeyError("Columns {} are not in '{}' (has {})".format(unknown, file_path, list(spans)))
+    return spans, columns
+
+def read_fide_list(file_path, columns=None, as_frame=True):
+    # columns: canonical names to decode (all of them by default)
+    spans, columns = _column_spans(file_path, columns)
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        result = _read_columns(mm, spans, columns)
+    if as_frame:
+        return pd.DataFrame(result, columns=columns)
+    return result
+
+def iter_fide_list(file_path, columns=None, chunk_rows=500_000):
+    # the list as a generator of column dicts of about chunk_rows rows each, for lists too big to decode at once;
+    # the file is read block by block, so memory depends on chunk_rows and not on the size of the list
+    spans, columns = _column_spans(file_path, columns)
+    with open(file_path, 'rb') as file:
+        block_size = chunk_rows * max(len(file.readline()), 1)
+        rest = b''
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+            end = block.rfind(b'\n') + 1
+            if end == 0:
+                rest += block
+                continue
+            yield _read_columns(rest + block[:end], spans, columns, header=False)
+            rest = block[end:]
+        if rest.strip():
+            yield _read_columns(rest, spans, columns, header=False)
+
+# Ingestion: every list is parsed, trimmed and normalised in its own worker process
+
+INGEST_COLUMNS = ['fide_id', 'name', 'title', 'federation', 'rating']
+FEDERATION_REMAP = {
+    'ENG': 'GBR', #England
+    'SCO': 'GBR', #Scotland
+    'WLS': 'GBR', #Wales
+    'JCI': 'GBR', #Jersey
+    'GCI': 'GBR', #Guernsey
+    'CAF': 'CAR', #Central African Republic
+}
+TITLES = {
+    'c': 'CM',  # Candidate Master
+    'f': 'FM',  # FIDE Master
+    'm': 'IM',  # International Master
+    'g': 'GM',  # Grandmaster
+    'wc': 'WCM',  # Woman Candidate Master
+    'wf': 'WFM',  # Woman FIDE Master
+    'wm': 'WIM',  # Woman International Master
+    'wg': 'WGM',   # Woman Grandmaster
+    'CM': 'CM',  # Candidate Master
+    'FM': 'FM',  # FIDE Master
+    'IM': 'IM',  # International Master
+    'GM': 'GM',  # Grandmaster
+    'WCM': 'WCM',  # Woman Candidate Master
+    'WFM': 'WFM',  # Woman FIDE Master
+    'WIM': 'WIM',  # Woman International Master
+    'WGM': 'WGM'   # Woman Grandmaster
+}
+
+# rated_players_df holds millions of rows, so every column gets the smallest type that fits:
+# small integers for the numbers and categoricals for the text, which also interns repeated names
+COMPACT_DTYPES = {'fide_id': np.int32, 'rating': np.int16, 'year': np.int16, 'games': np.int16, 'k': np.int16, 'born': np.int16}
+TITLE_CATEGORIES = ['GM', 'IM', 'FM', 'CM', 'WGM', 'WIM', 'WFM', 'WCM']
+
+def normalise_list(columns, year):
+    # rows without a usable id or rating are dropped, federations remapped and titles normalised
+    keep = (columns['fide_id'] != MISSING) & (columns['rating'] != MISSING)
+    result = {}
+    for name, values in columns.items():
+        values = values[keep]
+        if name in NUMERIC_COLUMNS:
+            result[name] = values.astype(COMPACT_DTYPES.get(name, np.int64))
+        elif name == 'federation':
+            result[name] = pd.Categorical(pd.Series(values).replace(FEDERATION_REMAP))
+        elif name == 'title':
+            result[name] = pd.Categorical(pd.Series(values).map(TITLES), categories=TITLE_CATEGORIES)
+        else:
+            result[name] = pd.Categorical(values)
+    result['year'] = np.full(int(keep.sum()), year, dtype=COMPACT_DTYPES['year'])
+    return result
+
+# Parsed lists are cached as columns keyed by the source file's content hash, the list year and
+# PARSER_VERSION; bump the version whenever parsing or normalise_list changes what ends up in a list.
+PARSER_VERSION = 2
+CACHE_NAMESPACE = 'fide_lists'
+
+def list_cache_key(file_path, year):
+    return cache.cache_key(cache.file_digest(file_path), year, PARSER_VERSION)
+
+def _list_name(file_path):
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+def _ingest_one(task):
+    # the cached entry holds the standard columns plus whatever else was asked for
+    file_path, year, columns, key = task
+    parsed_columns = list(dict.fromkeys(INGEST_COLUMNS + columns))
+    parsed = normalise_list(read_fide_list(file_path, parsed_columns, as_frame=False), year)
+    if key is not None:
+        cache.save_columns(CACHE_NAMESPACE, _list_name(file_path), key, parsed, meta={'source': file_path, 'rows': len(parsed['year'])})
+    return {name: parsed[name] for name in columns + ['year']}
+
+def load_fide_list(file_path, year, columns=INGEST_COLUMNS, use_cache=True):
+    # one normalised list as column arrays, read from the cache when the source is unchanged
+    columns = [name for name in columns if name != 'year']
+    key = list_cache_key(file_path, year) if use_cache else None
+    if key is not None and cache.has_entry(CACHE_NAMESPACE, _list_name(file_path), key, columns):
+        return cache.load_columns(CACHE_NAMESPACE, _list_name(file_path), key, columns + ['year'])
+    return _ingest_one((file_path, year, columns, key))
+
+def _assemble(parts, columns):
+    # numbers fill one preallocated array per column instead of concatenating per-list frames;
+    # categoricals are unioned so every distinct string is stored once
+    total = sum(len(part['year']) for part in parts)
+    assembled = {}
+    for name in columns:
+        if parts and isinstance(parts[0][name], pd.Categorical):
+            assembled[name] = union_categoricals([part[name] for part in parts])
+            continue
+        values = np.empty(total, dtype=parts[0][name].dtype if parts else object)
+        offset = 0
+        for part in parts:
+            values[offset:offset + len(part[name])] = part[name]
+            offset += len(part[name])
+        assembled[name] = values
+    return pd.DataFrame(assembled, columns=columns)
+
+def legacy_dtypes(df):
+    # the types rated_players_df used to have: object strings and 64-bit integers
+    return df.astype({name: object if isinstance(df[name].dtype, pd.CategoricalDtype) else np.int64 for name in df.columns})
+
+def memory_report(df):
+    # deep memory footprint per column, with the old dtypes and with the compact ones
+    before, after = legacy_dtypes(df), df
+    report = pd.DataFrame({
+        'before_dtype': before.dtypes.astype(str),
+        'before_mb': before.memory_usage(deep=True, index=False) / 2**20,
+        'after_dtype': after.dtypes.astype(str),
+        'after_mb': after.memory_usage(deep=True, index=False) / 2**20,
+    })
+    report.loc['total'] = ['', report['before_mb'].sum(), '', report['after_mb'].sum()]
+    report['ratio'] = report['before_mb'] / report['after_mb']
+    return report
+
+def ingest_fide_lists(file_paths, years, columns=INGEST_COLUMNS, max_workers=None, use_cache=True):
+    # cached lists are memory-mapped here, only the others are parsed (in worker processes)
+    # max_workers=1 parses in this process, which is handy for debugging
+    columns = [name for name in columns if name != 'year']
+    parts = [None] * len(file_paths)
+    tasks = []
+    for i, (file_path, year) in enumerate(zip(file_paths, years)):
+        key = list_cache_key(file_path, year) if use_cache else None
+        if key is not None and cache.has_entry(CACHE_NAMESPACE, _list_name(file_path), key, columns):
+            parts[i] = cache.load_columns(CACHE_NAMESPACE, _list_name(file_path), key, columns + ['year'])
+        else:
+            tasks.append((i, (file_path, year, columns, key)))
+    if max_workers == 1 or len(tasks) <= 1:
+        results = [_ingest_one(task) for _, task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_ingest_one, [task for _, task in tasks]))
+    for (i, _), result in zip(tasks, results):
+        parts[i] = result
+    return _assemble(parts, columns + ['year'])
@@ -0,0 +1,168 @@
+import json
+import numpy as np
+import pandas as pd
+import cache
+import assets
+import country_codes
+
+# countries.geojson (24 MB of full-resolution polygons) prepared once for the choropleths: every ring is
+# simplified with Douglas-Peucker at a tolerance in degrees, the coordinates of all features are packed into
+# flat float32 arrays with offset arrays for rings, polygons and features, and the result is cached per
+# tolerance. Features are found by FIDE code through the crosswalk's iso column, so ENG, SCO and WLS all
+# draw Great Britain. A figure asks for the federations it shows (Geometries.geojson) and gets a small
+# FeatureCollection with only those.
+
+TOLERANCES = (0.01, 0.05, 0.1) # roughly 1, 5 and 10 km at the equator
+DEFAULT_TOLERANCE = 0.05
+COORDINATE_DECIMALS = 4
+ISO_PROPERTIES = ['ISO_A3', 'ISO3166-1-Alpha-3', 'iso_a3']
+GEOMETRY_VERSION = 1
+CACHE_NAMESPACE = 'geometry'
+
+def simplify_ring(points, tolerance):
+    # Douglas-Peucker on an (n, 2) ring or line; the end points are always kept
+    n = len(points)
+    if n <= 4 or tolerance <= 0:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, n - 1]] = True
+    pending = [(0, n - 1)]
+    while pending:
+        start, end = pending.pop()
+        if end - start < 2:
+            continue
+        inner = points[start + 1:end] - points[start]
+        direction = points[end] - points[start]
+        length = np.hypot(*direction)
+        if length == 0: # a closed ring: distance to the shared end point
+            distance = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distance = np.abs(direction[0] * inner[:, 1] - direction[1] * inner[:, 0]) / length
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            pending.extend([(start, split), (split, end)])
+    return points[keep]
+
+def _polygons(geometry):
+    if geometry is None:
+        return []
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    return []
+
+def _simplify_polygons(polygons, tolerance):
+    # rings that shrink below a triangle are dropped; a feature that would lose everything keeps its largest polygon as is
+    simplified = []
+    for polygon in polygons:
+        rings = [simplify_ring(np.asarray(ring, dtype=np.float64), tolerance) for ring in polygon]
+        if len(rings[0]) >= 4:
+            simplified.append([ring for ring in rings if len(ring) >= 4])
+    if not simplified and polygons:
+        largest = max(polygons, key=lambda polygon: len(polygon[0]))
+        simplified = [[np.asarray(largest[0], dtype=np.float64)]]
+    return simplified
+
+def _feature_iso(properties):
+    for name in ISO_PROPERTIES:
+        if properties.get(name) not in (None, '', '-99'):
+            return properties[name]
+    return None
+
+def pack_features(features, tolerance):
+    # (isos, columns): the simplified features as flat arrays; feature i owns polygons
+    # feature_offsets[i]:feature_offsets[i+1], polygon j rings polygon_offsets[j]:..., ring k points ring_offsets[k]:...
+    isos, points, ring_offsets, polygon_offsets, feature_offsets = [], [], [0], [0], [0]
+    for feature in features:
+        iso = _feature_iso(feature.get('properties') or {})
+        if iso is None:
+            continue
+        for polygon in _simplify_polygons(_polygons(feature.get('geometry')), tolerance):
+            for ring in polygon:
+                points.append(ring)
+                ring_offsets.append(ring_offsets[-1] + len(ring))
+            polygon_offsets.append(len(ring_offsets) - 1)
+        feature_offsets.append(len(polygon_offsets) - 1)
+        isos.append(iso)
+    points = np.concatenate(points).astype(np.float32) if points else np.empty((0, 2), dtype=np.float32)
+    return isos, {
+        'iso': np.array(isos, dtype=object),
+        'longitude': points[:, 0],
+        'latitude': points[:, 1],
+        'ring_offsets': np.array(ring_offsets, dtype=np.int64),
+        'polygon_offsets': np.array(polygon_offsets, dtype=np.int64),
+        'feature_offsets': np.array(feature_offsets, dtype=np.int64),
+    }
+
+class Geometries:
+    def __init__(self, columns, tolerance):
+        self.tolerance = tolerance
+        self.isos = np.asarray(columns['iso'], dtype=object)
+        self.points = np.column_stack([columns['longitude'], columns['latitude']])
+        self.ring_offsets = np.asarray(columns['ring_offsets'])
+        self.polygon_offsets = np.asarray(columns['polygon_offsets'])
+        self.feature_offsets = np.asarray(columns['feature_offsets'])
+        self._features = {iso: i for i, iso in enumerate(self.isos)}
+
+    def __len__(self):
+        return len(self.isos)
+
+    def feature_index(self, fide_codes):
+        # feature of every FIDE code (through the crosswalk's iso code), -1 where there is none
+        isos = country_codes.lookup(fide_codes, 'iso')
+        return np.array([self._features.get(iso, -1) for iso in isos], dtype=np.int64)
+
+    def geometry(self, feature):
+        # GeoJSON MultiPolygon of one feature, coordinates rounded to COORDINATE_DECIMALS
+        polygons = []
+        for polygon in range(self.feature_offsets[feature], self.feature_offsets[feature + 1]):
+            rings = []
+            for ring in range(self.polygon_offsets[polygon], self.polygon_offsets[polygon + 1]):
+                points = self.points[self.ring_offsets[ring]:self.ring_offsets[ring + 1]]
+                rings.append(points.astype(np.float64).round(COORDINATE_DECIMALS).tolist())
+            polygons.append(rings)
+        return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+    def geojson(self, fide_codes):
+        # a FeatureCollection with one feature per FIDE code that has a geometry, its id the FIDE code,
+        # for px.choropleth(df, geojson=..., locations='federation', featureidkey='id')
+        fide_codes = list(pd.unique(pd.Series(fide_codes).dropna()))
+        features = []
+        for fide_code, feature in zip(fide_codes, self.feature_index(fide_codes)):
+            if feature >= 0:
+                features.append({'type': 'Feature', 'id': fide_code, 'properties': {'iso': self.isos[feature]},
+                                 'geometry': self.geometry(feature)})
+        return {'type': 'FeatureCollection', 'features': features}
+
+def _cache_key(file_path, tolerance):
+    return cache.cache_key(GEOMETRY_VERSION, cache.file_digest(file_path), tolerance)
+
+def _entry_name(tolerance):
+    return 'countries_{:g}'.format(tolerance)
+
+def prepare_geometries(file_path=None, tolerances=TOLERANCES, use_cache=True):
+    # {tolerance: Geometries}; the geojson is parsed once for all tolerances that are not cached yet
+    file_path = file_path or assets.ensure('geojson')
+    result, missing = {}, []
+    for tolerance in tolerances:
+        key = _cache_key(file_path, tolerance)
+        if use_cache and cache.has_entry(CACHE_NAMESPACE, _entry_name(tolerance), key):
+            result[tolerance] = Geometries(cache.load_columns(CACHE_NAMESPACE, _entry_name(tolerance), key), tolerance)
+        else:
+            missing.append(tolerance)
+    if missing:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            features = json.load(file)['features']
+        for tolerance in missing:
+            isos, columns = pack_features(features, tolerance)
+            if use_cache:
+                cache.save_columns(CACHE_NAMESPACE, _entry_name(tolerance), _cache_key(file_path, tolerance), columns,
+                                   meta={'source': file_path, 'features': len(isos), 'points': len(columns['longitude'])})
+            result[tolerance] = Geometries(columns, tolerance)
+    return result
+
+def load_geometries(tolerance=DEFAULT_TOLERANCE, file_path=None):
+    return prepare_geometries(file_path, [tolerance])[tolerance]
@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import functools
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+# Per-stage measurements of the cleaning pipeline, switched on by the CHESS_INSTRUMENT environment variable:
+#   CHESS_INSTRUMENT=1               wall and CPU time, peak RSS, input/output rows and bytes
+#   CHESS_INSTRUMENT=memory          ... plus the peak tracemalloc allocation (slows the stage down)
+#   CHESS_INSTRUMENT=memory,profile  ... plus a cProfile dump of every stage
+# Every finished stage is appended as one JSON line to <CHESS_INSTRUMENT_DIR>/<run>.jsonl.
+# When the variable is unset, stage() hands out a shared object whose methods do nothing.
+
+_modes = {mode.strip() for mode in os.environ.get('CHESS_INSTRUMENT', '').lower().split(',')} - {'', '0', 'false'}
+ENABLED = bool(_modes)
+TRACE_MEMORY = 'memory' in _modes
+PROFILE = 'profile' in _modes
+OUTPUT_DIR = os.environ.get('CHESS_INSTRUMENT_DIR', os.path.join('data', 'instrumentation'))
+RUN_ID = time.strftime('%Y%m%d-%H%M%S') + '-{}'.format(os.getpid())
+
+_records = []
+_stack = []
+
+def peak_rss_mb():
+    # VmHWM is the peak of this process image; ru_maxrss survives exec on Linux, so it is only a fallback
+    try:
+        with open('/proc/self/status', 'r') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    try:
+        import resource # Unix only
+    except ImportError:
+        return float('nan')
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2**20 if sys.platform == 'darwin' else 2**10)
+
+def measure(obj):
+    # (rows, bytes) of a frame, array, dict of columns, file path or list of those; None where unknown
+    if obj is None:
+        return None, None
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return len(obj), int(obj.memory_usage(index=False, deep=False).sum()) if isinstance(obj, pd.DataFrame) else int(obj.nbytes)
+    if isinstance(obj, np.ndarray):
+        return len(obj), int(obj.nbytes)
+    if isinstance(obj, (str, os.PathLike)):
+        return None, os.path.getsize(obj) if os.path.exists(obj) else None
+    if isinstance(obj, dict):
+        sizes = [measure(value) for value in obj.values()]
+        return (sizes[0][0] if sizes else 0), sum(size or 0 for _, size in sizes)
+    if isinstance(obj, (list, tuple)):
+        sizes = [measure(value) for value in obj]
+        rows = [rows for rows, _ in sizes if rows is not None]
+        return (sum(rows) if rows else len(obj)), sum(size or 0 for _, size in sizes)
+    return None, None
+
+class _Stage:
+    def __init__(self, name, inputs=None):
+        self.record = {'run': RUN_ID, 'stage': name}
+        self.record['rows_in'], self.record['bytes_in'] = measure(inputs)
+        self.record['rows_out'] = self.record['bytes_out'] = None
+
+    def input(self, obj):
+        self.record['rows_in'], self.record['bytes_in'] = measure(obj)
+        return obj
+
+    def output(self, obj):
+        self.record['rows_out'], self.record['bytes_out'] = measure(obj)
+        return obj
+
+    def __enter__(self):
+        self._parent = _stack[-1] if _stack else None
+        _stack.append(self)
+        self._started_tracing = False
+        if TRACE_MEMORY:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            if self._parent is not None:
+                self._parent._peak = max(self._parent._peak, peak)
+            tracemalloc.reset_peak()
+            self._base = self._peak = current
+        self._profiler = cProfile.Profile() if PROFILE else None
+        self._rss = peak_rss_mb()
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        if self._profiler is not None:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profiler is not None:
+            self._profiler.disable()
+        self.record['wall_s'] = time.perf_counter() - self._wall
+        self.record['cpu_s'] = time.process_time() - self._cpu
+        self.record['peak_rss_mb'] = peak_rss_mb()
+        self.record['rss_growth_mb'] = self.record['peak_rss_mb'] - self._rss
+        if TRACE_MEMORY:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            self.record['peak_alloc_mb'] = (self._peak - self._base) / 2**20
+            if self._parent is not None:
+                self._parent._peak = max(self._parent._peak, self._peak)
+            if self._started_tracing:
+                tracemalloc.stop()
+        self.record['parent'] = self._parent.record['stage'] if self._parent is not None else None
+        self.record['failed'] = exc_type is not None
+        _stack.pop()
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        if self._profiler is not None:
+            self.record['profile'] = os.path.join(OUTPUT_DIR, '{}-{}.prof'.format(RUN_ID, self.record['stage']))
+            self._profiler.dump_stats(self.record['profile'])
+        _records.append(self.record)
+        with open(os.path.join(OUTPUT_DIR, RUN_ID + '.jsonl'), 'a') as file:
+            file.write(json.dumps(self.record) + '\n')
+        return False
+
+class _NoStage:
+    def input(self, obj):
+        return obj
+
+    def output(self, obj):
+        return obj
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NO_STAGE = _NoStage()
+
+def stage(name, inputs=None):
+    # with stage('olympiad_load', inputs=filenames) as s: ...; s.output(df)
+    if not ENABLED:
+        return _NO_STAGE
+    return _Stage(name, inputs)
+
+def instrumented(name=None):
+    # decorator form: the first argument is taken as the input and the return value as the output
+    def decorate(func):
+        if not ENABLED:
+            return func
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name or func.__name__, args[0] if args else None) as current:
+                return current.output(func(*args, **kwargs))
+        return wrapper
+    return decorate
+
+def summary():
+    # the stages recorded so far in this process, as a frame
+    return pd.DataFrame(_records)
@@ -0,0 +1,137 @@
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Links Olympiad players (name + federation, no FIDE id) to rows of rated_players_df.
+# Candidates are blocked by (federation, list year), so every Olympiad player is only compared
+# with the rated players of their own federation in the January list of the Olympiad year.
+# Inside a block exact matches of the normalised name are taken first. The remaining players are
+# only compared with candidates sharing their initial, scored all at once as a sparse TF-IDF
+# (character n-gram) product; players that find no match there are rescored against the whole
+# block, so a transliterated initial (Jakovenko/Yakovenko) is still found.
+
+# federations that changed code while our lists were published
+FEDERATION_ALIASES = {'TTO': ['TRI']}
+
+@lru_cache(maxsize=2**16)
+def normalise_name(name):
+    # 'Ivanchuk, Vassily' and 'Ivanchuk Vassily' both become 'ivanchuk vassily'
+    if not isinstance(name, str):
+        return ''
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', unidecode(name).lower()).split())
+
+def _normalised(values):
+    # names (and their initials) are normalised once per distinct value, categoricals only touch their categories
+    values = pd.Series(values)
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+    values = values.cat.remove_unused_categories()
+    categories = np.array([normalise_name(name) for name in values.cat.categories] + [''], dtype=object)
+    initials = np.array([name[:1] for name in categories], dtype=object)
+    codes = values.cat.codes.to_numpy() # code -1 (NaN) picks the trailing ''
+    return categories[codes], initials[codes]
+
+def _score_block(queries, candidates):
+    # best and second best cosine similarity of every query against every candidate, read off the nonzero
+    # entries of the sparse product; a query sharing no n-gram with any candidate scores 0 against candidate 0
+    vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 3))
+    candidate_matrix = vectorizer.fit_transform(candidates)
+    query_matrix = vectorizer.transform(queries)
+    scores = (query_matrix @ candidate_matrix.T).tocsr()
+    scores.sum_duplicates()
+    counts = np.diff(scores.indptr)
+    rows = np.repeat(np.arange(len(queries)), counts)
+    # every query's entries stay in its own run, best score first (lowest candidate on ties)
+    order = np.lexsort((scores.indices, -scores.data, rows))
+    columns, data = scores.indices[order], scores.data[order]
+    best = np.zeros(len(queries), dtype=np.int64)
+    best_score = np.zeros(len(queries))
+    second_score = np.zeros(len(queries))
+    has_one, has_two = counts >= 1, counts >= 2
+    first = scores.indptr[:-1]
+    best[has_one], best_score[has_one] = columns[first[has_one]], data[first[has_one]]
+    second_score[has_two] = data[first[has_two] + 1]
+    return best, best_score, second_score
+
+def _link_block(queries, query_initials, candidate_rows, rated_names, rated_initials, threshold):
+    best = np.zeros(len(queries), dtype=np.int64)
+    best_score = np.zeros(len(queries))
+    second_score = np.zeros(len(queries))
+    candidate_names = rated_names[candidate_rows]
+    fuzzy = np.ones(len(queries), dtype=bool)
+    for i, query in enumerate(queries):
+        exact = np.flatnonzero(candidate_names == query)
+        if len(exact):
+            # a homonym in the same federation leaves the runner-up at 1.0, i.e. ambiguous
+            best[i], best_score[i], second_score[i] = candidate_rows[exact[0]], 1.0, 1.0 if len(exact) > 1 else 0.0
+            fuzzy[i] = False
+    candidate_initials = rated_initials[candidate_rows]
+    for initial in np.unique(query_initials[fuzzy]):
+        subset = candidate_rows[candidate_initials == initial]
+        if len(subset) == 0:
+            continue
+        mask = fuzzy & (query_initials == initial)
+        found, found_best, found_second = _score_block(queries[mask], rated_names[subset])
+        best[mask], best_score[mask], second_score[mask] = subset[found], found_best, found_second
+    retry = best_score < threshold
+    if retry.any():
+        found, found_best, found_second = _score_block(queries[retry], rated_names[candidate_rows])
+        best[retry], best_score[retry], second_score[retry] = candidate_rows[found], found_best, found_second
+    return best, best_score, second_score
+
+def link_players(olympiad_df, rated_df, threshold=0.6, margin=0.05, list_year_offset=0, aliases=FEDERATION_ALIASES):
+    # returns one row per olympiad_df row (same index) with the linked fide_id (-1 when not linked),
+    # the best and runner-up scores and a status: matched, ambiguous (runner-up within margin) or unmatched
+    olympiad_names, olympiad_initials = _normalised(olympiad_df['name'])
+    olympiad_blocks = olympiad_df.groupby([olympiad_df['federation'].astype(str), olympiad_df['year'].astype(int)]).indices
+    wanted = {(code, year + list_year_offset) for federation, year in olympiad_blocks
+              for code in [federation] + list(aliases.get(federation, []))}
+    # only the rated players of the (federation, list year) blocks the Olympiads use are grouped and normalised
+    in_blocks = (rated_df['federation'].isin({code for code, _ in wanted})
+                 & rated_df['year'].isin({year for _, year in wanted})).to_numpy()
+    rows = np.flatnonzero(in_blocks)
+    subset = rated_df.iloc[rows]
+    rated_names, rated_initials = _normalised(subset['name'])
+    rated_ids = subset['fide_id'].to_numpy()
+    rated_blocks = subset.groupby([subset['federation'].astype(str), subset['year'].astype(int)], observed=True).indices
+
+    fide_id = np.full(len(olympiad_df), -1, dtype=np.int64)
+    best_score = np.zeros(len(olympiad_df))
+    second_score = np.zeros(len(olympiad_df))
+    for (federation, year), positions in olympiad_blocks.items():
+        list_year = year + list_year_offset
+        federations = [federation] + list(aliases.get(federation, []))
+        candidate_rows = [rated_blocks[(code, list_year)] for code in federations if (code, list_year) in rated_blocks]
+        positions = positions[olympiad_names[positions] != '']
+        if not candidate_rows or len(positions) == 0:
+            continue
+        best, block_best, block_second = _link_block(olympiad_names[positions], olympiad_initials[positions],
+                                                     np.concatenate(candidate_rows), rated_names, rated_initials, threshold)
+        fide_id[positions] = rated_ids[best]
+        best_score[positions] = block_best
+        second_score[positions] = block_second
+
+    status = np.where(best_score < threshold, 'unmatched',
+                      np.where(best_score - second_score < margin, 'ambiguous', 'matched'))
+    # two Olympiad players of one year claiming the same FIDE id cannot both be right
+    claimed = pd.DataFrame({'fide_id': fide_id, 'year': olympiad_df['year'].to_numpy()})[status == 'matched']
+    status[claimed.index[claimed.duplicated(keep=False)]] = 'ambiguous'
+    fide_id[status != 'matched'] = -1
+    return pd.DataFrame({'fide_id': fide_id, 'score': best_score, 'runner_up_score': second_score, 'status': status},
+                        index=olympiad_df.index)
+
+def linkage_report(links, rated_df, list_year_offset=0, aliases=FEDERATION_ALIASES):
+    # per Olympiad: the share of matched / ambiguous / unmatched players (links is olympiad_df joined with
+    # link_players) and how many rated players of the Olympiad's federations the list offered as candidates
+    report = pd.crosstab(links['year'], links['status'], normalize='index')
+    report['players'] = links.groupby('year').size()
+    candidates = {}
+    for year, federations in links.groupby('year')['federation'].unique().items():
+        codes = {code for federation in federations.astype(str) for code in [federation] + list(aliases.get(federation, []))}
+        in_list = rated_df['year'].to_numpy() == year + list_year_offset
+        candidates[year] = int((in_list & rated_df['federation'].astype(str).isin(codes).to_numpy()).sum())
+    report['candidates'] = pd.Series(candidates)
+    return report
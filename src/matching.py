@@ -0,0 +1,100 @@
+from functools import lru_cache
+import numpy as np
+from unidecode import unidecode
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Name crosswalks (federation names -> country names and the like) by TF-IDF cosine similarity.
+# All queries are transformed in one batch and scored against all answers in a single sparse product,
+# only pairs above the threshold are kept, and of those only the top_k per query (picked with argpartition,
+# the pairs are never sorted as a whole). Answers are then handed out globally, best scoring pair first,
+# so that no answer is used twice; a query whose top_k all went elsewhere gets its next top_k.
+
+def _candidate_pairs(queries, answers, threshold, allowed=None):
+    # (query, answer, score) of every pair scoring above the threshold, grouped by query
+    vectorizer = TfidfVectorizer()
+    answer_matrix = vectorizer.fit_transform(answers)
+    scores = (vectorizer.transform(queries) @ answer_matrix.T).tocsr()
+    scores.sort_indices()
+    scores = scores.tocoo()
+    rows, cols, data = scores.row, scores.col, np.round(scores.data, 3)
+    keep = data > threshold
+    if allowed is not None:
+        keep &= allowed(rows, cols)
+    return rows[keep], cols[keep], data[keep]
+
+def _tiers(rows, cols, data, top_k):
+    # 0 for the top_k best pairs of every query, 1 for its next top_k, 2 for the rest; on equal scores the
+    # lower answer index wins (scores are rounded to 3 decimals, so score and answer fit in one integer key)
+    key = (1000 - np.rint(data * 1000).astype(np.int64)) * (int(cols.max()) + 1 if len(cols) else 1) + cols
+    tier = np.zeros(len(rows), dtype=np.int8)
+    bounds = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1], True])
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        if end - start <= top_k:
+            continue
+        kth = [top_k - 1, 2 * top_k - 1] if end - start > 2 * top_k else [top_k - 1]
+        order = start + np.argpartition(key[start:end], kth)
+        tier[order[top_k:]] = 1
+        tier[order[2 * top_k:]] = 2
+    return tier
+
+def _assign(rows, cols, data, n_queries, taken):
+    # best scoring pair first (then the lower query, then the lower answer)
+    match = np.full(n_queries, -1, dtype=np.int64)
+    order = np.lexsort((cols, rows, -data))
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if match[row] < 0 and col not in taken:
+            match[row] = col
+            taken.add(col)
+    return match
+
+def match_names(queries, answers, threshold=0.6, top_k=10, allowed=None):
+    # index of the answer matched to every query, -1 where there is none;
+    # allowed(query_indices, answer_indices) -> bool array can veto pairs
+    rows, cols, data = _candidate_pairs(list(queries), list(answers), threshold, allowed)
+    tier = _tiers(rows, cols, data, top_k)
+    taken = set()
+    first = tier == 0
+    match = _assign(rows[first], cols[first], data[first], len(queries), taken)
+    # queries whose top_k answers all went elsewhere get another go at their next top_k candidates
+    retry = (match[rows] < 0) & (tier == 1)
+    if retry.any():
+        retried = _assign(rows[retry], cols[retry], data[retry], len(queries), taken)
+        match = np.where(match < 0, retried, match)
+    return match
+
+def _island_rule(queries, answers):
+    # islands often end up as false positive matches, so only an island may match an island
+    query_island = np.array(['island' in query.lower() for query in queries], dtype=bool)
+    answer_island = np.array(['island' in answer.lower() for answer in answers], dtype=bool)
+    return lambda rows, cols: query_island[rows] | ~answer_island[cols]
+
+# federations neither TF-IDF nor their first four letters can place, with their name in the capitals table
+KNOWN_ANSWERS = {
+    'Eswatini': 'Swaziland',
+    'Laos': "Lao People's Democratic Republic",
+    'Faroe Islands': 'Faeroe Islands',
+}
+
+@lru_cache(maxsize=32)
+def _find_match_country(queries, possible_answers, perfect, threshold, top_k):
+    match = match_names(queries, possible_answers, threshold, top_k, _island_rule(queries, possible_answers))
+    best_matches = [(queries[i], possible_answers[j]) for i, j in enumerate(match) if j >= 0]
+    no_match = [queries[i] for i in np.flatnonzero(match < 0)]
+    if perfect:
+        past_matches = set(match[match >= 0].tolist())
+        candidates = [answer for i, answer in enumerate(possible_answers) if i not in past_matches]
+        for country in no_match:
+            # the first four letters of a federation have to appear in a country that is still free
+            country_substring = unidecode(country[:4])
+            for candidate in candidates:
+                if country_substring in candidate:
+                    best_matches.append((country, candidate))
+                    break
+            else:
+                if KNOWN_ANSWERS.get(country) in possible_answers:
+                    best_matches.append((country, KNOWN_ANSWERS[country]))
+    return tuple(best_matches)
+
+def find_match_country(queries_list, matching_list, perfect=False, threshold=0.6, top_k=10):
+    # list of (query, best_answer) tuples; results are memoised on the content of both lists
+    return list(_find_match_country(tuple(queries_list), tuple(matching_list), perfect, threshold, top_k))
@@ -0,0 +1,162 @@
+from contextlib import closing
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+import cache
+
+# Chess-results exports one worksheet per Olympiad: a few title rows, then a block per team made of a
+# team row ('1. Ukraine (UKR / RtgAvg:2737, ...'), a header row starting with 'Bo.' and one row per player.
+# The layout differs between years (2018 adds 'FideID' and 'RtgAvg'), so columns are found by their label
+# in the header rows instead of by position. Rows are streamed with openpyxl in read-only mode and the
+# parsed columns are cached per workbook, keyed by its content hash.
+
+HEADER_MARKER = 'Bo.'
+# header label -> column name; the unlabelled column right after 'Bo.' holds the title
+COLUMN_LABELS = {
+    'Bo.': 'board',
+    'Name': 'name',
+    'Rtg': 'rating',
+    'FED': 'federation',
+    'FideID': 'fide_id',
+    'Pts.': 'points',
+    'Games': 'games',
+    'Rp': 'rating_performance',
+    'w': 'w',
+    'we': 'we',
+    'K': 'k',
+}
+ROUNDS = 11
+ROUND_COLUMNS = ['round_{}'.format(i) for i in range(1, ROUNDS + 1)]
+TEXT_COLUMNS = ['title', 'name', 'federation'] + ROUND_COLUMNS
+NUMERIC_COLUMNS = ['board', 'rating', 'fide_id', 'points', 'games', 'rating_performance', 'w', 'we', 'k']
+OLYMPIAD_COLUMNS = ['board', 'title', 'name', 'rating', 'federation', 'points', 'games', 'rating_performance']
+
+PARSER_VERSION = 1
+CACHE_NAMESPACE = 'olympiads'
+
+# Trinidad and Tobago switched from TRI to its IOC code in 2014, and the British federations count as one country
+FEDERATION_RENAMES = {'TRI': 'TTO', 'ENG': 'GBR', 'SCO': 'GBR', 'WLS': 'GBR', 'JCI': 'GBR', 'GCI': 'GBR'}
+# Taiwan, Kosovo and the Netherlands Antilles have no country-level data to join
+DROPPED_FEDERATIONS = ['TPE', 'KOS', 'AHO']
+
+def _label(value):
+    return str(value).strip() if value is not None else ''
+
+def column_map(header_row):
+    # position of every known column in one 'Bo.' header row
+    positions = {}
+    for i, value in enumerate(header_row):
+        label = _label(value)
+        if label in COLUMN_LABELS:
+            positions[COLUMN_LABELS[label]] = i
+        elif label.isdigit() and 1 <= int(label) <= ROUNDS:
+            positions['round_' + label] = i
+    board = positions.get('board')
+    if board is not None and board + 1 < len(header_row) and not _label(header_row[board + 1]):
+        positions['title'] = board + 1
+    return positions
+
+def _to_number(value):
+    # cells hold ints, floats or strings such as '8', '5½' or '½'; anything else is NaN
+    if value is None or isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    half = 0.5 if text.endswith('½') else 0.0
+    text = text.rstrip('½').replace(',', '.')
+    if not text:
+        return half if half else np.nan
+    try:
+        return float(text) + half
+    except ValueError:
+        return np.nan
+
+def _to_text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    return text or None
+
+def _is_board(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return True
+    return isinstance(value, str) and value.strip().isdigit()
+
+def iter_sheet_rows(file_path):
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+def header_row(file_path):
+    # the first 'Bo.' header row of a workbook, read without parsing the rest of it
+    with closing(iter_sheet_rows(file_path)) as rows:
+        for row in rows:
+            if row and _label(row[0]) == HEADER_MARKER:
+                return list(row)
+    return None
+
+def read_olympiad(file_path):
+    # every player row of one workbook as column arrays, the columns a year lacks filled with NaN/None
+    columns = {name: [] for name in NUMERIC_COLUMNS + TEXT_COLUMNS}
+    positions = None
+    for row in iter_sheet_rows(file_path):
+        if not row:
+            continue
+        if _label(row[0]) == HEADER_MARKER:
+            positions = column_map(row)
+            continue
+        if positions is None or not _is_board(row[0]):
+            continue
+        for name, values in columns.items():
+            i = positions.get(name)
+            value = row[i] if i is not None and i < len(row) else None
+            values.append(_to_number(value) if name in NUMERIC_COLUMNS else _to_text(value))
+    if positions is None:
+        raise ValueError("No '{}' header row in {}".format(HEADER_MARKER, file_path))
+    parsed = {name: np.asarray(columns[name], dtype=np.float64) for name in NUMERIC_COLUMNS}
+    parsed.update({name: pd.Categorical(columns[name]) for name in TEXT_COLUMNS})
+    return parsed
+
+def olympiad_cache_key(file_path, year):
+    return cache.cache_key(cache.file_digest(file_path), year, PARSER_VERSION)
+
+def load_olympiad_columns(file_path, year, use_cache=True):
+    name = 'olympiad_{}'.format(year)
+    key = olympiad_cache_key(file_path, year) if use_cache else None
+    if key is not None and cache.has_entry(CACHE_NAMESPACE, name, key):
+        return cache.load_columns(CACHE_NAMESPACE, name, key)
+    parsed = read_olympiad(file_path)
+    if key is not None:
+        cache.save_columns(CACHE_NAMESPACE, name, key, parsed, meta={'source': file_path, 'rows': len(parsed['board'])})
+    return parsed
+
+def _frame(parsed, columns, year):
+    df = pd.DataFrame({name: parsed[name] for name in columns})
+    for name in columns:
+        # whole numbers without gaps come back as integers, like pd.to_numeric would give them
+        if name in NUMERIC_COLUMNS and df[name].notna().all() and (df[name] % 1 == 0).all():
+            df[name] = df[name].astype(np.int64)
+        elif name in TEXT_COLUMNS:
+            df[name] = df[name].astype(object).where(df[name].notna(), np.nan)
+    df['year'] = year
+    return df
+
+def load_olympiad(file_path, year, columns=OLYMPIAD_COLUMNS, use_cache=True):
+    return _frame(load_olympiad_columns(file_path, year, use_cache), list(columns), year)
+
+def load_olympiads(file_paths, years, columns=OLYMPIAD_COLUMNS, use_cache=True):
+    # one frame for several Olympiads; only workbooks that changed since the last run are parsed
+    frames = [load_olympiad(file_path, year, columns, use_cache) for file_path, year in zip(file_paths, years)]
+    return pd.concat(frames, axis=0, ignore_index=True)
+
+def merge_federations(df):
+    # the federation edge cases of the analysis; rows keep their index
+    df = df[~df['federation'].isin(DROPPED_FEDERATIONS)].copy()
+    df['federation'] = df['federation'].replace(FEDERATION_RENAMES)
+    return df
@@ -0,0 +1,265 @@
+import os
+import time
+import hashlib
+import inspect
+import argparse
+from functools import partial
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import cache
+import assets
+import instrument
+import olympiads
+import fide_lists
+import linker
+import world_bank
+import country_codes
+import matching
+
+# The cleaning steps of clean_manipulate as a graph of stages. The output frame of every stage is cached
+# under a key made of its name, its version, the source of its code, the content hash of the files it reads
+# and the keys of the stages it depends on, so a key changes exactly when something upstream of the stage changed.
+# A run computes the stages whose key has no cache entry and loads only the cached outputs that a computed
+# stage (or the caller) needs; outputs nobody needs any more are released while the run goes on.
+# The Olympiad and FIDE list years come from assets.OLYMPIADS and assets.FIDE_LIST_YEARS: adding a year
+# there reruns the stages that read those files, and inside them only the new workbook or list is parsed,
+# since olympiads.py and fide_lists.py cache every file they have parsed.
+# Usage (from src), e.g. for the nightly job:
+#   python pipeline.py                                   every stage, reusing whatever is up to date
+#   python pipeline.py economic_features --force world_bank
+#   python pipeline.py --skip rated_players              keep the last rated_players even if a list changed
+#   python pipeline.py --status                          which stages are up to date, without running anything
+# Keys and --status only look files up (assets.path); run() fetches the missing assets it needs (assets.ensure).
+
+CACHE_NAMESPACE = 'pipeline'
+
+# func is called with the outputs of `inputs`, in order, and returns a DataFrame; files are asset names or paths
+# whose content is part of the key; so is the source of func and of the modules it calls, so editing e.g.
+# linker.py reruns olympiad_players; version holds the parameters baked into the stage. The files parsed by
+# olympiads.py and fide_lists.py are cached per file under their PARSER_VERSION, bump it when parsing changes
+Stage = namedtuple('Stage', ['name', 'func', 'inputs', 'files', 'version', 'modules'])
+
+def _file_path(file):
+    return assets.path(file) if file in assets.REGISTRY else file
+
+def code_digest(func, modules=()):
+    # sha256 of the source of func (a partial is unwrapped) and of the given modules
+    while isinstance(func, partial):
+        func = func.func
+    sha256 = hashlib.sha256(inspect.getsource(func).encode())
+    for module in modules:
+        sha256.update(inspect.getsource(module).encode())
+    return sha256.hexdigest()
+
+def save_frame(name, key, df, cache_dir=None):
+    # the index is stored as ordinary columns; dtypes are restored on load (text columns come back categorical)
+    # files are named by str(label); integer labels (the World Bank year columns) are given back as integers
+    index_names = list(df.index.names) if not isinstance(df.index, pd.RangeIndex) else []
+    flat = df.reset_index() if index_names else df
+    names = [str(column) for column in flat.columns]
+    columns = {name: flat[column].array if isinstance(flat[column].dtype, pd.CategoricalDtype) else flat[column].to_numpy()
+               for name, column in zip(names, flat.columns)}
+    meta = {'rows': len(flat), 'order': names, 'dtypes': {name: str(dtype) for name, dtype in zip(names, flat.dtypes)},
+            'index': names[:len(index_names)], 'index_names': index_names,
+            'labels': [int(column) if isinstance(column, (int, np.integer)) else name for name, column in zip(names, flat.columns)]}
+    return cache.save_columns(CACHE_NAMESPACE, name, key, columns, meta, cache_dir)
+
+def load_frame(name, key, cache_dir=None):
+    meta = cache.current_meta(CACHE_NAMESPACE, name, cache_dir)
+    if meta is None or meta['key'] != key:
+        raise KeyError("No cached output of stage {} for key {}".format(name, key[:16]))
+    columns = cache.load_columns(CACHE_NAMESPACE, name, key, meta['order'], cache_dir)
+    df = pd.DataFrame({column: np.array(values) if isinstance(values, np.ndarray) else values for column, values in columns.items()},
+                      columns=meta['order'])
+    df = df.astype({column: dtype for column, dtype in meta['dtypes'].items() if dtype != 'category'})
+    if meta['index']:
+        df = df.set_index(meta['index']).rename_axis(meta['index_names'])
+    labels = dict(zip(meta['order'], meta.get('labels', meta['order'])))
+    return df.rename(columns={name: labels[name] for name in df.columns if labels[name] != name})
+
+class Pipeline:
+    def __init__(self, cache_dir=None):
+        self.stages = {}
+        self.cache_dir = cache_dir
+        self.last_run = None
+
+    def add(self, name, func, inputs=(), files=(), version=1, modules=()):
+        # stages are added after the stages they read, so the order of addition is a valid run order
+        unknown = [input_name for input_name in inputs if input_name not in self.stages]
+        if unknown:
+            raise KeyError("Stage {} reads unknown stages {}".format(name, unknown))
+        self.stages[name] = Stage(name, func, list(inputs), list(files), version, list(modules))
+        return self.stages[name]
+
+    def upstream(self, targets, skip=()):
+        # the targets and every stage they depend on, in run order; nothing above a skipped stage is needed
+        needed, pending = set(), list(targets)
+        while pending:
+            name = pending.pop()
+            if name in needed:
+                continue
+            if name not in self.stages:
+                raise KeyError("Unknown stage {}".format(name))
+            needed.add(name)
+            if name not in skip:
+                pending.extend(self.stages[name].inputs)
+        return [name for name in self.stages if name in needed]
+
+    def missing_files(self, name):
+        return [file for file in self.stages[name].files if not os.path.exists(_file_path(file))]
+
+    def keys(self, names, skip=()):
+        # content keys of the stages (given in run order); a skipped stage keeps the key of its last output,
+        # a stage with a missing input file (or downstream of one) has no key (None)
+        keys = {}
+        for name in names:
+            stage = self.stages[name]
+            if name in skip:
+                meta = cache.current_meta(CACHE_NAMESPACE, name, self.cache_dir)
+                if meta is None:
+                    raise KeyError("Stage {} cannot be skipped, it has never been run".format(name))
+                keys[name] = meta['key']
+                continue
+            if self.missing_files(name) or any(keys[input_name] is None for input_name in stage.inputs):
+                keys[name] = None
+                continue
+            digests = [cache.file_digest(_file_path(file), self.cache_dir) for file in stage.files]
+            keys[name] = cache.cache_key(name, stage.version, code_digest(stage.func, stage.modules), *digests,
+                                         *[keys[input_name] for input_name in stage.inputs])
+        return keys
+
+    def status(self, targets=None, skip=()):
+        names = self.upstream(list(self.stages) if targets is None else targets, skip)
+        keys = self.keys(names, skip)
+        return pd.DataFrame({
+            'key': [(keys[name] or '')[:16] for name in names],
+            'up_to_date': [keys[name] is not None and cache.has_entry(CACHE_NAMESPACE, name, keys[name], cache_dir=self.cache_dir)
+                           for name in names],
+            'skipped': [name in skip for name in names],
+            'missing_files': [[] if name in skip else self.missing_files(name) for name in names],
+        }, index=pd.Index(names, name='stage'))
+
+    def _to_run(self, names, keys, force, skip):
+        return [name for name in names if name not in skip and (name in force or keys[name] is None or
+                not cache.has_entry(CACHE_NAMESPACE, name, keys[name], cache_dir=self.cache_dir))]
+
+    def run(self, targets=None, force=(), skip=(), verbose=False):
+        # returns {target: frame}; force is a list of stage names (or True for all), skip a list of stage names
+        targets = list(self.stages) if targets is None else list(targets)
+        skip = set(skip)
+        force = (set(self.stages) if force is True else set(force)) - skip
+        names = self.upstream(targets, skip)
+        keys = self.keys(names, skip)
+        to_run = self._to_run(names, keys, force, skip)
+        # only the stages that have to run need their files: fetch the missing or changed ones, then key them again
+        for file in sorted({file for name in to_run for file in self.stages[name].files if file in assets.REGISTRY}):
+            assets.ensure(file)
+        missing = {name: self.missing_files(name) for name in to_run if self.missing_files(name)}
+        if missing:
+            raise FileNotFoundError("Input files of stages are missing: {}".format(missing))
+        keys = self.keys(names, skip)
+        to_run = self._to_run(names, keys, force, skip)
+        readers = {name: 0 for name in names}
+        for name in to_run:
+            for input_name in self.stages[name].inputs:
+                readers[input_name] += 1
+        outputs, report = {}, []
+        for name in names:
+            started = time.perf_counter()
+            if name in to_run:
+                stage = self.stages[name]
+                with instrument.stage(name, inputs=[outputs[input_name] for input_name in stage.inputs]) as current:
+                    outputs[name] = current.output(stage.func(*[outputs[input_name] for input_name in stage.inputs]))
+                save_frame(name, keys[name], outputs[name], self.cache_dir)
+                status = 'forced' if name in force else 'ran'
+                for input_name in stage.inputs:
+                    readers[input_name] -= 1
+                    if readers[input_name] == 0 and input_name not in targets:
+                        del outputs[input_name]
+            elif readers[name] or name in targets:
+                outputs[name] = load_frame(name, keys[name], self.cache_dir)
+                status = 'skipped' if name in skip else 'loaded'
+            else:
+                status = 'skipped' if name in skip else 'up to date'
+            report.append({'stage': name, 'status': status, 'key': keys[name][:16], 'seconds': time.perf_counter() - started,
+                           'rows': len(outputs[name]) if name in outputs else None})
+            if verbose:
+                print("{:<20}{:<12}{:>8.2f}s".format(name, status, report[-1]['seconds']), flush=True)
+        self.last_run = pd.DataFrame(report).set_index('stage')
+        return {name: outputs[name] for name in targets}
+
+# the cleaning graph
+
+COMPLETENESS_THRESHOLD = 0.9
+ECONOMIC_LAG = 3
+
+def _olympiads(years):
+    file_paths = [assets.path('olympiad_{}'.format(year)) for year in years]
+    return olympiads.merge_federations(olympiads.load_olympiads(file_paths, years))
+
+def _rated_players(years):
+    file_paths = [assets.path('fide_{}'.format(year)) for year in years]
+    return fide_lists.ingest_fide_lists(file_paths, years)
+
+def _olympiad_players(olympiad_df, rated_df):
+    return olympiad_df.join(linker.link_players(olympiad_df, rated_df))
+
+def _world_bank(years, threshold):
+    # the export restricted to the indicators with data for more than `threshold` of the (country, year) cells
+    df = world_bank.read_world_bank(assets.path('world_bank'))
+    completeness = world_bank.indicator_completeness(world_bank.to_panel(df), years)
+    df = df[df['Series Name'].isin(completeness.index[completeness['Percentage_With_Data'] > threshold])].reset_index(drop=True)
+    for name in world_bank.KEY_COLUMNS:
+        df[name] = df[name].cat.remove_unused_categories()
+    return df
+
+def _country_codes(olympiad_df):
+    return country_codes.country_codes_table(olympiad_df['federation'])
+
+def _economic_features(world_bank_df, country_codes_df, years, lag):
+    return world_bank.federation_year_features(world_bank.to_panel(world_bank_df), country_codes_df, years, lag=lag)
+
+def _capitals(country_codes_df):
+    capitals_df = pd.read_csv(assets.path('capitals'))
+    country_codes_df = country_codes_df.copy()
+    country_codes_df['federation_lat_long'] = country_codes.capital_names(country_codes_df['fide_code'], capitals_df['Country'])
+    return country_codes_df
+
+def cleaning_pipeline(olympiad_years=None, fide_years=None, cache_dir=None):
+    olympiad_years = sorted(assets.OLYMPIADS if olympiad_years is None else olympiad_years)
+    fide_years = sorted(assets.FIDE_LIST_YEARS if fide_years is None else fide_years)
+    # the economic data of every Olympiad is that of ECONOMIC_LAG years earlier (2007 for 2010, ...)
+    data_years = list(range(olympiad_years[0] - ECONOMIC_LAG, olympiad_years[-1] - ECONOMIC_LAG + 1, 2))
+    pipeline = Pipeline(cache_dir)
+    pipeline.add('olympiads', partial(_olympiads, olympiad_years),
+                 files=['olympiad_{}'.format(year) for year in olympiad_years], modules=[olympiads])
+    pipeline.add('rated_players', partial(_rated_players, fide_years),
+                 files=['fide_{}'.format(year) for year in fide_years], modules=[fide_lists])
+    pipeline.add('olympiad_players', _olympiad_players, inputs=['olympiads', 'rated_players'], modules=[linker])
+    pipeline.add('world_bank', partial(_world_bank, data_years, COMPLETENESS_THRESHOLD),
+                 files=['world_bank'], version=(data_years, COMPLETENESS_THRESHOLD), modules=[world_bank])
+    pipeline.add('country_codes', _country_codes, inputs=['olympiads'], files=['country_codes'], modules=[country_codes, matching])
+    pipeline.add('economic_features', partial(_economic_features, years=olympiad_years, lag=ECONOMIC_LAG),
+                 inputs=['world_bank', 'country_codes'], version=(olympiad_years, ECONOMIC_LAG), modules=[world_bank])
+    pipeline.add('capitals', _capitals, inputs=['country_codes'], files=['capitals', 'country_codes'],
+                 modules=[country_codes, matching])
+    return pipeline
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('targets', nargs='*', help='stages to bring up to date (default: all)')
+    parser.add_argument('--force', nargs='+', default=[], help='stages to recompute even if they are up to date')
+    parser.add_argument('--force-all', action='store_true')
+    parser.add_argument('--skip', nargs='+', default=[], help='stages to take from their last run even if an input changed')
+    parser.add_argument('--status', action='store_true', help='only print which stages are up to date')
+    args = parser.parse_args(argv)
+    pipeline = cleaning_pipeline()
+    targets = args.targets or None
+    if args.status:
+        print(pipeline.status(targets, args.skip).to_string())
+        return
+    pipeline.run(targets, force=True if args.force_all else args.force, skip=args.skip, verbose=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# A dense player x rating-list matrix built from the FIDE ingestion output (fide_lists.ingest_fide_lists).
+# Rows are players in sorted fide_id order, so finding a player is a binary search, and columns are
+# rating lists in date order. Ratings are int16 with MISSING where a player is absent from a list.
+
+MISSING = -1
+
+def to_months(values):
+    # years (2014), strings ('2014-01') or datetimes, as numpy month datetimes; a bare year means its January list
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return ((values.astype(np.int64) - 1970) * 12).astype('datetime64[M]')
+    return values.astype('datetime64[M]')
+
+class PlayerRatingStore:
+    def __init__(self, fide_ids, list_dates, ratings):
+        self.fide_ids = fide_ids # (players,) sorted, unique
+        self.list_dates = list_dates # (lists,) datetime64[M], sorted
+        self.ratings = ratings # (players, lists) int16
+
+    @classmethod
+    def from_frame(cls, df, date_column='year'):
+        # df needs fide_id, rating and a list date column (a year for the January lists)
+        fide_ids, rows = np.unique(df['fide_id'].to_numpy(), return_inverse=True)
+        list_dates, cols = np.unique(to_months(df[date_column].to_numpy()), return_inverse=True)
+        ratings = np.full((len(fide_ids), len(list_dates)), MISSING, dtype=np.int16)
+        ratings[rows.ravel(), cols.ravel()] = df['rating'].to_numpy()
+        return cls(fide_ids, list_dates, ratings)
+
+    def __len__(self):
+        return len(self.fide_ids)
+
+    def rows(self, fide_ids):
+        # row of every id, -1 for players the store does not know
+        fide_ids = np.asarray(fide_ids)
+        rows = np.searchsorted(self.fide_ids, fide_ids)
+        rows = np.minimum(rows, len(self.fide_ids) - 1)
+        return np.where(self.fide_ids[rows] == fide_ids, rows, -1)
+
+    def history(self, fide_id):
+        # one player's rating in every list, NaN where they were not listed
+        row = self.rows([fide_id])[0]
+        if row < 0:
+            raise KeyError("Unknown fide_id {}".format(fide_id))
+        ratings = self.ratings[row].astype(float)
+        ratings[ratings == MISSING] = np.nan
+        return pd.Series(ratings, index=pd.PeriodIndex(self.list_dates, freq='M'), name=fide_id)
+
+    def ratings_as_of(self, fide_ids, dates, carry_forward=True):
+        # rating in the latest list published on or before each date (dates broadcast against fide_ids);
+        # with carry_forward a player missing from that list keeps their last earlier rating
+        fide_ids = np.asarray(fide_ids)
+        rows = self.rows(fide_ids)
+        cols = np.searchsorted(self.list_dates, np.broadcast_to(to_months(dates), fide_ids.shape), side='right') - 1
+        block = self.ratings[np.maximum(rows, 0)]
+        if carry_forward:
+            listed = np.where(block != MISSING, np.arange(block.shape[1]), -1)
+            cols = np.where(cols >= 0, np.maximum.accumulate(listed, axis=1)[np.arange(len(rows)), np.maximum(cols, 0)], -1)
+        result = block[np.arange(len(rows)), np.maximum(cols, 0)].astype(float)
+        result[(rows < 0) | (cols < 0) | (result == MISSING)] = np.nan
+        return result
+
+    def rating_delta(self, fide_ids, dates, months=12, carry_forward=True):
+        # change in rating over the `months` before each date, e.g. the year before an Olympiad
+        dates = to_months(dates)
+        before = self.ratings_as_of(fide_ids, dates - np.timedelta64(months, 'M'), carry_forward)
+        return self.ratings_as_of(fide_ids, dates, carry_forward) - before
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'fide_ids.npy'), self.fide_ids)
+        np.save(os.path.join(directory, 'list_dates.npy'), self.list_dates.astype(np.int64))
+        np.save(os.path.join(directory, 'ratings.npy'), self.ratings)
+        with open(os.path.join(directory, 'meta.json'), 'w') as file:
+            json.dump({'players': len(self.fide_ids), 'lists': len(self.list_dates)}, file)
+        return directory
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        # the rating matrix is memory-mapped, so only the rows a query touches are read from disk
+        mmap_mode = 'r' if mmap else None
+        fide_ids = np.load(os.path.join(directory, 'fide_ids.npy'))
+        list_dates = np.load(os.path.join(directory, 'list_dates.npy')).astype('datetime64[M]')
+        ratings = np.load(os.path.join(directory, 'ratings.npy'), mmap_mode=mmap_mode)
+        return cls(fide_ids, list_dates, ratings)
@@ -0,0 +1,105 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Bootstrap and permutation inference for small OLS models on the federation x Olympiad table, e.g.
+# discrepancy_per_game ~ GDP per capita + culture + GDP x culture over ~150 federations per Olympiad.
+# Resamples are drawn as (batch, rows) index matrices and a whole batch is fitted at once by solving the
+# stacked normal equations X'X b = X'y, so thousands of fits are a few einsums and one batched solve.
+# Batches are spread over a process pool; every batch has its own seed spawned from one SeedSequence,
+# so the results only depend on `seed` and `batch_size`, not on the number of workers.
+# Permutation p-values follow Freedman & Lane: for each slope the residuals of the model without it are
+# permuted, so every p-value tests its own coefficient with the other terms in the model.
+
+DEFAULT_RESAMPLES = 10_000
+BATCH_SIZE = 1_000
+
+def feature_table(federation_scores, economic_features, culture=None, culture_metrics=('top10_mean',)):
+    # federation_scores (elo.federation_scores) with the economic features (world_bank.federation_year_features)
+    # and culture metrics (a CultureCube) of the federation in the Olympiad year, all keyed by (federation, year)
+    df = federation_scores.join(economic_features.rename_axis(['federation', 'year']))
+    if culture is not None:
+        df = df.join(culture.frame(metrics=list(culture_metrics)), on=['federation', 'year'])
+    return df
+
+def design_matrix(df, response, terms, interactions=(), constant=True):
+    # (y, X, names) from the complete rows of df; interactions are pairs of terms whose product is added
+    columns = list(terms) + [column for pair in interactions for column in pair]
+    data = df[[response] + list(dict.fromkeys(columns))].astype(np.float64).dropna()
+    features = [data[term].to_numpy() for term in terms] + [data[a].to_numpy() * data[b].to_numpy() for a, b in interactions]
+    names = list(terms) + ['{}:{}'.format(a, b) for a, b in interactions]
+    if constant:
+        features.insert(0, np.ones(len(data)))
+        names.insert(0, 'const')
+    return data[response].to_numpy(), np.column_stack(features), names
+
+def ols(X, y):
+    return np.linalg.lstsq(X, y, rcond=None)[0]
+
+def fit_batch(X, y, rows=None, y_rows=None):
+    # coefficients of one OLS fit per resample, (batch, features): rows (batch, n) resamples the rows of X and y
+    # together, y_rows (batch, n) only reorders y
+    if rows is not None:
+        Xb = X[rows]
+        XtX = np.einsum('bnp,bnq->bpq', Xb, Xb)
+        Xty = np.einsum('bnp,bn->bp', Xb, y[rows])
+    else:
+        # X stays put when only y is shuffled, so the whole batch shares X'X
+        XtX = np.broadcast_to(X.T @ X, (len(y_rows),) + (X.shape[1],) * 2)
+        Xty = y[y_rows] @ X
+    try:
+        return np.linalg.solve(XtX, Xty[:, :, None])[:, :, 0]
+    except np.linalg.LinAlgError:
+        # a resample without variation in some feature; the pseudo-inverse gives its minimum-norm fit
+        return np.einsum('bpq,bq->bp', np.linalg.pinv(XtX), Xty)
+
+def _resample_task(task):
+    X, y, method, seed, size = task
+    rng = np.random.default_rng(seed)
+    n = len(y)
+    if method == 'bootstrap':
+        return fit_batch(X, y, rows=rng.integers(n, size=(size, n)))
+    return fit_batch(X, y, y_rows=rng.permuted(np.broadcast_to(np.arange(n), (size, n)), axis=1))
+
+def resample(X, y, method='bootstrap', n_resamples=DEFAULT_RESAMPLES, seed=0, batch_size=BATCH_SIZE, max_workers=None):
+    # (n_resamples, features) coefficients of bootstrap ('bootstrap') or response-permutation ('permutation') fits;
+    # a plain permutation of y is the global null of no term mattering, so its coefficients are not per-term tests;
+    # seed is an int or a SeedSequence; max_workers=1 fits every batch in this process
+    if method not in ('bootstrap', 'permutation'):
+        raise ValueError("Unknown resampling method '{}'".format(method))
+    sizes = [min(batch_size, n_resamples - start) for start in range(0, n_resamples, batch_size)]
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    seeds = seed.spawn(len(sizes))
+    tasks = [(X, y, method, batch_seed, size) for batch_seed, size in zip(seeds, sizes)]
+    if max_workers == 1 or len(tasks) <= 1:
+        results = [_resample_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_resample_task, tasks))
+    return np.concatenate(results) if results else np.empty((0, X.shape[1]))
+
+def resampling_study(df, response, terms, interactions=(), n_resamples=DEFAULT_RESAMPLES, seed=0, alpha=0.05,
+                     batch_size=BATCH_SIZE, max_workers=None):
+    # per coefficient: the OLS estimate, its bootstrap standard error and percentile interval, and the
+    # Freedman-Lane permutation p-value of |coefficient| (NaN for the intercept, which it does not test)
+    y, X, names = design_matrix(df, response, terms, interactions)
+    estimate = ols(X, y)
+    bootstrap_seed, permutation_seed = np.random.SeedSequence(seed).spawn(2)
+    boot = resample(X, y, 'bootstrap', n_resamples, bootstrap_seed, batch_size, max_workers)
+    permutation_p = np.full(len(names), np.nan)
+    for j, term_seed in enumerate(permutation_seed.spawn(len(names))):
+        if names[j] == 'const':
+            continue
+        # the fit is linear in y and the reduced model's fitted values lie in the span of X, so refitting
+        # fitted + permuted residuals moves coefficient j by exactly the fit of the permuted residuals
+        reduced = np.delete(X, j, axis=1)
+        residuals = y - reduced @ ols(reduced, y)
+        perm = resample(X, residuals, 'permutation', n_resamples, term_seed, batch_size, max_workers)[:, j]
+        permutation_p[j] = ((np.abs(perm) >= np.abs(estimate[j]) - 1e-12).sum() + 1) / (len(perm) + 1)
+    return pd.DataFrame({
+        'estimate': estimate,
+        'bootstrap_se': boot.std(axis=0, ddof=1),
+        'ci_low': np.quantile(boot, alpha / 2, axis=0),
+        'ci_high': np.quantile(boot, 1 - alpha / 2, axis=0),
+        'permutation_p': permutation_p,
+    }, index=pd.Index(names, name='term')).assign(rows=len(y))
@@ -0,0 +1,105 @@
+import re
+import csv
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+# World Development Indicators exports are wide: one row per (country, series) and one column per year,
+# labelled '2007 [YR2007]', with '..' for missing values and a few footer lines at the end.
+# read_world_bank parses '..' as NaN and the years as float32 straight away; to_panel reshapes the result
+# once into a country x indicator x year array, which the completeness check and the joins work on.
+
+KEY_COLUMNS = ['Country Name', 'Country Code', 'Series Name', 'Series Code']
+YEAR_COLUMN = re.compile(r'^(\d{4}) \[YR\d{4}\]$')
+MISSING_VALUE = '..'
+
+# values: float32 (countries, indicators, years), NaN where missing; present: (countries, indicators) rows in the file
+Panel = namedtuple('Panel', ['values', 'present', 'countries', 'country_names', 'indicators', 'indicator_names', 'years'])
+
+def year_columns(file_path):
+    # {column label: year} for every year column of the export
+    with open(file_path, 'r', newline='', encoding='utf-8-sig') as file:
+        header = next(csv.reader(file))
+    return {label: int(YEAR_COLUMN.match(label).group(1)) for label in header if YEAR_COLUMN.match(label)}
+
+def read_world_bank(file_path):
+    # the wide export with float32 years and categorical keys; footer lines (no series code) are dropped
+    years = year_columns(file_path)
+    dtypes = dict({label: np.float32 for label in years}, **{name: 'category' for name in KEY_COLUMNS})
+    df = pd.read_csv(file_path, na_values=[MISSING_VALUE, ''], keep_default_na=False, dtype=dtypes, encoding='utf-8-sig')
+    df = df[df['Series Code'].notna()].reset_index(drop=True)
+    for name in KEY_COLUMNS:
+        df[name] = df[name].cat.remove_unused_categories().cat.rename_categories(lambda value: value.strip())
+    return df
+
+def to_panel(df):
+    years = [(label, int(YEAR_COLUMN.match(label).group(1))) for label in df.columns if YEAR_COLUMN.match(str(label))]
+    countries = df['Country Code'].cat.codes.to_numpy()
+    indicators = df['Series Code'].cat.codes.to_numpy()
+    n_countries, n_indicators = len(df['Country Code'].cat.categories), len(df['Series Code'].cat.categories)
+    values = np.full((n_countries, n_indicators, len(years)), np.nan, dtype=np.float32)
+    values[countries, indicators] = df[[label for label, _ in years]].to_numpy(dtype=np.float32)
+    present = np.zeros((n_countries, n_indicators), dtype=bool)
+    present[countries, indicators] = True
+    country_names = pd.Series(df['Country Name'].astype(str).to_numpy(), index=countries).groupby(level=0).first()
+    indicator_names = pd.Series(df['Series Name'].astype(str).to_numpy(), index=indicators).groupby(level=0).first()
+    return Panel(values, present,
+                 pd.Index(df['Country Code'].cat.categories, name='country_code'),
+                 pd.Index(country_names.reindex(range(n_countries)).to_numpy(), name='country_name'),
+                 pd.Index(df['Series Code'].cat.categories, name='series_code'),
+                 pd.Index(indicator_names.reindex(range(n_indicators)).to_numpy(), name='series_name'),
+                 pd.Index([year for _, year in years], name='year'))
+
+def indicator_completeness(panel, years=None):
+    # share of (country, year) cells with data per indicator, over the countries the indicator has rows for
+    year_index = slice(None) if years is None else panel.years.get_indexer(years)
+    available = np.isfinite(panel.values[:, :, year_index]).sum(axis=(0, 2))
+    n_years = len(panel.years) if years is None else len(years)
+    countries = panel.present.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = available / n_years / countries
+    return pd.DataFrame({'Series Code': panel.indicators, 'Countries': countries, 'Percentage_With_Data': share},
+                        index=pd.Index(panel.indicator_names, name='Series Name'))
+
+def select_indicators(panel, series_names):
+    # the panel restricted to some indicators, given by name
+    keep = np.flatnonzero(panel.indicator_names.isin(series_names))
+    return panel._replace(values=panel.values[:, keep], present=panel.present[:, keep],
+                          indicators=panel.indicators[keep], indicator_names=panel.indicator_names[keep])
+
+def long_format(panel, dropna=True):
+    # one row per (country_code, series_code, year) with categorical keys and float32 values
+    country, indicator, year = np.indices(panel.values.shape).reshape(3, -1)
+    values = panel.values.reshape(-1)
+    if dropna:
+        keep = np.isfinite(values)
+        country, indicator, year, values = country[keep], indicator[keep], year[keep], values[keep]
+    return pd.DataFrame({
+        'country_code': pd.Categorical.from_codes(country, panel.countries),
+        'series_code': pd.Categorical.from_codes(indicator, panel.indicators),
+        'year': panel.years.to_numpy().astype(np.int16)[year],
+        'value': values,
+    })
+
+def federation_year_features(panel, country_codes, years, lag=3, max_fallback=None):
+    # indicator values for every (fide_code, year): each Olympiad year is linked to the data of year - lag,
+    # or of the nearest earlier year with data (at most max_fallback years earlier) through an as-of merge
+    # country_codes maps fide_code to the World Bank country_code; returns one column per series_code
+    keys = country_codes[['fide_code', 'country_code']].dropna().drop_duplicates('fide_code').astype(str)
+    grid = pd.MultiIndex.from_product([range(len(keys)), list(years), panel.indicators.astype(str)],
+                                      names=['key', 'year', 'series_code']).to_frame(index=False)
+    grid['fide_code'] = keys['fide_code'].to_numpy()[grid['key']]
+    grid['country_code'] = keys['country_code'].to_numpy()[grid['key']]
+    grid['data_year'] = (grid['year'] - lag).astype(np.int64)
+    data = long_format(panel).rename(columns={'year': 'data_year'})
+    data = data.astype({'country_code': str, 'series_code': str, 'data_year': np.int64})
+    merged = pd.merge_asof(grid.sort_values('data_year'), data.sort_values('data_year'), on='data_year',
+                           by=['country_code', 'series_code'], direction='backward', tolerance=max_fallback)
+    features = merged.pivot_table(index=['fide_code', 'year'], columns='series_code', values='value', aggfunc='first', dropna=False)
+    features = features.reindex(columns=panel.indicators.astype(str)).astype(np.float32)
+    features.columns.name = None
+    return features
+
+def join_features(df, features, federation_column='federation', year_column='year'):
+    # df with the federation-year features of every row appended
+    return df.join(features, on=[federation_column, year_column])
@@ -0,0 +1,143 @@
+import os
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import download_assets
+
+class Resource:
+    # what the stand-in server serves: one file, its ETag, and the requests it saw
+    def __init__(self, body, etag):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+        self.gzip = None # 'negotiate': gzip when the client accepts it, 'always': whatever the client asks for
+
+def _handler(resource):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            resource.requests.append(dict(self.headers))
+            accepts_gzip = 'gzip' in self.headers.get("Accept-Encoding", "")
+            if resource.gzip == 'always' or (resource.gzip == 'negotiate' and accepts_gzip):
+                encoded = gzip.compress(resource.body)
+                self.send_response(200)
+                self.send_header("Content-Encoding", "gzip")
+                self.send_header("ETag", resource.etag)
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+                return
+            body, start = resource.body, 0
+            range_header = self.headers.get("Range")
+            if_range = self.headers.get("If-Range")
+            if range_header and (if_range is None or if_range == resource.etag):
+                start = int(range_header.split("=")[1].rstrip("-"))
+                if start >= len(body):
+                    self.send_response(416)
+                    self.send_header("Content-Range", "bytes */{}".format(len(body)))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", "bytes {}-{}/{}".format(start, len(body) - 1, len(body)))
+            else:
+                self.send_response(200)
+            self.send_header("ETag", resource.etag)
+            self.send_header("Content-Length", str(len(body) - start))
+            self.end_headers()
+            self.wfile.write(body[start:])
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+@pytest.fixture
+def server():
+    resource = Resource(b"".join(b"line %06d\n" % i for i in range(20000)), '"v1"')
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _handler(resource))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    resource.url = "http://127.0.0.1:{}/asset.txt".format(httpd.server_address[1])
+    yield resource
+    httpd.shutdown()
+    httpd.server_close()
+
+def _partial(file_path, data, validator=None):
+    with open(file_path + ".part", "wb") as file:
+        file.write(data)
+    if validator is not None:
+        with open(file_path + ".part.validator", "w") as file:
+            file.write(validator)
+
+def _read(file_path):
+    with open(file_path, "rb") as file:
+        return file.read()
+
+def test_fetch_downloads_whole_file(server, tmp_path):
+    file_path = str(tmp_path / "asset.txt")
+    download_assets.fetch(download_assets.make_session(), server.url, file_path, show_progress=False)
+    assert _read(file_path) == server.body
+    assert not os.path.exists(file_path + ".part")
+    assert not os.path.exists(file_path + ".part.validator")
+
+def test_fetch_resumes_unchanged_file(server, tmp_path):
+    file_path = str(tmp_path / "asset.txt")
+    _partial(file_path, server.body[:1000], server.etag)
+    download_assets.fetch(download_assets.make_session(), server.url, file_path, show_progress=False)
+    assert _read(file_path) == server.body
+    assert server.requests[0]["Range"] == "bytes=1000-"
+    assert server.requests[0]["If-Range"] == server.etag
+
+def test_fetch_restarts_when_file_changed_upstream(server, tmp_path):
+    file_path = str(tmp_path / "asset.txt")
+    _partial(file_path, b"x" * 1000, '"v0"')
+    download_assets.fetch(download_assets.make_session(), server.url, file_path, show_progress=False)
+    assert _read(file_path) == server.body
+
+def test_fetch_restarts_without_validator(server, tmp_path):
+    file_path = str(tmp_path / "asset.txt")
+    _partial(file_path, b"x" * 1000)
+    download_assets.fetch(download_assets.make_session(), server.url, file_path, show_progress=False)
+    assert _read(file_path) == server.body
+    assert "Range" not in server.requests[0]
+
+def test_fetch_restarts_after_416(server, tmp_path):
+    file_path = str(tmp_path / "asset.txt")
+    _partial(file_path, server.body + b"tail", server.etag)
+    download_assets.fetch(download_assets.make_session(), server.url, file_path, show_progress=False)
+    assert _read(file_path) == server.body
+    assert len(server.requests) == 2
+    assert "Range" not in server.requests[1]
+
+def test_fetch_asks_for_identity_encoding(server, tmp_path):
+    server.gzip = 'negotiate'
+    file_path = str(tmp_path / "asset.txt")
+    _partial(file_path, server.body[:1000], server.etag)
+    download_assets.fetch(download_assets.make_session(), server.url, file_path, show_progress=False)
+    assert _read(file_path) == server.body
+    assert server.requests[0]["Accept-Encoding"] == "identity"
+    assert server.requests[0]["Range"] == "bytes=1000-"
+
+def test_fetch_accepts_gzip_it_did_not_ask_for(server, tmp_path):
+    server.gzip = 'always'
+    file_path = str(tmp_path / "asset.txt")
+    _partial(file_path, server.body[:1000], server.etag)
+    download_assets.fetch(download_assets.make_session(), server.url, file_path, show_progress=False)
+    assert _read(file_path) == server.body
+    assert not os.path.exists(file_path + ".part.validator")
+
+def test_manifest_skips_verified_and_refetches_changed(server, tmp_path):
+    folder, manifest_file = str(tmp_path), str(tmp_path / "manifest.json")
+    file_path = download_assets.download_file(server.url, folder, "asset.txt", manifest_file=manifest_file)
+    entry = download_assets.load_manifest(manifest_file)["asset.txt"]
+    assert entry["sha256"] == download_assets.file_sha256(file_path)
+    download_assets.download_file(server.url, folder, "asset.txt", manifest_file=manifest_file)
+    assert len(server.requests) == 1
+    # same size, different bytes: only the hash can tell
+    with open(file_path, "r+b") as file:
+        file.write(b"X")
+    assert not download_assets.verify_asset(file_path, manifest_file)
+    download_assets.download_file(server.url, folder, "asset.txt", manifest_file=manifest_file)
+    assert len(server.requests) == 2
+    assert _read(file_path) == server.body
+    assert download_assets.verify_asset(file_path, manifest_file)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+import fide_lists
+from benchmarks import generators
+
+LAYOUTS = list(generators.FIDE_LAYOUTS)
+
+@pytest.fixture(scope='module')
+def lists(tmp_path_factory):
+    # one synthetic list per header layout
+    directory = tmp_path_factory.mktemp('fide')
+    return {layout: generators.write_fide_list(str(directory / '{}.txt'.format(layout)), 250, layout, seed=3)
+            for layout in LAYOUTS}
+
+def _read_fwf(file_path):
+    # the same list read by pandas, with the column boundaries of the parsed header
+    layout = fide_lists.read_header(file_path)
+    colspecs = [(start, end if end is not None else 1000) for _, start, end in layout]
+    df = pd.read_fwf(file_path, colspecs=colspecs, names=[name for name, _, _ in layout], skiprows=1,
+                     encoding=fide_lists.ENCODING, dtype=str)
+    for name in df.columns:
+        if name in fide_lists.NUMERIC_COLUMNS:
+            df[name] = pd.to_numeric(df[name]).fillna(fide_lists.MISSING).astype(np.int64)
+    return df
+
+@pytest.mark.parametrize('layout', LAYOUTS)
+def test_detects_the_schema_of_every_layout(lists, layout):
+    schema = fide_lists.schema_for_file(lists[layout])
+    assert schema.name == layout
+    # another rating period is the same format
+    other_period = generators.FIDE_LAYOUTS[layout].format(period='FEB19')
+    assert fide_lists.detect_schema(other_period) is schema
+    assert set(fide_lists.REQUIRED_COLUMNS) <= {name for name, _, _ in schema.columns}
+
+def test_rejects_a_header_without_the_required_columns():
+    with pytest.raises(ValueError, match='missing'):
+        fide_lists.detect_schema("ID Number      Name                      Sex  Gms")
+
+@pytest.mark.parametrize('layout', LAYOUTS)
+def test_read_fide_list_matches_read_fwf(lists, layout):
+    df = fide_lists.read_fide_list(lists[layout])
+    assert len(df) == 250
+    pd.testing.assert_frame_equal(df, _read_fwf(lists[layout]), check_dtype=False)
+
+@pytest.mark.parametrize('layout', LAYOUTS)
+@pytest.mark.parametrize('chunk_rows', [1, 7, 1000])
+def test_iter_fide_list_chunks_add_up_to_the_list(lists, layout, chunk_rows):
+    columns = ['fide_id', 'name', 'federation', 'rating']
+    chunks = list(fide_lists.iter_fide_list(lists[layout], columns, chunk_rows=chunk_rows))
+    assert all(len(chunk['fide_id']) > 0 for chunk in chunks)
+    joined = pd.concat([pd.DataFrame(chunk, columns=columns) for chunk in chunks], ignore_index=True)
+    pd.testing.assert_frame_equal(joined, fide_lists.read_fide_list(lists[layout], columns))
+
+def test_iter_fide_list_keeps_a_last_line_without_newline(lists, tmp_path):
+    with open(lists['standard'], 'rb') as file:
+        content = file.read()
+    file_path = tmp_path / 'unterminated.txt'
+    file_path.write_bytes(content.rstrip(b'\n'))
+    ids = np.concatenate([chunk['fide_id'] for chunk in fide_lists.iter_fide_list(str(file_path), ['fide_id'], chunk_rows=10)])
+    np.testing.assert_array_equal(ids, fide_lists.read_fide_list(lists['standard'], ['fide_id'])['fide_id'])
+
+@pytest.mark.parametrize('layout', LAYOUTS)
+def test_normalise_list_compacts_and_drops_unrated_rows(lists, layout, tmp_path):
+    # blank the rating of the first player
+    rating = {name: (start, end) for name, start, end in fide_lists.read_header(lists[layout])}['rating']
+    with open(lists[layout], 'rb') as file:
+        lines = file.read().split(b'\n')
+    first = bytearray(lines[1])
+    first[rating[0]:rating[1]] = b' ' * (rating[1] - rating[0])
+    lines[1] = bytes(first)
+    file_path = tmp_path / 'unrated.txt'
+    file_path.write_bytes(b'\n'.join(lines))
+
+    raw = fide_lists.read_fide_list(str(file_path), fide_lists.INGEST_COLUMNS, as_frame=False)
+    assert raw['rating'][0] == fide_lists.MISSING
+    result = fide_lists.normalise_list(raw, 2013)
+    assert len(result['fide_id']) == len(raw['fide_id']) - 1
+    for name in ['fide_id', 'rating', 'year']:
+        assert result[name].dtype == fide_lists.COMPACT_DTYPES[name]
+    assert (result['year'] == 2013).all()
+    for name in ['name', 'title', 'federation']:
+        assert isinstance(result[name], pd.Categorical)
+    assert list(result['title'].categories) == fide_lists.TITLE_CATEGORIES
+    assert set(result['title'].dropna()) <= set(fide_lists.TITLE_CATEGORIES)
+    federations = set(result['federation'])
+    assert not federations & set(fide_lists.FEDERATION_REMAP)
+    assert {'GBR', 'CAR'} <= federations
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+import linker
+
+@pytest.fixture
+def rated():
+    return pd.DataFrame({
+        'fide_id': [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11],
+        'name': ['Ivanchuk, Vassily', 'Yakovenko, Dmitry', 'Kramnik, Vladimir', 'Carlsen, Magnus', 'Hammer, Jon Ludvig',
+                 'Adams, Michael', 'Short, Nigel', 'Chow, Kevin', 'Jakovenko, Dmitry', 'Mamedov, Rauf', 'Mamedov, Rauf'],
+        'federation': pd.Categorical(['UKR', 'RUS', 'RUS', 'NOR', 'NOR', 'ENG', 'ENG', 'TRI', 'RUS', 'AZE', 'AZE']),
+        'year': [2010] * 8 + [2012, 2010, 2010],
+    })
+
+@pytest.fixture
+def olympiad():
+    return pd.DataFrame({
+        'name': ['Ivanchuk Vassily', 'Jakovenko, Dmitry', 'Carlsen, Magnus', 'Carlsen, Magnus A.', 'Nobody, Someone',
+                 'Chow, Kevin', 'Smith, John', 'Mamedov, Rauf'],
+        'federation': pd.Categorical(['UKR', 'RUS', 'NOR', 'NOR', 'ENG', 'TTO', 'FRA', 'AZE']),
+        'year': [2010] * 8,
+    }, index=['exact', 'fuzzy', 'claim_1', 'claim_2', 'unknown', 'alias', 'no_block', 'homonym'])
+
+def test_link_players_statuses(olympiad, rated):
+    links = linker.link_players(olympiad, rated)
+    assert links.index.equals(olympiad.index)
+    assert links['status'].to_dict() == {
+        'exact': 'matched', 'fuzzy': 'matched', 'claim_1': 'ambiguous', 'claim_2': 'ambiguous', 'unknown': 'unmatched',
+        'alias': 'matched', 'no_block': 'unmatched', 'homonym': 'ambiguous',
+    }
+    assert links['fide_id'].to_dict() == {
+        'exact': 1, 'fuzzy': 2, 'claim_1': -1, 'claim_2': -1, 'unknown': -1, 'alias': 8, 'no_block': -1, 'homonym': -1,
+    }
+
+def test_link_players_scores(olympiad, rated):
+    links = linker.link_players(olympiad, rated)
+    # punctuation and case do not matter for an exact match
+    assert links.loc['exact', 'score'] == 1.0
+    # Jakovenko is only found by rescoring the whole RUS block, and the 2012 list is not looked at
+    assert 0.6 <= links.loc['fuzzy', 'score'] < 1.0
+    assert links.loc['fuzzy', 'runner_up_score'] < links.loc['fuzzy', 'score'] - 0.05
+    assert links.loc['homonym', 'runner_up_score'] == 1.0
+    assert links.loc['unknown', 'score'] < 0.6
+    assert links.loc['no_block', 'score'] == 0.0
+
+def test_link_players_without_aliases_or_with_a_list_year_offset(olympiad, rated):
+    links = linker.link_players(olympiad, rated, aliases={})
+    assert links.loc['alias', 'status'] == 'unmatched'
+    # against the 2012 list only the RUS Jakovenko is left
+    links = linker.link_players(olympiad, rated, list_year_offset=2)
+    assert links.loc['fuzzy', 'fide_id'] == 9
+    assert (links.drop(index='fuzzy')['status'] == 'unmatched').all()
+
+def test_linkage_report(olympiad, rated):
+    report = linker.linkage_report(olympiad.join(linker.link_players(olympiad, rated)), rated)
+    assert report.loc[2010, ['ambiguous', 'matched', 'unmatched']].tolist() == [3 / 8, 3 / 8, 2 / 8]
+    assert report.loc[2010, 'players'] == 8
+    # the 2010 list, TRI through the TTO alias, no FRA player and nothing from the 2012 list
+    assert report.loc[2010, 'candidates'] == 10
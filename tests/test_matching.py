@@ -0,0 +1,20 @@
+import numpy as np
+import matching
+
+def test_tiers_take_the_top_k_per_query_lower_answer_first_on_ties():
+    rows = np.array([0, 0, 0, 0, 0, 1, 1])
+    cols = np.array([0, 1, 2, 3, 4, 0, 1])
+    data = np.array([0.7, 0.9, 0.9, 0.8, 0.65, 0.7, 0.8])
+    np.testing.assert_array_equal(matching._tiers(rows, cols, data, 2), [1, 0, 0, 1, 2, 0, 0])
+    np.testing.assert_array_equal(matching._tiers(rows, cols, data, 1), [2, 0, 1, 2, 2, 1, 0])
+
+def test_a_query_outbid_for_its_top_k_gets_its_next_tier_only():
+    answers = ['north island', 'north islands', 'north isle', 'north', 'northern']
+    queries = ['north island', 'north islands', 'north isle', 'north isles']
+    match = matching.match_names(queries, answers, threshold=0.1, top_k=1)
+    assert match[:3].tolist() == [0, 1, 2]
+    # the top candidate of 'north isles' is taken; its second best is free
+    assert match[3] in (3, 4)
+    # with top_k=1 only two candidates per query are ever considered
+    assert matching.match_names(['red sea', 'red sea', 'red sea'],
+                                ['red sea', 'red sea coast', 'red sea coast line'], 0.1, top_k=1).tolist() == [0, 1, -1]
@@ -0,0 +1,31 @@
+import linecache
+import importlib
+import pandas as pd
+import pipeline
+
+def test_save_frame_leaves_the_frame_alone_and_restores_labels(tmp_path):
+    df = pd.DataFrame({'Country Code': pd.Categorical(['ARM', 'NOR']), 2008: [1.5, 2.5], 2009: [3, 4]})
+    pipeline.save_frame('world_bank', 'key', df, str(tmp_path))
+    assert list(df.columns) == ['Country Code', 2008, 2009]
+    pd.testing.assert_frame_equal(pipeline.load_frame('world_bank', 'key', str(tmp_path)), df)
+
+def test_save_frame_round_trips_the_index(tmp_path):
+    df = pd.DataFrame({'year': [2008, 2010], 'federation': ['ARM', 'NOR'], 'points': [19.0, 17.5]})
+    df = df.set_index(['year', 'federation'])
+    pipeline.save_frame('scores', 'key', df, str(tmp_path))
+    loaded = pipeline.load_frame('scores', 'key', str(tmp_path))
+    assert list(loaded.index.names) == ['year', 'federation']
+    pd.testing.assert_frame_equal(loaded, df, check_index_type=False, check_categorical=False)
+
+def test_stage_key_follows_the_source_of_its_modules(tmp_path, monkeypatch):
+    module_path = tmp_path / 'stage_code.py'
+    module_path.write_text("def rows():\n    return 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    stage_code = importlib.import_module('stage_code')
+    graph = pipeline.Pipeline(str(tmp_path / 'cache'))
+    graph.add('rows', lambda: pd.DataFrame({'rows': [stage_code.rows()]}), modules=[stage_code])
+    before = graph.keys(['rows'])['rows']
+    assert graph.keys(['rows'])['rows'] == before
+    module_path.write_text("def rows():\n    return 2\n")
+    linecache.checkcache()
+    assert graph.keys(['rows'])['rows'] != before
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+import resampling
+
+@pytest.fixture(scope='module')
+def table():
+    # y depends on gdp only; culture is correlated with gdp but has no effect of its own
+    rng = np.random.default_rng(7)
+    gdp = rng.normal(size=150)
+    culture = 0.6 * gdp + rng.normal(size=150)
+    y = 1.0 + 0.5 * gdp + rng.normal(scale=0.5, size=150)
+    df = pd.DataFrame({'discrepancy': y, 'gdp': gdp, 'culture': culture})
+    df.loc[3, 'culture'] = np.nan # incomplete rows are left out
+    return df
+
+def _study(df, **kwargs):
+    return resampling.resampling_study(df, 'discrepancy', ['gdp', 'culture'], n_resamples=2000, batch_size=500,
+                                       max_workers=1, **kwargs)
+
+def test_freedman_lane_p_values_per_term(table):
+    study = _study(table)
+    assert list(study.index) == ['const', 'gdp', 'culture']
+    assert (study['rows'] == 149).all()
+    assert np.isnan(study.loc['const', 'permutation_p'])
+    assert study.loc['gdp', 'permutation_p'] < 0.001
+    assert study.loc['culture', 'permutation_p'] > 0.1
+    assert study.loc['gdp', 'ci_low'] < 0.5 < study.loc['gdp', 'ci_high']
+    assert study.loc['culture', 'ci_low'] < 0 < study.loc['culture', 'ci_high']
+
+def test_estimates_are_the_ols_fit(table):
+    study = _study(table)
+    complete = table.dropna()
+    X = np.column_stack([np.ones(len(complete)), complete['gdp'], complete['culture']])
+    np.testing.assert_allclose(study['estimate'], np.linalg.lstsq(X, complete['discrepancy'], rcond=None)[0])
+
+def test_interaction_terms_are_tested(table):
+    table = table.assign(discrepancy=table['discrepancy'] + 0.4 * table['gdp'] * table['culture'])
+    study = _study(table, interactions=[('gdp', 'culture')])
+    assert study.index[-1] == 'gdp:culture'
+    assert study.loc['gdp:culture', 'permutation_p'] < 0.001
+    assert study.loc['culture', 'permutation_p'] > 0.1
+
+def test_results_depend_on_the_seed_only(table):
+    first = _study(table, seed=11)
+    pd.testing.assert_frame_equal(first, _study(table, seed=11))
+    pooled = resampling.resampling_study(table, 'discrepancy', ['gdp', 'culture'], n_resamples=2000, batch_size=500,
+                                         seed=11, max_workers=2)
+    pd.testing.assert_frame_equal(first, pooled)
+    other = _study(table, seed=12)
+    assert not np.allclose(first['bootstrap_se'], other['bootstrap_se'])
+    pd.testing.assert_series_equal(first['estimate'], other['estimate'])
+
+def test_permuted_residual_fits_move_the_coefficient_like_a_full_refit(table):
+    # the shortcut resampling_study takes: refitting reduced fit + permuted residuals changes coefficient j
+    # by exactly the fit of the permuted residuals
+    y, X, names = resampling.design_matrix(table, 'discrepancy', ['gdp', 'culture'])
+    j = names.index('culture')
+    reduced = np.delete(X, j, axis=1)
+    fitted = reduced @ resampling.ols(reduced, y)
+    y_rows = np.random.default_rng(0).permuted(np.broadcast_to(np.arange(len(y)), (50, len(y))), axis=1)
+    full = np.array([resampling.ols(X, fitted + (y - fitted)[rows]) for rows in y_rows])
+    np.testing.assert_allclose(resampling.fit_batch(X, y - fitted, y_rows=y_rows)[:, j], full[:, j], atol=1e-10)